@@ -1,12 +1,26 @@
 #ifndef __DRACO3DGS_H__
 #define __DRACO3DGS_H__
 
+#include <algorithm>
+#include <chrono>
+#include <memory>
+#include <string>
+#include <type_traits>
 #include <vector>
 #include <cstddef>
+#include <cstdint>
 #include <cstring>
 #include <iostream>
+#include "draco/attributes/attribute_quantization_transform.h"
+#include "draco/compression/attributes/linear_sequencer.h"
+#include "draco/compression/attributes/sequential_attribute_decoders_controller.h"
+#include "draco/compression/attributes/sequential_integer_attribute_decoder.h"
+#include "draco/compression/attributes/sequential_quantization_attribute_decoder.h"
 #include "draco/compression/decode.h"
 #include "draco/compression/encode.h"
+#include "draco/compression/entropy/rans_symbol_decoder.h"
+#include "draco/compression/point_cloud/point_cloud_kd_tree_decoder.h"
+#include "draco/compression/point_cloud/point_cloud_sequential_decoder.h"
 #include "draco/point_cloud/point_cloud.h"
 
 namespace Draco3DGS
@@ -25,62 +39,105 @@ namespace Draco3DGS
     };
 
     // 3DGS attribute dimensions (fixed)
+    // FEATURE_REST has 3 * ((sh_degree + 1)^2 - 1) components (45 for SH degree 3) and is omitted for SH degree 0,
+    // so the SH degree is carried by the bitstream itself.
     constexpr int DIM_POSITION = 3;
     constexpr int DIM_SCALE = 3;
     constexpr int DIM_ROTATION = 4;
     constexpr int DIM_OPACITY = 1;
     constexpr int DIM_FEATURE_DC = 3;
-    constexpr int DIM_FEATURE_REST = 45; // SH degree 3: 15 coeffs * 3 channels
 
-    struct PointCloudObject
+    enum attribute_type
     {
-        std::vector<float> positions;     // Nx3
-        std::vector<float> scales;        // Nx3
-        std::vector<float> rotations;     // Nx4
-        std::vector<float> opacities;     // Nx1
-        std::vector<float> features_dc;   // Nx3
-        std::vector<float> features_rest; // Nx45
-        int num_points;
-        decoding_status decode_status;
+        attr_position,
+        attr_scale,
+        attr_rotation,
+        attr_opacity,
+        attr_feature_dc,
+        attr_feature_rest
     };
 
     struct EncodedObject
     {
-        std::vector<unsigned char> buffer;
+        std::vector<char> buffer;
         encoding_status encode_status;
+        double copy_seconds = 0;   // copying the attributes into the Draco point cloud
+        double encode_seconds = 0; // Draco's encoder
     };
 
-    // Extract attribute data from PointCloud to vector using memcpy (bulk copy)
+    inline draco::GeometryAttribute::Type draco_attribute_type(attribute_type attribute)
+    {
+        switch (attribute)
+        {
+        case attr_position:
+            return draco::GeometryAttribute::POSITION;
+        case attr_scale:
+            return draco::GeometryAttribute::SCALE_3DGS;
+        case attr_rotation:
+            return draco::GeometryAttribute::ROTATION_3DGS;
+        case attr_opacity:
+            return draco::GeometryAttribute::OPACITY_3DGS;
+        case attr_feature_dc:
+            return draco::GeometryAttribute::FEATURE_DC_3DGS;
+        case attr_feature_rest:
+            return draco::GeometryAttribute::FEATURE_REST_3DGS;
+        }
+        return draco::GeometryAttribute::INVALID;
+    }
+
+    // Extract attribute data from PointCloud to caller-owned memory using memcpy (bulk copy)
     // Reference: ply_encoder.cc EncodeData() - uses GetAddress for direct memory access
-    template <int N>
-    void extract_attr(draco::PointCloud *pc, draco::GeometryAttribute::Type type, std::vector<float> &out, int num_points)
+    // With num_channels > 1, the values of each point are read as a num_channels x (num_components / num_channels)
+    // matrix (the channel-major f_rest_* order of PLY files) and written transposed (the coefficient-major
+    // layout of GaussianModel), so that the caller does not need another pass to transpose them.
+    // Output rows may be row_stride bytes apart (e.g. the fields of the vertex records of a PLY file), 0 means contiguous.
+    inline bool extract_attr(const draco::PointCloud *pc, draco::GeometryAttribute::Type type, float *out, int num_components, int num_channels = 1, std::int64_t row_stride = 0)
     {
         const int att_id = pc->GetNamedAttributeId(type);
         if (att_id < 0)
-            return;
+            return false;
         const auto *att = pc->attribute(att_id);
-        out.resize(num_points * N);
+        if (att->num_components() != num_components || att->byte_stride() != static_cast<int64_t>(num_components * sizeof(float)))
+            return false;
+        if (num_channels < 1 || num_components % num_channels != 0)
+            return false;
+        const int num_points = pc->num_points();
+        const int num_coeffs = num_components / num_channels;
+        if (row_stride == 0)
+            row_stride = num_components * sizeof(float);
         // Use bulk memcpy when identity mapping (data is contiguous)
         // Reference: geometry_attribute.h GetAddress() returns pointer to contiguous buffer
-        if (att->is_mapping_identity())
+        if (att->is_mapping_identity() && num_channels == 1 && row_stride == static_cast<std::int64_t>(num_components * sizeof(float)))
         {
-            std::memcpy(out.data(), att->GetAddress(draco::AttributeValueIndex(0)), num_points * N * sizeof(float));
+            std::memcpy(out, att->GetAddress(draco::AttributeValueIndex(0)), num_points * num_components * sizeof(float));
         }
         else
         {
-            // Fallback to per-point copy for non-identity mapping
+            // Fallback to per-point copy for non-identity mapping or transposed output
             for (draco::PointIndex i(0); i < num_points; ++i)
             {
-                std::memcpy(&out[i.value() * N], att->GetAddress(att->mapped_index(i)), N * sizeof(float));
+                const float *src = reinterpret_cast<const float *>(att->GetAddress(att->mapped_index(i)));
+                float *dst = reinterpret_cast<float *>(reinterpret_cast<char *>(out) + i.value() * row_stride);
+                if (num_channels == 1)
+                {
+                    std::memcpy(dst, src, num_components * sizeof(float));
+                    continue;
+                }
+                for (int c = 0; c < num_channels; ++c)
+                    for (int k = 0; k < num_coeffs; ++k)
+                        dst[k * num_channels + c] = src[c * num_coeffs + k];
             }
         }
+        return true;
     }
 
-    // Add attribute to PointCloud from vector using memcpy (bulk copy)
+    // Add attribute to PointCloud from caller-owned memory using memcpy (bulk copy)
     // Reference: ply_decoder.cc ReadNamedPropertiesByNameToAttribute()
-    int add_attr(draco::PointCloud *pc, draco::GeometryAttribute::Type type, const std::vector<float> &data, int num_components, int num_points)
+    // Rows are row_stride bytes apart, at least num_components floats (e.g. the fields of the vertex records of a
+    // memory-mapped PLY file), in which case they are copied one by one; contiguous rows are copied at once.
+    inline int add_attr(draco::PointCloud *pc, draco::GeometryAttribute::Type type, const float *data, int num_components, int num_points, std::int64_t row_stride)
     {
-        if (data.empty())
+        if (data == nullptr)
             return -1;
         // Reference: ply_decoder.cc line 178-181
         draco::GeometryAttribute va;
@@ -88,72 +145,390 @@ namespace Draco3DGS
         const int att_id = pc->AddAttribute(va, true, num_points);
         // Bulk copy using memcpy - attribute buffer is contiguous after AddAttribute with identity mapping
         // Reference: geometry_attribute.h SetAttributeValue() writes to byte_pos = index * byte_stride
-        std::memcpy(pc->attribute(att_id)->GetAddress(draco::AttributeValueIndex(0)), data.data(), data.size() * sizeof(float));
+        char *dst = reinterpret_cast<char *>(pc->attribute(att_id)->GetAddress(draco::AttributeValueIndex(0)));
+        const std::size_t row_size = num_components * sizeof(float);
+        if (row_stride == static_cast<std::int64_t>(row_size))
+        {
+            std::memcpy(dst, data, num_points * row_size);
+            return att_id;
+        }
+        const char *src = reinterpret_cast<const char *>(data);
+        for (int i = 0; i < num_points; ++i)
+            std::memcpy(dst + i * row_size, src + i * row_stride, row_size);
         return att_id;
     }
 
-    PointCloudObject decode_point_cloud(const char *buffer, std::size_t buffer_len)
+    // Attribute-selective decoding.
+    // Sequentially encoded point clouds (compression level 0 and most others) store the entropy-coded values of all
+    // attributes one after the other, followed by the quantization parameters of all attributes, so an attribute
+    // cannot be dropped by seeking. Skipped attributes are parsed instead: only the headers of their symbol streams
+    // are read (rANS payloads are jumped over by their encoded size), and nothing is allocated, decoded, predicted or
+    // dequantized for them. KD-tree encoded point clouds interleave the attributes and are always decoded in full.
+
+    // Advance buffer past an rANS symbol stream: its probability table is read without building the decoding
+    // table, then the payload is jumped over by its size. See draco/compression/entropy/rans_symbol_decoder.h
+    inline bool skip_rans_symbols(uint32_t num_values, draco::DecoderBuffer *buffer)
     {
-        PointCloudObject obj;
-        draco::DecoderBuffer decoderBuffer;
-        decoderBuffer.Init(buffer, buffer_len);
+        uint32_t num_symbols;
+        if (!draco::DecodeVarint(&num_symbols, buffer) || num_symbols / 64 > buffer->remaining_size() || (num_values > 0 && num_symbols == 0))
+            return false;
+        for (uint32_t i = 0; i < num_symbols; ++i)
+        {
+            uint8_t prob_data;
+            if (!buffer->Decode(&prob_data))
+                return false;
+            const int token = prob_data & 3;
+            if (token == 3) // run of zero probabilities
+                i += prob_data >> 2;
+            else if (buffer->remaining_size() < token)
+                return false;
+            else
+                buffer->Advance(token);
+        }
+        uint64_t bytes_encoded;
+        if (!draco::DecodeVarint(&bytes_encoded, buffer) || bytes_encoded > static_cast<uint64_t>(buffer->remaining_size()))
+            return false;
+        buffer->Advance(static_cast<int64_t>(bytes_encoded));
+        return true;
+    }
 
-        // Reference: draco_decoder.cc line 89-93
-        auto type_statusor = draco::Decoder::GetEncodedGeometryType(&decoderBuffer);
-        if (!type_statusor.ok())
+    // Advance buffer past num_values entropy-coded symbols, see draco/compression/entropy/symbol_decoding.cc
+    inline bool skip_symbols(uint32_t num_values, int num_components, draco::DecoderBuffer *buffer)
+    {
+        if (num_values == 0)
+            return true;
+        uint8_t scheme;
+        if (!buffer->Decode(&scheme))
+            return false;
+        if (scheme == draco::SYMBOL_CODING_RAW)
         {
-            obj.decode_status = not_draco_encoded;
-            return obj;
+            uint8_t max_bit_length;
+            return buffer->Decode(&max_bit_length) && max_bit_length >= 1 && max_bit_length <= 18 && skip_rans_symbols(num_values, buffer);
         }
+        if (scheme != draco::SYMBOL_CODING_TAGGED)
+            return false;
+        // The values follow the tags as raw bits of the tagged lengths, so only the tags are decoded
+        draco::RAnsSymbolDecoder<5> tag_decoder;
+        if (!tag_decoder.Create(buffer) || !tag_decoder.StartDecoding(buffer) || tag_decoder.num_symbols() == 0)
+            return false;
+        uint64_t num_bits = 0;
+        for (uint32_t i = 0; i < num_values; i += num_components)
+            num_bits += static_cast<uint64_t>(tag_decoder.DecodeSymbol()) * num_components;
+        tag_decoder.EndDecoding();
+        const int64_t num_bytes = static_cast<int64_t>((num_bits + 7) / 8);
+        if (buffer->remaining_size() < num_bytes)
+            return false;
+        buffer->Advance(num_bytes);
+        return true;
+    }
 
-        // Reference: draco_decoder.cc line 110-116
-        draco::Decoder decoder;
-        auto statusor = decoder.DecodePointCloudFromBuffer(&decoderBuffer);
-        if (!statusor.ok())
+    // Sequential (generic, integer or quantization) attribute decoder that parses past its attribute when skip is set,
+    // see draco/compression/attributes/sequential_integer_attribute_decoder.cc
+    template <class Base>
+    class SkippableAttributeDecoder : public Base
+    {
+    public:
+        explicit SkippableAttributeDecoder(bool skip) : skip_(skip) {}
+
+        bool DecodePortableAttribute(const std::vector<draco::PointIndex> &point_ids, draco::DecoderBuffer *in_buffer) override
         {
-            obj.decode_status = failed_during_decoding;
-            return obj;
+            if (!skipping())
+                return Base::DecodePortableAttribute(point_ids, in_buffer);
+            if constexpr (!std::is_base_of_v<draco::SequentialIntegerAttributeDecoder, Base>)
+            {
+                // Values stored as they are, see draco/compression/attributes/sequential_attribute_decoder.cc
+                const int64_t num_bytes = static_cast<int64_t>(this->attribute()->byte_stride()) * point_ids.size();
+                if (in_buffer->remaining_size() < num_bytes)
+                    return false;
+                in_buffer->Advance(num_bytes);
+                return true;
+            }
+            else
+            {
+                const int num_components = this->attribute()->num_components();
+                int8_t prediction_scheme_method;
+                if (num_components <= 0 || !in_buffer->Decode(&prediction_scheme_method))
+                    return false;
+                if (prediction_scheme_method < draco::PREDICTION_NONE || prediction_scheme_method >= draco::NUM_PREDICTION_SCHEMES)
+                    return false;
+                std::unique_ptr<draco::PredictionSchemeTypedDecoderInterface<int32_t>> prediction_scheme;
+                if (prediction_scheme_method != draco::PREDICTION_NONE)
+                {
+                    int8_t prediction_transform_type;
+                    if (!in_buffer->Decode(&prediction_transform_type))
+                        return false;
+                    if (prediction_transform_type < draco::PREDICTION_TRANSFORM_NONE || prediction_transform_type >= draco::NUM_PREDICTION_SCHEME_TRANSFORM_TYPES)
+                        return false;
+                    prediction_scheme = this->CreateIntPredictionScheme(
+                        static_cast<draco::PredictionSchemeMethod>(prediction_scheme_method),
+                        static_cast<draco::PredictionSchemeTransformType>(prediction_transform_type));
+                    if (!prediction_scheme)
+                        return false;
+                }
+                const uint32_t num_values = static_cast<uint32_t>(point_ids.size()) * num_components;
+                uint8_t compressed;
+                if (!in_buffer->Decode(&compressed))
+                    return false;
+                if (compressed > 0)
+                {
+                    if (!skip_symbols(num_values, num_components, in_buffer))
+                        return false;
+                }
+                else
+                {
+                    uint8_t num_bytes;
+                    if (!in_buffer->Decode(&num_bytes) || in_buffer->remaining_size() < static_cast<int64_t>(num_bytes) * num_values)
+                        return false;
+                    in_buffer->Advance(static_cast<int64_t>(num_bytes) * num_values);
+                }
+                return !prediction_scheme || prediction_scheme->DecodePredictionData(in_buffer);
+            }
         }
 
-        auto pc = std::move(statusor).value();
-        obj.num_points = pc->num_points();
+        bool DecodeDataNeededByPortableTransform(const std::vector<draco::PointIndex> &point_ids, draco::DecoderBuffer *in_buffer) override
+        {
+            if (!skipping())
+                return Base::DecodeDataNeededByPortableTransform(point_ids, in_buffer);
+            if constexpr (std::is_base_of_v<draco::SequentialQuantizationAttributeDecoder, Base>)
+            {
+                // Kept with the attribute (as Draco does for skip_attribute_transform), see quantization_bits
+                draco::AttributeQuantizationTransform quantization_transform;
+                return quantization_transform.DecodeParameters(*this->attribute(), in_buffer) && quantization_transform.TransferToAttribute(this->attribute());
+            }
+            return true;
+        }
 
-        extract_attr<DIM_POSITION>(pc.get(), draco::GeometryAttribute::POSITION, obj.positions, obj.num_points);
-        extract_attr<DIM_SCALE>(pc.get(), draco::GeometryAttribute::SCALE_3DGS, obj.scales, obj.num_points);
-        extract_attr<DIM_ROTATION>(pc.get(), draco::GeometryAttribute::ROTATION_3DGS, obj.rotations, obj.num_points);
-        extract_attr<DIM_OPACITY>(pc.get(), draco::GeometryAttribute::OPACITY_3DGS, obj.opacities, obj.num_points);
-        extract_attr<DIM_FEATURE_DC>(pc.get(), draco::GeometryAttribute::FEATURE_DC_3DGS, obj.features_dc, obj.num_points);
-        extract_attr<DIM_FEATURE_REST>(pc.get(), draco::GeometryAttribute::FEATURE_REST_3DGS, obj.features_rest, obj.num_points);
+        bool TransformAttributeToOriginalFormat(const std::vector<draco::PointIndex> &point_ids) override
+        {
+            return skipping() || Base::TransformAttributeToOriginalFormat(point_ids);
+        }
 
-        obj.decode_status = successful;
-        return obj;
-    }
+    private:
+        // Older bitstreams lay the attributes out differently
+        bool skipping() const { return skip_ && this->decoder()->bitstream_version() >= DRACO_BITSTREAM_VERSION(2, 0); }
+
+        bool skip_;
+    };
+
+    class SelectiveAttributeDecodersController : public draco::SequentialAttributeDecodersController
+    {
+    public:
+        SelectiveAttributeDecodersController(int num_points, const std::vector<draco::GeometryAttribute::Type> &skipped)
+            : draco::SequentialAttributeDecodersController(std::make_unique<draco::LinearSequencer>(num_points)), skipped_(skipped) {}
+
+    protected:
+        // Called once per attribute, in order
+        std::unique_ptr<draco::SequentialAttributeDecoder> CreateSequentialDecoder(uint8_t decoder_type) override
+        {
+            const draco::PointAttribute *attribute = GetDecoder()->point_cloud()->attribute(GetAttributeId(next_attribute_++));
+            const bool skip = std::find(skipped_.begin(), skipped_.end(), attribute->attribute_type()) != skipped_.end();
+            switch (decoder_type)
+            {
+            case draco::SEQUENTIAL_ATTRIBUTE_ENCODER_GENERIC:
+                return std::make_unique<SkippableAttributeDecoder<draco::SequentialAttributeDecoder>>(skip);
+            case draco::SEQUENTIAL_ATTRIBUTE_ENCODER_INTEGER:
+                return std::make_unique<SkippableAttributeDecoder<draco::SequentialIntegerAttributeDecoder>>(skip);
+            case draco::SEQUENTIAL_ATTRIBUTE_ENCODER_QUANTIZATION:
+                return std::make_unique<SkippableAttributeDecoder<draco::SequentialQuantizationAttributeDecoder>>(skip);
+            default:
+                return draco::SequentialAttributeDecodersController::CreateSequentialDecoder(decoder_type);
+            }
+        }
+
+    private:
+        const std::vector<draco::GeometryAttribute::Type> &skipped_;
+        int next_attribute_ = 0;
+    };
+
+    class SelectivePointCloudDecoder : public draco::PointCloudSequentialDecoder
+    {
+    public:
+        explicit SelectivePointCloudDecoder(const std::vector<draco::GeometryAttribute::Type> &skipped) : skipped_(skipped) {}
+
+    protected:
+        bool CreateAttributesDecoder(int32_t att_decoder_id) override
+        {
+            return SetAttributesDecoder(att_decoder_id, std::make_unique<SelectiveAttributeDecodersController>(point_cloud()->num_points(), skipped_));
+        }
+
+    private:
+        const std::vector<draco::GeometryAttribute::Type> &skipped_;
+    };
+
+    // Reads the header and the attribute descriptors only
+    template <class Base>
+    class HeaderOnlyDecoder : public Base
+    {
+    protected:
+        bool DecodeAllAttributes() override { return true; }
+    };
+
+    // Holds the decoded draco::PointCloud so that the caller can allocate the output arrays
+    // once the number of points is known and have each attribute copied straight into them.
+    class PointCloudDecoder
+    {
+    public:
+        // skip_mask has bit (1 << attribute_type) set for the attributes that are not needed,
+        // which are left out of the decoding where the encoding method allows it and cannot be extracted.
+        // With all bits set, only the headers are read (and the quantization parameters of sequential encodings,
+        // unless header_only is set: finding them means parsing past the values of every attribute).
+        decoding_status decode(const char *buffer, std::size_t buffer_len, unsigned int skip_mask = 0, bool header_only = false)
+        {
+            draco::DecoderBuffer decoderBuffer;
+            decoderBuffer.Init(buffer, buffer_len);
+
+            // Reference: draco_decoder.cc line 89-93
+            auto type_statusor = draco::Decoder::GetEncodedGeometryType(&decoderBuffer);
+            if (!type_statusor.ok())
+                return not_draco_encoded;
+
+            skip_mask_ = skip_mask;
+            skipped_.clear();
+            for (int attribute = attr_position; attribute <= attr_feature_rest; ++attribute)
+                if (skip_mask & (1u << attribute))
+                    skipped_.push_back(draco_attribute_type(static_cast<attribute_type>(attribute)));
 
-    EncodedObject encode_point_cloud(
-        const std::vector<float> &positions,
-        const std::vector<float> &scales,
-        const std::vector<float> &rotations,
-        const std::vector<float> &opacities,
-        const std::vector<float> &features_dc,
-        const std::vector<float> &features_rest,
+            draco::DracoHeader header;
+            draco::DecoderBuffer headerBuffer(decoderBuffer);
+            if (!draco::PointCloudDecoder::DecodeHeader(&headerBuffer, &header).ok())
+                return failed_during_decoding;
+            header_ = header;
+            const bool sequential = header.encoder_type == draco::POINT_CLOUD && header.encoder_method == draco::POINT_CLOUD_SEQUENTIAL_ENCODING;
+            const bool kd_tree = header.encoder_type == draco::POINT_CLOUD && header.encoder_method == draco::POINT_CLOUD_KD_TREE_ENCODING;
+            header_only = header_only || (kd_tree && skipped_.size() == attr_feature_rest + 1);
+            std::unique_ptr<draco::PointCloudDecoder> selective_decoder;
+            if (header_only && sequential)
+                selective_decoder = std::make_unique<HeaderOnlyDecoder<draco::PointCloudSequentialDecoder>>();
+            else if (header_only && kd_tree)
+                selective_decoder = std::make_unique<HeaderOnlyDecoder<draco::PointCloudKdTreeDecoder>>();
+            else if (sequential && !skipped_.empty())
+                selective_decoder = std::make_unique<SelectivePointCloudDecoder>(skipped_);
+            if (header_only)
+                skip_mask_ = ~0u; // nothing can be extracted
+            if (selective_decoder)
+            {
+                auto pc = std::make_unique<draco::PointCloud>();
+                draco::DecoderOptions options;
+                if (!selective_decoder->Decode(options, &decoderBuffer, pc.get()).ok())
+                    return failed_during_decoding;
+                pc_ = std::move(pc);
+                return successful;
+            }
+
+            // Reference: draco_decoder.cc line 110-116
+            draco::Decoder decoder;
+            auto statusor = decoder.DecodePointCloudFromBuffer(&decoderBuffer);
+            if (!statusor.ok())
+                return failed_during_decoding;
+
+            pc_ = std::move(statusor).value();
+            return successful;
+        }
+
+        int num_points() const
+        {
+            return pc_ ? pc_->num_points() : 0;
+        }
+
+        // Number of components of an attribute, 0 if it is not in the point cloud
+        int num_components(attribute_type attribute) const
+        {
+            const int att_id = pc_ ? pc_->GetNamedAttributeId(draco_attribute_type(attribute)) : -1;
+            return att_id < 0 ? 0 : pc_->attribute(att_id)->num_components();
+        }
+
+        // Quantization bits of a skipped sequentially encoded attribute, 0 if it is not quantized or not known
+        int quantization_bits(attribute_type attribute) const
+        {
+            const int att_id = pc_ ? pc_->GetNamedAttributeId(draco_attribute_type(attribute)) : -1;
+            if (att_id < 0 || !(skip_mask_ & (1u << attribute)))
+                return 0;
+            const draco::PointAttribute *att = pc_->attribute(att_id);
+            draco::AttributeQuantizationTransform quantization_transform;
+            if (!att->GetAttributeTransformData() || !quantization_transform.InitFromAttribute(*att))
+                return 0;
+            return quantization_transform.quantization_bits();
+        }
+
+        // Name of the data type of an attribute, empty if it is not in the point cloud
+        std::string data_type(attribute_type attribute) const
+        {
+            const int att_id = pc_ ? pc_->GetNamedAttributeId(draco_attribute_type(attribute)) : -1;
+            if (att_id < 0)
+                return "";
+            switch (pc_->attribute(att_id)->data_type())
+            {
+            case draco::DT_FLOAT32:
+                return "float32";
+            case draco::DT_INT32:
+                return "int32";
+            default:
+                return "other";
+            }
+        }
+
+        // Encoding method, "sequential" or "kd-tree"
+        std::string encoding() const
+        {
+            return header_.encoder_method == draco::POINT_CLOUD_KD_TREE_ENCODING ? "kd-tree" : "sequential";
+        }
+
+        int version_major() const { return header_.version_major; }
+        int version_minor() const { return header_.version_minor; }
+
+        bool extract(attribute_type attribute, float *out, int num_components, int num_channels, std::int64_t row_stride = 0) const
+        {
+            if (skip_mask_ & (1u << attribute))
+                return false;
+            return pc_ && extract_attr(pc_.get(), draco_attribute_type(attribute), out, num_components, num_channels, row_stride);
+        }
+
+    private:
+        std::unique_ptr<draco::PointCloud> pc_;
+        std::vector<draco::GeometryAttribute::Type> skipped_;
+        unsigned int skip_mask_ = 0;
+        draco::DracoHeader header_ = {};
+    };
+
+    // Attribute pointers reference caller-owned Nx<DIM> row-major float buffers, features_rest is Nx<num_features_rest>
+    // row_strides, if given, are the byte strides of the rows of the six attributes (see add_attr)
+    inline EncodedObject encode_point_cloud(
+        const float *positions,
+        const float *scales,
+        const float *rotations,
+        const float *opacities,
+        const float *features_dc,
+        const float *features_rest,
+        int num_features_rest,
+        int num_points,
         int compression_level,
-        int qp, int qscale, int qrotation, int qopacity, int qfeaturedc, int qfeaturerest)
+        int qp, int qscale, int qrotation, int qopacity, int qfeaturedc, int qfeaturerest,
+        const std::int64_t *row_strides = nullptr)
     {
         EncodedObject result;
-        const int num_points = positions.size() / DIM_POSITION;
         const int speed = 10 - compression_level;
+        const std::int64_t contiguous[6] = {
+            DIM_POSITION * sizeof(float), DIM_SCALE * sizeof(float), DIM_ROTATION * sizeof(float),
+            DIM_OPACITY * sizeof(float), DIM_FEATURE_DC * sizeof(float), num_features_rest * static_cast<std::int64_t>(sizeof(float))};
+        if (row_strides == nullptr)
+            row_strides = contiguous;
 
+        const auto copy_start = std::chrono::steady_clock::now();
         // Reference: ply_decoder.cc line 279-280
         draco::PointCloud pc;
         pc.set_num_points(num_points);
 
         // Add attributes - Reference: ply_decoder.cc DecodeVertexData()
-        add_attr(&pc, draco::GeometryAttribute::POSITION, positions, DIM_POSITION, num_points);
-        add_attr(&pc, draco::GeometryAttribute::SCALE_3DGS, scales, DIM_SCALE, num_points);
-        add_attr(&pc, draco::GeometryAttribute::ROTATION_3DGS, rotations, DIM_ROTATION, num_points);
-        add_attr(&pc, draco::GeometryAttribute::OPACITY_3DGS, opacities, DIM_OPACITY, num_points);
-        add_attr(&pc, draco::GeometryAttribute::FEATURE_DC_3DGS, features_dc, DIM_FEATURE_DC, num_points);
-        add_attr(&pc, draco::GeometryAttribute::FEATURE_REST_3DGS, features_rest, DIM_FEATURE_REST, num_points);
+        add_attr(&pc, draco::GeometryAttribute::POSITION, positions, DIM_POSITION, num_points, row_strides[0]);
+        add_attr(&pc, draco::GeometryAttribute::SCALE_3DGS, scales, DIM_SCALE, num_points, row_strides[1]);
+        add_attr(&pc, draco::GeometryAttribute::ROTATION_3DGS, rotations, DIM_ROTATION, num_points, row_strides[2]);
+        add_attr(&pc, draco::GeometryAttribute::OPACITY_3DGS, opacities, DIM_OPACITY, num_points, row_strides[3]);
+        add_attr(&pc, draco::GeometryAttribute::FEATURE_DC_3DGS, features_dc, DIM_FEATURE_DC, num_points, row_strides[4]);
+        if (num_features_rest > 0)
+            add_attr(&pc, draco::GeometryAttribute::FEATURE_REST_3DGS, features_rest, num_features_rest, num_points, row_strides[5]);
+
+        const auto encode_start = std::chrono::steady_clock::now();
+        result.copy_seconds = std::chrono::duration<double>(encode_start - copy_start).count();
 
         // Reference: draco_encoder.cc line 390-429
         draco::Encoder encoder;
@@ -174,10 +549,12 @@ namespace Draco3DGS
         // Reference: draco_encoder.cc EncodePointCloudToFile() line 163-170
         draco::EncoderBuffer buffer;
         const draco::Status status = encoder.EncodePointCloudToBuffer(pc, &buffer);
+        result.encode_seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - encode_start).count();
 
         if (status.ok())
         {
-            result.buffer = *reinterpret_cast<const std::vector<unsigned char> *>(buffer.buffer());
+            // Take over the encoder's storage instead of copying it; the EncoderBuffer is discarded right after.
+            const_cast<std::vector<char> *>(buffer.buffer())->swap(result.buffer);
             result.encode_status = successful_encoding;
         }
         else
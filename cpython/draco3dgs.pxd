@@ -1,4 +1,7 @@
 # cython: language_level=3
+from libc.stdint cimport int64_t
+from libcpp cimport bool
+from libcpp.string cimport string
 from libcpp.vector cimport vector
 
 cdef extern from "draco3dgs.h" namespace "Draco3DGS":
@@ -9,29 +12,37 @@ cdef extern from "draco3dgs.h" namespace "Draco3DGS":
     cdef enum encoding_status:
         successful_encoding, failed_during_encoding
 
-    cdef struct PointCloudObject:
-        vector[float] positions
-        vector[float] scales
-        vector[float] rotations
-        vector[float] opacities
-        vector[float] features_dc
-        vector[float] features_rest
-        int num_points
-        decoding_status decode_status
+    cdef enum attribute_type:
+        attr_position, attr_scale, attr_rotation, attr_opacity, attr_feature_dc, attr_feature_rest
 
     cdef struct EncodedObject:
-        vector[unsigned char] buffer
+        vector[char] buffer
         encoding_status encode_status
+        double copy_seconds
+        double encode_seconds
 
-    PointCloudObject decode_point_cloud(const char * buffer, size_t buffer_len) except +
+    cdef cppclass PointCloudDecoder:
+        PointCloudDecoder() except +
+        decoding_status decode(const char * buffer, size_t buffer_len, unsigned int skip_mask, bool header_only) except + nogil
+        int num_points() nogil
+        int num_components(attribute_type attribute) nogil
+        int quantization_bits(attribute_type attribute) nogil
+        string data_type(attribute_type attribute)
+        string encoding()
+        int version_major() nogil
+        int version_minor() nogil
+        bool extract(attribute_type attribute, float * out, int num_components, int num_channels, int64_t row_stride) nogil
 
     EncodedObject encode_point_cloud(
-        const vector[float] & positions,
-        const vector[float] & scales,
-        const vector[float] & rotations,
-        const vector[float] & opacities,
-        const vector[float] & features_dc,
-        const vector[float] & features_rest,
+        const float * positions,
+        const float * scales,
+        const float * rotations,
+        const float * opacities,
+        const float * features_dc,
+        const float * features_rest,
+        int num_features_rest,
+        int num_points,
         int compression_level,
-        int qp, int qscale, int qrotation, int qopacity, int qfeaturedc, int qfeaturerest
-    ) except +
+        int qp, int qscale, int qrotation, int qopacity, int qfeaturedc, int qfeaturerest,
+        const int64_t * row_strides
+    ) except + nogil
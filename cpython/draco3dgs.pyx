@@ -1,5 +1,9 @@
 # distutils: language = c++
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
 import numpy as np
+from cpython.buffer cimport PyBuffer_FillInfo
+from libc.stdint cimport int64_t
 from libcpp.vector cimport vector
 cimport draco3dgs
 cimport numpy as cnp
@@ -14,23 +18,106 @@ class DecodingFailedException(Exception):
     pass
 
 
+attribute_names = ("positions", "scales", "rotations", "opacities", "features_dc", "features_rest")
+
+
 class PointCloud:
-    """Decoded 3DGS point cloud data."""
+    """Decoded 3DGS point cloud data; attributes that were not decoded are None."""
 
-    def __init__(self, positions, scales, rotations, opacities, features_dc, features_rest):
+    def __init__(self, positions, scales, rotations, opacities, features_dc, features_rest, num_points=None, sh_degree=None):
         self.positions = positions        # Nx3
         self.scales = scales              # Nx3
         self.rotations = rotations        # Nx4
         self.opacities = opacities        # Nx1
         self.features_dc = features_dc    # Nx3
-        self.features_rest = features_rest  # Nx45
+        self.features_rest = features_rest  # Nx(3 * num_sh_coeffs), e.g. Nx45 for SH degree 3
+        self._num_points = num_points
+        self._sh_degree = sh_degree
 
     @property
     def num_points(self):
-        return len(self.positions)
+        return len(self.positions) if self._num_points is None else self._num_points
 
+    @property
+    def sh_degree(self):
+        return sh_degree_of(int(np.prod(self.features_rest.shape[1:]))) if self._sh_degree is None else self._sh_degree
 
-def encode(
+
+class LazyPointCloud(PointCloud):
+    """PointCloud whose attributes are decoded from the buffer on first access, each on its own
+    (the other attributes are skipped, see decode). The buffer is kept until the object is released."""
+
+    def __init__(self, buffer, allocator=None, bint transpose_features=False):
+        header = decode(buffer, attributes=())
+        self.buffer = buffer
+        self.allocator = allocator
+        self.transpose_features = transpose_features
+        self._num_points = header.num_points
+        self._sh_degree = header.sh_degree
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not set yet
+        if name not in attribute_names:
+            raise AttributeError(f"'LazyPointCloud' object has no attribute '{name}'")
+        value = getattr(decode(self.buffer, self.allocator, self.transpose_features, attributes=(name,)), name)
+        setattr(self, name, value)
+        return value
+
+
+cdef class EncodedBuffer:
+    """Read-only buffer that owns the encoder output, exposed without copying."""
+    cdef vector[char] buffer
+
+    def __getbuffer__(self, Py_buffer *view, int flags):
+        PyBuffer_FillInfo(view, self, self.buffer.data(), self.buffer.size(), 1, flags)
+
+    def __releasebuffer__(self, Py_buffer *view):
+        pass
+
+    def __len__(self):
+        return self.buffer.size()
+
+
+cpdef int sh_degree_of(int num_features_rest) except -1:
+    """SH degree of features_rest with 3 * ((sh_degree + 1)^2 - 1) values per point."""
+    cdef int sh_degree = 0
+    while 3 * ((sh_degree + 1) ** 2 - 1) < num_features_rest:
+        sh_degree += 1
+    if 3 * ((sh_degree + 1) ** 2 - 1) != num_features_rest:
+        raise ValueError(f"Expected 3 * ((sh_degree + 1)^2 - 1) features_rest values per point, got {num_features_rest}")
+    return sh_degree
+
+
+cdef as_rows(array, dtype, int num_components):
+    """View any buffer (numpy, memoryview, DLPack/torch CPU tensor) as rows of num_components values (-1 for as many as
+    a row of a 2-D array has), in place if the values of every row are contiguous and the rows do not overlap (e.g.
+    fields of a memory-mapped PLY file, see gscompressor.ply), copying otherwise (e.g. broadcast rows of stride 0)."""
+    if not isinstance(array, np.ndarray) and hasattr(array, "__dlpack__"):
+        array = np.from_dlpack(array)
+    array = np.asarray(array)
+    if num_components < 0 and array.ndim == 2:
+        num_components = array.shape[1]
+    if array.ndim == 2 and array.shape[1] == num_components and array.dtype == dtype \
+            and array.strides[0] >= num_components * array.itemsize \
+            and (num_components <= 1 or array.strides[1] == array.itemsize):
+        return array
+    array = np.ascontiguousarray(array, dtype=dtype).reshape(-1)
+    if num_components < 0:
+        return array.reshape(-1, 1)  # features_rest, split by the caller once num_points is known
+    if array.shape[0] % num_components != 0:
+        raise ValueError(f"Expected an array of Nx{num_components} values, got {array.shape[0]} values")
+    return array.reshape(-1, num_components)
+
+
+cdef const float * float_data(const float[:, :] array, str name, int num_points, int num_components, int64_t * row_stride) except? NULL:
+    if array.shape[0] * array.shape[1] != num_points * num_components:
+        raise ValueError(f"Expected {num_points}x{num_components} values for {name}, got {array.shape[0] * array.shape[1]}")
+    # Arrays that as_rows flattened (features_rest) are contiguous rows of num_components floats
+    row_stride[0] = array.strides[0] if array.shape[0] == num_points and array.shape[1] == num_components else num_components * sizeof(float)
+    return &array[0, 0] if array.shape[0] > 0 and array.shape[1] > 0 else NULL
+
+
+def encode_buffer(
     positions not None,
     scales not None,
     rotations not None,
@@ -39,10 +126,13 @@ def encode(
     features_rest not None,
     int compression_level=7,
     int qp=11, int qscale=11, int qrotation=11,
-    int qopacity=11, int qfeaturedc=11, int qfeaturerest=11
-) -> bytes:
+    int qopacity=11, int qfeaturedc=11, int qfeaturerest=11,
+    dict stats=None
+) -> memoryview:
     """
-    Encode 3DGS point cloud to draco buffer.
+    Encode 3DGS point cloud to draco buffer, without copying the encoder output.
+    Arrays are read in place when they are float32 buffers whose rows are contiguous, even if the rows are not
+    (e.g. strided views of a memory-mapped PLY file).
 
     Args:
         positions: Nx3 float array
@@ -50,54 +140,283 @@ def encode(
         rotations: Nx4 float array
         opacities: Nx1 float array
         features_dc: Nx3 float array
-        features_rest: Nx45 float array
+        features_rest: Nx(3 * ((sh_degree + 1)^2 - 1)) float array, i.e. Nx45 for SH degree 3 and Nx0 for SH degree 0
         compression_level: 0-10, higher = better compression
         qp, qscale, qrotation, qopacity, qfeaturedc, qfeaturerest: quantization bits
+        stats: optional dict that receives the seconds spent converting the arrays ("convert"), copying them
+            into the Draco point cloud ("copy") and in Draco's encoder ("draco"), see gscompressor.trace
+
+    Returns:
+        Read-only memoryview over the encoder output, for callers that write or hash the buffer
+    """
+    cdef double start = perf_counter() if stats is not None else 0
+    cdef const float[:, :] pos_arr = as_rows(positions, np.float32, 3)
+    cdef const float[:, :] scale_arr = as_rows(scales, np.float32, 3)
+    cdef const float[:, :] rot_arr = as_rows(rotations, np.float32, 4)
+    cdef const float[:, :] opacity_arr = as_rows(opacities, np.float32, 1)
+    cdef const float[:, :] fdc_arr = as_rows(features_dc, np.float32, 3)
+    cdef const float[:, :] frest_arr = as_rows(features_rest, np.float32, -1)
+    cdef int num_points = pos_arr.shape[0]
+    cdef int num_features_rest = frest_arr.shape[0] * frest_arr.shape[1] // num_points if num_points > 0 else 0
+    sh_degree_of(num_features_rest)
+    if num_features_rest > 255:  # draco stores the number of components in a byte
+        raise ValueError(f"SH degree too high: {num_features_rest} features_rest values per point")
+
+    cdef int64_t row_strides[6]
+    cdef const float * pos_ptr = float_data(pos_arr, "positions", num_points, 3, &row_strides[0])
+    cdef const float * scale_ptr = float_data(scale_arr, "scales", num_points, 3, &row_strides[1])
+    cdef const float * rot_ptr = float_data(rot_arr, "rotations", num_points, 4, &row_strides[2])
+    cdef const float * opacity_ptr = float_data(opacity_arr, "opacities", num_points, 1, &row_strides[3])
+    cdef const float * fdc_ptr = float_data(fdc_arr, "features_dc", num_points, 3, &row_strides[4])
+    cdef const float * frest_ptr = float_data(frest_arr, "features_rest", num_points, num_features_rest, &row_strides[5])
+
+    if stats is not None:
+        stats["convert"] = perf_counter() - start
+    cdef draco3dgs.EncodedObject encoded
+    with nogil:
+        encoded = draco3dgs.encode_point_cloud(
+            pos_ptr, scale_ptr, rot_ptr, opacity_ptr, fdc_ptr, frest_ptr, num_features_rest, num_points,
+            compression_level, qp, qscale, qrotation, qopacity, qfeaturedc, qfeaturerest, row_strides
+        )
+
+    if stats is not None:
+        stats["copy"], stats["draco"] = encoded.copy_seconds, encoded.encode_seconds
+    if encoded.encode_status != draco3dgs.successful_encoding:
+        raise EncodingFailedException("Failed to encode point cloud")
+    cdef EncodedBuffer result = EncodedBuffer()
+    result.buffer.swap(encoded.buffer)
+    return memoryview(result)
+
+
+def encode(
+    positions not None,
+    scales not None,
+    rotations not None,
+    opacities not None,
+    features_dc not None,
+    features_rest not None,
+    int compression_level=7,
+    int qp=11, int qscale=11, int qrotation=11,
+    int qopacity=11, int qfeaturedc=11, int qfeaturerest=11,
+    dict stats=None
+) -> bytes:
+    """
+    Encode 3DGS point cloud to draco bytes. Same arguments as encode_buffer, which returns the encoder output
+    without copying it.
 
     Returns:
         Encoded bytes
     """
-    cdef vector[float] pos_vec = np.asarray(positions, dtype=np.float32).ravel()
-    cdef vector[float] scale_vec = np.asarray(scales, dtype=np.float32).ravel()
-    cdef vector[float] rot_vec = np.asarray(rotations, dtype=np.float32).ravel()
-    cdef vector[float] opacity_vec = np.asarray(opacities, dtype=np.float32).ravel()
-    cdef vector[float] fdc_vec = np.asarray(features_dc, dtype=np.float32).ravel()
-    cdef vector[float] frest_vec = np.asarray(features_rest, dtype=np.float32).ravel()
-
-    encoded = draco3dgs.encode_point_cloud(
-        pos_vec, scale_vec, rot_vec, opacity_vec, fdc_vec, frest_vec,
-        compression_level, qp, qscale, qrotation, qopacity, qfeaturedc, qfeaturerest
-    )
+    return bytes(encode_buffer(
+        positions, scales, rotations, opacities, features_dc, features_rest,
+        compression_level=compression_level, qp=qp, qscale=qscale, qrotation=qrotation, qopacity=qopacity, qfeaturedc=qfeaturedc, qfeaturerest=qfeaturerest, stats=stats
+    ))
+
+
+cdef tuple allocate(allocator, str name, tuple shape, str dtype):
+    """Get an output array from the allocator (e.g. a pinned torch tensor) and a writable numpy view of its memory.
+    Rows must be C-contiguous, but may be further apart (e.g. the fields of the vertex records of a PLY file)."""
+    if allocator is None:
+        array = np.empty(shape, dtype=dtype)
+        return array, array
+    array = allocator(name, shape, dtype)
+    view = np.asarray(array)
+    if view.shape != shape or view.dtype != np.dtype(dtype) or not view[:1].flags.c_contiguous or view.strides[0] < 0 or not view.flags.writeable:
+        raise ValueError(f"Allocator must return a writable {dtype} array of shape {shape} with C-contiguous rows for {name}")
+    return array, view
+
+
+cdef unsigned int skip_mask(attributes) except? 0:
+    """Bit (1 << attribute_type) of every attribute that is not in attributes (None for all)."""
+    if attributes is None:
+        return 0
+    attributes = set(attributes)
+    unknown = attributes.difference(attribute_names)
+    if unknown:
+        raise ValueError(f"Unknown attributes: {sorted(unknown)}, expected some of {attribute_names}")
+    cdef unsigned int mask = 0
+    for attribute, name in enumerate(attribute_names):
+        if name not in attributes:
+            mask |= 1u << attribute
+    return mask
 
-    if encoded.encode_status == draco3dgs.successful_encoding:
-        return bytes(encoded.buffer)
-    raise EncodingFailedException("Failed to encode point cloud")
 
+cdef extract(draco3dgs.PointCloudDecoder * decoder, draco3dgs.attribute_type attribute, str name, tuple shape, allocator, int num_channels=1, unsigned int skipped=0):
+    """Allocate the output array and let the decoder copy the attribute straight into it (None if it is skipped)."""
+    if skipped & (1u << <int> attribute):
+        return None
+    cdef int num_components = int(np.prod(shape))
+    cdef cnp.ndarray view
+    array, view = allocate(allocator, name, (decoder.num_points(), *shape), "float32")
+    cdef float * data = <float *> cnp.PyArray_DATA(view)
+    cdef int64_t row_stride = view.strides[0]
+    cdef bint extracted
+    if view.shape[0] == 0 or num_components == 0:
+        return array
+    with nogil:
+        extracted = decoder.extract(attribute, data, num_components, num_channels, row_stride)
+    if not extracted:
+        raise DecodingFailedException(f"Missing or malformed attribute: {name}")
+    return array
 
-def decode(bytes buffer) -> PointCloud:
+
+def decode(const unsigned char[::1] buffer not None, allocator=None, bint transpose_features=False, attributes=None, dict stats=None) -> PointCloud:
     """
     Decode draco buffer to 3DGS point cloud.
 
     Args:
-        buffer: Encoded draco bytes
+        buffer: Encoded draco bytes (any C-contiguous buffer, e.g. bytes, memoryview or mmap)
+        allocator: optional callable (name, shape, dtype) -> array that provides the output arrays,
+            e.g. torch tensors in pinned memory; anything np.asarray views as a writable array of that shape
+            and dtype with C-contiguous rows is accepted, and the decoder writes into it in place
+        transpose_features: return features_dc as Nx1x3 and features_rest as Nx15x3 (the layout of
+            GaussianModel) instead of the channel-major Nx3 and Nx45 of PLY files (for SH degree 3)
+        attributes: names of the attributes to decode (see attribute_names), None for all;
+            the others are None in the result and, for sequentially encoded buffers (e.g. compression_level=0),
+            skipped by the decoder, which saves most of the time and memory when features_rest is left out
+        stats: optional dict that receives the seconds spent in Draco's decoder ("draco") and copying the attributes
+            into the output arrays ("extract"), see gscompressor.trace
 
     Returns:
         PointCloud with positions(Nx3), scales(Nx3), rotations(Nx4), 
-        opacities(Nx1), features_dc(Nx3), features_rest(Nx45)
+        opacities(Nx1), features_dc(Nx3), features_rest(Nx(3 * num_sh_coeffs)) float32 arrays,
+        where num_sh_coeffs = (sh_degree + 1)^2 - 1 follows the SH degree of the encoded data
     """
-    obj = draco3dgs.decode_point_cloud(buffer, len(buffer))
+    if buffer.shape[0] == 0:
+        raise DecodingFailedException("Input is not draco encoded")
+    cdef unsigned int skipped = skip_mask(attributes)
+    cdef const char * data = <const char *> &buffer[0]
+    cdef size_t length = buffer.shape[0]
+    cdef draco3dgs.PointCloudDecoder decoder
+    cdef draco3dgs.decoding_status status
+    cdef double start = perf_counter() if stats is not None else 0
+    with nogil:
+        status = decoder.decode(data, length, skipped, False)
+    if stats is not None:
+        stats["draco"] = perf_counter() - start
+        start = perf_counter()
 
-    if obj.decode_status == draco3dgs.not_draco_encoded:
+    if status == draco3dgs.not_draco_encoded:
         raise DecodingFailedException("Input is not draco encoded")
-    elif obj.decode_status == draco3dgs.failed_during_decoding:
+    elif status == draco3dgs.failed_during_decoding:
         raise DecodingFailedException("Failed to decode buffer")
 
-    n = obj.num_points
-    return PointCloud(
-        np.asarray(obj.positions).reshape(n, 3),
-        np.asarray(obj.scales).reshape(n, 3),
-        np.asarray(obj.rotations).reshape(n, 4),
-        np.asarray(obj.opacities).reshape(n, 1),
-        np.asarray(obj.features_dc).reshape(n, 3),
-        np.asarray(obj.features_rest).reshape(n, 45),
+    cdef int num_features_rest = decoder.num_components(draco3dgs.attr_feature_rest)
+    try:
+        sh_degree_of(num_features_rest)
+    except ValueError as e:
+        raise DecodingFailedException(f"Missing or malformed attribute: features_rest ({e})")
+    cdef tuple dc_shape, rest_shape
+    cdef int num_channels
+    if transpose_features:
+        dc_shape, rest_shape, num_channels = (1, 3), (num_features_rest // 3, 3), 3
+    else:
+        dc_shape, rest_shape, num_channels = (3,), (num_features_rest,), 1
+    point_cloud = PointCloud(
+        extract(&decoder, draco3dgs.attr_position, "positions", (3,), allocator, 1, skipped),
+        extract(&decoder, draco3dgs.attr_scale, "scales", (3,), allocator, 1, skipped),
+        extract(&decoder, draco3dgs.attr_rotation, "rotations", (4,), allocator, 1, skipped),
+        extract(&decoder, draco3dgs.attr_opacity, "opacities", (1,), allocator, 1, skipped),
+        extract(&decoder, draco3dgs.attr_feature_dc, "features_dc", dc_shape, allocator, num_channels, skipped),
+        extract(&decoder, draco3dgs.attr_feature_rest, "features_rest", rest_shape, allocator, num_channels, skipped),
+        num_points=decoder.num_points(),
+        sh_degree=sh_degree_of(num_features_rest),
+    )
+    if stats is not None:
+        stats["extract"] = perf_counter() - start
+    return point_cloud
+
+
+def probe(const unsigned char[::1] buffer not None, bint quantization_bits=True) -> dict:
+    """
+    Read the header, the attribute descriptors and (for sequential encodings) the quantization parameters
+    of a draco buffer without decoding its values.
+
+    Args:
+        buffer: Encoded draco bytes, as in decode (an mmap only has the pages that are parsed read)
+        quantization_bits: find the quantization parameters, which Draco stores after the values of all
+            attributes; the values are skipped over (see decode with attributes=()), which takes time linear
+            in the number of points for some entropy codings, while the rest takes microseconds
+
+    Returns:
+        dict with num_points, encoding ("sequential" or "kd-tree"), version and, for every attribute
+        in the buffer (by name, see attribute_names), its num_components, dtype and quantization_bits
+        (0 if it is not quantized or not known without decoding, i.e. for kd-tree encodings)
+    """
+    if buffer.shape[0] == 0:
+        raise DecodingFailedException("Input is not draco encoded")
+    cdef const char * data = <const char *> &buffer[0]
+    cdef size_t length = buffer.shape[0]
+    cdef draco3dgs.PointCloudDecoder decoder
+    cdef draco3dgs.decoding_status status
+    cdef unsigned int skipped = skip_mask(())
+    with nogil:
+        status = decoder.decode(data, length, skipped, not quantization_bits)
+    if status == draco3dgs.not_draco_encoded:
+        raise DecodingFailedException("Input is not draco encoded")
+    elif status == draco3dgs.failed_during_decoding:
+        raise DecodingFailedException("Failed to decode buffer")
+    attributes = {}
+    for attribute, name in enumerate(attribute_names):
+        if decoder.data_type(attribute).size() == 0:
+            continue
+        attributes[name] = dict(
+            num_components=decoder.num_components(attribute),
+            dtype=decoder.data_type(attribute).decode("ascii"),
+            quantization_bits=decoder.quantization_bits(attribute),
+        )
+    return dict(
+        num_points=decoder.num_points(),
+        encoding=decoder.encoding().decode("ascii"),
+        version=f"{decoder.version_major()}.{decoder.version_minor()}",
+        attributes=attributes,
     )
+
+
+def encode_many(
+    point_clouds,
+    int compression_level=7,
+    int qp=11, int qscale=11, int qrotation=11,
+    int qopacity=11, int qfeaturedc=11, int qfeaturerest=11,
+    max_workers=None
+) -> list:
+    """
+    Encode multiple 3DGS point clouds to draco buffers in parallel.
+    Draco runs with the GIL released, so the encodings scale across threads.
+
+    Args:
+        point_clouds: iterable of (positions, scales, rotations, opacities, features_dc, features_rest) tuples
+        compression_level, qp, qscale, qrotation, qopacity, qfeaturedc, qfeaturerest: same as encode
+        max_workers: number of threads (None for the ThreadPoolExecutor default)
+
+    Returns:
+        List of encoded bytes, in input order
+    """
+    def encode_one(arrays):
+        return encode(
+            *arrays, compression_level,
+            qp, qscale, qrotation, qopacity, qfeaturedc, qfeaturerest
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(encode_one, point_clouds))
+
+
+def decode_many(buffers, max_workers=None, allocator=None, bint transpose_features=False, attributes=None) -> list:
+    """
+    Decode multiple draco buffers to 3DGS point clouds in parallel.
+    Draco runs with the GIL released, so the decodings scale across threads.
+
+    Args:
+        buffers: iterable of encoded draco bytes
+        max_workers: number of threads (None for the ThreadPoolExecutor default)
+        allocator, transpose_features, attributes: same as decode (the allocator is called from the worker threads)
+
+    Returns:
+        List of PointCloud, in input order
+    """
+    def decode_one(buffer):
+        return decode(buffer, allocator, transpose_features, attributes)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(decode_one, buffers))
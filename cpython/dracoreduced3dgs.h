@@ -1,6 +1,7 @@
 #ifndef __DRACOREDUCED3DGS_H__
 #define __DRACOREDUCED3DGS_H__
 
+#include <memory>
 #include <vector>
 #include <cstddef>
 #include <cstring>
@@ -25,63 +26,85 @@ namespace DracoReduced3DGS
     };
 
     // Reduced 3DGS attribute dimensions (fixed)
+    // FEATURE_REST has 3 * sh_degree components (9 for SH degree 3) and is omitted for SH degree 0,
+    // so the SH degree is carried by the bitstream itself.
     constexpr int DIM_POSITION = 3;
     constexpr int DIM_SCALE = 1;
     constexpr int DIM_ROTATION = 2;
     constexpr int DIM_OPACITY = 1;
     constexpr int DIM_FEATURE_DC = 1;
-    constexpr int DIM_FEATURE_REST = 9;
 
-    struct PointCloudObject
+    enum attribute_type
     {
-        std::vector<float> positions;
-        std::vector<int32_t> scales;
-        std::vector<int32_t> rotations;
-        std::vector<int32_t> opacities;
-        std::vector<int32_t> features_dc;
-        std::vector<int32_t> features_rest;
-        int num_points;
-        decoding_status decode_status;
+        attr_position,
+        attr_scale,
+        attr_rotation,
+        attr_opacity,
+        attr_feature_dc,
+        attr_feature_rest
     };
 
     struct EncodedObject
     {
-        std::vector<unsigned char> buffer;
+        std::vector<char> buffer;
         encoding_status encode_status;
     };
 
-    // Extract attribute data from PointCloud to vector using memcpy (bulk copy)
+    inline draco::GeometryAttribute::Type draco_attribute_type(attribute_type attribute)
+    {
+        switch (attribute)
+        {
+        case attr_position:
+            return draco::GeometryAttribute::POSITION;
+        case attr_scale:
+            return draco::GeometryAttribute::SCALE_3DGS;
+        case attr_rotation:
+            return draco::GeometryAttribute::ROTATION_3DGS;
+        case attr_opacity:
+            return draco::GeometryAttribute::OPACITY_3DGS;
+        case attr_feature_dc:
+            return draco::GeometryAttribute::FEATURE_DC_3DGS;
+        case attr_feature_rest:
+            return draco::GeometryAttribute::FEATURE_REST_3DGS;
+        }
+        return draco::GeometryAttribute::INVALID;
+    }
+
+    // Extract attribute data from PointCloud to caller-owned memory using memcpy (bulk copy)
     // Reference: ply_encoder.cc EncodeData() - uses GetAddress for direct memory access
-    template <typename T, int N>
-    void extract_attr(draco::PointCloud *pc, draco::GeometryAttribute::Type type, std::vector<T> &out, int num_points)
+    template <typename T>
+    bool extract_attr(const draco::PointCloud *pc, draco::GeometryAttribute::Type type, T *out, int num_components)
     {
         const int att_id = pc->GetNamedAttributeId(type);
         if (att_id < 0)
-            return;
+            return false;
         const auto *att = pc->attribute(att_id);
-        out.resize(num_points * N);
+        if (att->num_components() != num_components || att->byte_stride() != static_cast<int64_t>(num_components * sizeof(T)))
+            return false;
+        const int num_points = pc->num_points();
         // Use bulk memcpy when identity mapping (data is contiguous)
         // Reference: geometry_attribute.h GetAddress() returns pointer to contiguous buffer
         if (att->is_mapping_identity())
         {
-            std::memcpy(out.data(), att->GetAddress(draco::AttributeValueIndex(0)), num_points * N * sizeof(T));
+            std::memcpy(out, att->GetAddress(draco::AttributeValueIndex(0)), num_points * num_components * sizeof(T));
         }
         else
         {
             // Fallback to per-point copy for non-identity mapping
             for (draco::PointIndex i(0); i < num_points; ++i)
             {
-                std::memcpy(&out[i.value() * N], att->GetAddress(att->mapped_index(i)), N * sizeof(T));
+                std::memcpy(out + i.value() * num_components, att->GetAddress(att->mapped_index(i)), num_components * sizeof(T));
             }
         }
+        return true;
     }
 
-    // Add attribute to PointCloud from vector using memcpy (bulk copy)
+    // Add attribute to PointCloud from caller-owned memory using memcpy (bulk copy)
     // Reference: ply_decoder.cc ReadNamedPropertiesByNameToAttribute()
     template <typename T>
-    int add_attr(draco::PointCloud *pc, draco::GeometryAttribute::Type type, const std::vector<T> &data, int num_components, int num_points, draco::DataType dt)
+    int add_attr(draco::PointCloud *pc, draco::GeometryAttribute::Type type, const T *data, int num_components, int num_points, draco::DataType dt)
     {
-        if (data.empty())
+        if (data == nullptr)
             return -1;
         // Reference: ply_decoder.cc line 178-181
         draco::GeometryAttribute va;
@@ -89,59 +112,71 @@ namespace DracoReduced3DGS
         const int att_id = pc->AddAttribute(va, true, num_points);
         // Bulk copy using memcpy - attribute buffer is contiguous after AddAttribute with identity mapping
         // Reference: geometry_attribute.h SetAttributeValue() writes to byte_pos = index * byte_stride
-        std::memcpy(pc->attribute(att_id)->GetAddress(draco::AttributeValueIndex(0)), data.data(), data.size() * sizeof(T));
+        std::memcpy(pc->attribute(att_id)->GetAddress(draco::AttributeValueIndex(0)), data, num_points * num_components * sizeof(T));
         return att_id;
     }
 
-    PointCloudObject decode_point_cloud(const char *buffer, std::size_t buffer_len)
+    // Holds the decoded draco::PointCloud so that the caller can allocate the output arrays
+    // once the number of points is known and have each attribute copied straight into them.
+    class PointCloudDecoder
     {
-        PointCloudObject obj;
-        draco::DecoderBuffer decoderBuffer;
-        decoderBuffer.Init(buffer, buffer_len);
-
-        // Reference: draco_decoder.cc line 89-93
-        auto type_statusor = draco::Decoder::GetEncodedGeometryType(&decoderBuffer);
-        if (!type_statusor.ok())
+    public:
+        decoding_status decode(const char *buffer, std::size_t buffer_len)
         {
-            obj.decode_status = not_draco_encoded;
-            return obj;
+            draco::DecoderBuffer decoderBuffer;
+            decoderBuffer.Init(buffer, buffer_len);
+
+            // Reference: draco_decoder.cc line 89-93
+            auto type_statusor = draco::Decoder::GetEncodedGeometryType(&decoderBuffer);
+            if (!type_statusor.ok())
+                return not_draco_encoded;
+
+            // Reference: draco_decoder.cc line 110-116
+            draco::Decoder decoder;
+            auto statusor = decoder.DecodePointCloudFromBuffer(&decoderBuffer);
+            if (!statusor.ok())
+                return failed_during_decoding;
+
+            pc_ = std::move(statusor).value();
+            return successful;
         }
 
-        // Reference: draco_decoder.cc line 110-116
-        draco::Decoder decoder;
-        auto statusor = decoder.DecodePointCloudFromBuffer(&decoderBuffer);
-        if (!statusor.ok())
+        int num_points() const
         {
-            obj.decode_status = failed_during_decoding;
-            return obj;
+            return pc_ ? pc_->num_points() : 0;
         }
 
-        auto pc = std::move(statusor).value();
-        obj.num_points = pc->num_points();
+        // Number of components of an attribute, 0 if it is not in the point cloud
+        int num_components(attribute_type attribute) const
+        {
+            const int att_id = pc_ ? pc_->GetNamedAttributeId(draco_attribute_type(attribute)) : -1;
+            return att_id < 0 ? 0 : pc_->attribute(att_id)->num_components();
+        }
 
-        extract_attr<float, DIM_POSITION>(pc.get(), draco::GeometryAttribute::POSITION, obj.positions, obj.num_points);
-        extract_attr<int32_t, DIM_SCALE>(pc.get(), draco::GeometryAttribute::SCALE_3DGS, obj.scales, obj.num_points);
-        extract_attr<int32_t, DIM_ROTATION>(pc.get(), draco::GeometryAttribute::ROTATION_3DGS, obj.rotations, obj.num_points);
-        extract_attr<int32_t, DIM_OPACITY>(pc.get(), draco::GeometryAttribute::OPACITY_3DGS, obj.opacities, obj.num_points);
-        extract_attr<int32_t, DIM_FEATURE_DC>(pc.get(), draco::GeometryAttribute::FEATURE_DC_3DGS, obj.features_dc, obj.num_points);
-        extract_attr<int32_t, DIM_FEATURE_REST>(pc.get(), draco::GeometryAttribute::FEATURE_REST_3DGS, obj.features_rest, obj.num_points);
+        template <typename T>
+        bool extract(attribute_type attribute, T *out, int num_components) const
+        {
+            return pc_ && extract_attr<T>(pc_.get(), draco_attribute_type(attribute), out, num_components);
+        }
 
-        obj.decode_status = successful;
-        return obj;
-    }
+    private:
+        std::unique_ptr<draco::PointCloud> pc_;
+    };
 
-    EncodedObject encode_point_cloud(
-        const std::vector<float> &positions,
-        const std::vector<int32_t> &scales,
-        const std::vector<int32_t> &rotations,
-        const std::vector<int32_t> &opacities,
-        const std::vector<int32_t> &features_dc,
-        const std::vector<int32_t> &features_rest,
+    // Attribute pointers reference caller-owned Nx<DIM> row-major buffers, features_rest is Nx<num_features_rest>
+    inline EncodedObject encode_point_cloud(
+        const float *positions,
+        const int32_t *scales,
+        const int32_t *rotations,
+        const int32_t *opacities,
+        const int32_t *features_dc,
+        const int32_t *features_rest,
+        int num_features_rest,
+        int num_points,
         int compression_level,
         int qp, int qscale, int qrotation, int qopacity, int qfeaturedc, int qfeaturerest)
     {
         EncodedObject result;
-        const int num_points = positions.size() / DIM_POSITION;
         const int speed = 10 - compression_level;
 
         // Reference: ply_decoder.cc line 279-280
@@ -154,7 +189,8 @@ namespace DracoReduced3DGS
         add_attr<int32_t>(&pc, draco::GeometryAttribute::ROTATION_3DGS, rotations, DIM_ROTATION, num_points, draco::DT_INT32);
         add_attr<int32_t>(&pc, draco::GeometryAttribute::OPACITY_3DGS, opacities, DIM_OPACITY, num_points, draco::DT_INT32);
         add_attr<int32_t>(&pc, draco::GeometryAttribute::FEATURE_DC_3DGS, features_dc, DIM_FEATURE_DC, num_points, draco::DT_INT32);
-        add_attr<int32_t>(&pc, draco::GeometryAttribute::FEATURE_REST_3DGS, features_rest, DIM_FEATURE_REST, num_points, draco::DT_INT32);
+        if (num_features_rest > 0)
+            add_attr<int32_t>(&pc, draco::GeometryAttribute::FEATURE_REST_3DGS, features_rest, num_features_rest, num_points, draco::DT_INT32);
 
         // Reference: draco_encoder.cc line 390-429
         draco::Encoder encoder;
@@ -178,7 +214,8 @@ namespace DracoReduced3DGS
 
         if (status.ok())
         {
-            result.buffer = *reinterpret_cast<const std::vector<unsigned char> *>(buffer.buffer());
+            // Take over the encoder's storage instead of copying it; the EncoderBuffer is discarded right after.
+            const_cast<std::vector<char> *>(buffer.buffer())->swap(result.buffer);
             result.encode_status = successful_encoding;
         }
         else
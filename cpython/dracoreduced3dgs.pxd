@@ -1,4 +1,5 @@
 # cython: language_level=3
+from libcpp cimport bool
 from libcpp.vector cimport vector
 from libc.stdint cimport int32_t
 
@@ -11,29 +12,30 @@ cdef extern from "dracoreduced3dgs.h" namespace "DracoReduced3DGS":
     cdef enum encoding_status:
         successful_encoding, failed_during_encoding
 
-    cdef struct PointCloudObject:
-        vector[float] positions
-        vector[int32_t] scales
-        vector[int32_t] rotations
-        vector[int32_t] opacities
-        vector[int32_t] features_dc
-        vector[int32_t] features_rest
-        int num_points
-        decoding_status decode_status
+    cdef enum attribute_type:
+        attr_position, attr_scale, attr_rotation, attr_opacity, attr_feature_dc, attr_feature_rest
 
     cdef struct EncodedObject:
-        vector[unsigned char] buffer
+        vector[char] buffer
         encoding_status encode_status
 
-    PointCloudObject decode_point_cloud(const char * buffer, size_t buffer_len) except +
+    cdef cppclass PointCloudDecoder:
+        PointCloudDecoder() except +
+        decoding_status decode(const char * buffer, size_t buffer_len) except + nogil
+        int num_points() nogil
+        int num_components(attribute_type attribute) nogil
+        bool extract(attribute_type attribute, float * out, int num_components) nogil
+        bool extract(attribute_type attribute, int32_t * out, int num_components) nogil
 
     EncodedObject encode_point_cloud(
-        const vector[float] & positions,
-        const vector[int32_t] & scales,
-        const vector[int32_t] & rotations,
-        const vector[int32_t] & opacities,
-        const vector[int32_t] & features_dc,
-        const vector[int32_t] & features_rest,
+        const float * positions,
+        const int32_t * scales,
+        const int32_t * rotations,
+        const int32_t * opacities,
+        const int32_t * features_dc,
+        const int32_t * features_rest,
+        int num_features_rest,
+        int num_points,
         int compression_level,
         int qp, int qscale, int qrotation, int qopacity, int qfeaturedc, int qfeaturerest
-    ) except +
+    ) except + nogil
@@ -1,5 +1,7 @@
 # distutils: language = c++
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+from cpython.buffer cimport PyBuffer_FillInfo
 from libcpp.vector cimport vector
 from libc.stdint cimport int32_t
 cimport dracoreduced3dgs
@@ -24,14 +26,54 @@ class PointCloud:
         self.rotations = rotations          # Nx2, int32 (quantized indices)
         self.opacities = opacities          # Nx1, int32 (quantized index)
         self.features_dc = features_dc      # Nx1, int32 (quantized index)
-        self.features_rest = features_rest  # Nx9, int32 (quantized indices)
+        self.features_rest = features_rest  # Nx(3 * sh_degree), int32 (quantized indices)
 
     @property
     def num_points(self):
         return len(self.positions)
 
+    @property
+    def sh_degree(self):
+        return self.features_rest.shape[1] // 3
 
-def encode(
+
+cdef class EncodedBuffer:
+    """Read-only buffer that owns the encoder output, exposed without copying."""
+    cdef vector[char] buffer
+
+    def __getbuffer__(self, Py_buffer *view, int flags):
+        PyBuffer_FillInfo(view, self, self.buffer.data(), self.buffer.size(), 1, flags)
+
+    def __releasebuffer__(self, Py_buffer *view):
+        pass
+
+    def __len__(self):
+        return self.buffer.size()
+
+
+cdef as_contiguous(array, dtype, int num_components):
+    """View any C-contiguous buffer (numpy, memoryview, DLPack/torch CPU tensor) as a flat array, copying only if needed."""
+    if not isinstance(array, np.ndarray) and hasattr(array, "__dlpack__"):
+        array = np.from_dlpack(array)
+    array = np.ascontiguousarray(array, dtype=dtype).reshape(-1)
+    if array.shape[0] % num_components != 0:
+        raise ValueError(f"Expected an array of Nx{num_components} values, got {array.shape[0]} values")
+    return array
+
+
+cdef const float * float_data(const float[::1] array, str name, int num_points, int num_components) except? NULL:
+    if array.shape[0] != num_points * num_components:
+        raise ValueError(f"Expected {num_points}x{num_components} values for {name}, got {array.shape[0]}")
+    return &array[0] if array.shape[0] > 0 else NULL
+
+
+cdef const int32_t * int32_data(const int32_t[::1] array, str name, int num_points, int num_components) except? NULL:
+    if array.shape[0] != num_points * num_components:
+        raise ValueError(f"Expected {num_points}x{num_components} values for {name}, got {array.shape[0]}")
+    return &array[0] if array.shape[0] > 0 else NULL
+
+
+def encode_buffer(
     positions not None,
     scales not None,
     rotations not None,
@@ -45,9 +87,10 @@ def encode(
     int qopacity=0,
     int qfeaturedc=0,
     int qfeaturerest=0
-) -> bytes:
+) -> memoryview:
     """
-    Encode reduced 3DGS point cloud to draco buffer.
+    Encode reduced 3DGS point cloud to draco buffer, without copying the encoder output.
+    Arrays are read in place when they are C-contiguous buffers of the expected dtype.
 
     Args:
         positions: Nx3 float array
@@ -55,55 +98,206 @@ def encode(
         rotations: Nx2 int32 array (quantized indices)
         opacities: Nx1 int32 array (quantized indices)
         features_dc: Nx1 int32 array (quantized indices)
-        features_rest: Nx9 int32 array (quantized indices)
+        features_rest: Nx(3 * sh_degree) int32 array (quantized indices), i.e. Nx9 for SH degree 3 and Nx0 for SH degree 0
         compression_level: 0-10, higher = better compression
         qp: quantization bits for position
         qscale, qrotation, qopacity, qfeaturedc, qfeaturerest: quantization bits (0 to disable)
 
+    Returns:
+        Read-only memoryview over the encoder output, for callers that write or hash the buffer
+    """
+    cdef const float[::1] pos_arr = as_contiguous(positions, np.float32, 3)
+    cdef const int32_t[::1] scale_arr = as_contiguous(scales, np.int32, 1)
+    cdef const int32_t[::1] rot_arr = as_contiguous(rotations, np.int32, 2)
+    cdef const int32_t[::1] opacity_arr = as_contiguous(opacities, np.int32, 1)
+    cdef const int32_t[::1] fdc_arr = as_contiguous(features_dc, np.int32, 1)
+    cdef const int32_t[::1] frest_arr = as_contiguous(features_rest, np.int32, 3)
+    cdef int num_points = pos_arr.shape[0] // 3
+    cdef int num_features_rest = frest_arr.shape[0] // num_points if num_points > 0 else 0
+    if num_features_rest % 3 != 0 or num_features_rest > 255:  # draco stores the number of components in a byte
+        raise ValueError(f"Expected 3 * sh_degree features_rest indices per point, got {num_features_rest}")
+
+    cdef const float * pos_ptr = float_data(pos_arr, "positions", num_points, 3)
+    cdef const int32_t * scale_ptr = int32_data(scale_arr, "scales", num_points, 1)
+    cdef const int32_t * rot_ptr = int32_data(rot_arr, "rotations", num_points, 2)
+    cdef const int32_t * opacity_ptr = int32_data(opacity_arr, "opacities", num_points, 1)
+    cdef const int32_t * fdc_ptr = int32_data(fdc_arr, "features_dc", num_points, 1)
+    cdef const int32_t * frest_ptr = int32_data(frest_arr, "features_rest", num_points, num_features_rest)
+
+    cdef dracoreduced3dgs.EncodedObject encoded
+    with nogil:
+        encoded = dracoreduced3dgs.encode_point_cloud(
+            pos_ptr, scale_ptr, rot_ptr, opacity_ptr, fdc_ptr, frest_ptr, num_features_rest, num_points,
+            compression_level, qp, qscale, qrotation, qopacity, qfeaturedc, qfeaturerest
+        )
+
+    if encoded.encode_status != dracoreduced3dgs.successful_encoding:
+        raise EncodingFailedException("Failed to encode point cloud")
+    cdef EncodedBuffer result = EncodedBuffer()
+    result.buffer.swap(encoded.buffer)
+    return memoryview(result)
+
+
+def encode(
+    positions not None,
+    scales not None,
+    rotations not None,
+    opacities not None,
+    features_dc not None,
+    features_rest not None,
+    int compression_level=7,
+    int qp=11,
+    int qscale=0,
+    int qrotation=0,
+    int qopacity=0,
+    int qfeaturedc=0,
+    int qfeaturerest=0
+) -> bytes:
+    """
+    Encode reduced 3DGS point cloud to draco bytes. Same arguments as encode_buffer, which returns the encoder output
+    without copying it.
+
     Returns:
         Encoded bytes
     """
-    cdef vector[float] pos_vec = np.asarray(positions, dtype=np.float32).ravel()
-    cdef vector[int32_t] scale_vec = np.asarray(scales, dtype=np.int32).ravel()
-    cdef vector[int32_t] rot_vec = np.asarray(rotations, dtype=np.int32).ravel()
-    cdef vector[int32_t] opacity_vec = np.asarray(opacities, dtype=np.int32).ravel()
-    cdef vector[int32_t] fdc_vec = np.asarray(features_dc, dtype=np.int32).ravel()
-    cdef vector[int32_t] frest_vec = np.asarray(features_rest, dtype=np.int32).ravel()
-
-    encoded = dracoreduced3dgs.encode_point_cloud(
-        pos_vec, scale_vec, rot_vec, opacity_vec, fdc_vec, frest_vec,
-        compression_level, qp, qscale, qrotation, qopacity, qfeaturedc, qfeaturerest
-    )
+    return bytes(encode_buffer(
+        positions, scales, rotations, opacities, features_dc, features_rest,
+        compression_level=compression_level, qp=qp, qscale=qscale, qrotation=qrotation, qopacity=qopacity, qfeaturedc=qfeaturedc, qfeaturerest=qfeaturerest
+    ))
+
+
+cdef tuple allocate(allocator, str name, tuple shape, str dtype):
+    """Get an output array from the allocator (e.g. a pinned torch tensor) and a writable numpy view of its memory."""
+    if allocator is None:
+        array = np.empty(shape, dtype=dtype)
+        return array, array
+    array = allocator(name, shape, dtype)
+    view = np.asarray(array)
+    if view.shape != shape or view.dtype != np.dtype(dtype) or not view.flags.c_contiguous or not view.flags.writeable:
+        raise ValueError(f"Allocator must return a writable C-contiguous {dtype} array of shape {shape} for {name}")
+    return array, view
+
+
+cdef extract_float(dracoreduced3dgs.PointCloudDecoder * decoder, dracoreduced3dgs.attribute_type attribute, str name, int num_components, allocator):
+    """Allocate the output array and let the decoder copy the attribute straight into it."""
+    cdef cnp.ndarray view
+    array, view = allocate(allocator, name, (decoder.num_points(), num_components), "float32")
+    cdef float * data = <float *> cnp.PyArray_DATA(view)
+    cdef bint extracted
+    if view.shape[0] == 0 or num_components == 0:
+        return array
+    with nogil:
+        extracted = decoder.extract(attribute, data, num_components)
+    if not extracted:
+        raise DecodingFailedException(f"Missing or malformed attribute: {name}")
+    return array
 
-    if encoded.encode_status == dracoreduced3dgs.successful_encoding:
-        return bytes(encoded.buffer)
-    raise EncodingFailedException("Failed to encode point cloud")
 
+cdef extract_int32(dracoreduced3dgs.PointCloudDecoder * decoder, dracoreduced3dgs.attribute_type attribute, str name, int num_components, allocator):
+    """Allocate the output array and let the decoder copy the attribute straight into it."""
+    cdef cnp.ndarray view
+    array, view = allocate(allocator, name, (decoder.num_points(), num_components), "int32")
+    cdef int32_t * data = <int32_t *> cnp.PyArray_DATA(view)
+    cdef bint extracted
+    if view.shape[0] == 0 or num_components == 0:
+        return array
+    with nogil:
+        extracted = decoder.extract(attribute, data, num_components)
+    if not extracted:
+        raise DecodingFailedException(f"Missing or malformed attribute: {name}")
+    return array
 
-def decode(bytes buffer) -> PointCloud:
+
+def decode(const unsigned char[::1] buffer not None, allocator=None) -> PointCloud:
     """
     Decode draco buffer to reduced 3DGS point cloud.
 
     Args:
-        buffer: Encoded draco bytes
+        buffer: Encoded draco bytes (any C-contiguous buffer, e.g. bytes, memoryview or mmap)
+        allocator: optional callable (name, shape, dtype) -> array that provides the output arrays,
+            e.g. torch tensors in pinned memory; anything np.asarray views as a writable C-contiguous
+            array of that shape and dtype is accepted, and the decoder writes into it in place
 
     Returns:
         PointCloud with positions(Nx3 float), scales(Nx1 int32), rotations(Nx2 int32),
-        opacities(Nx1 int32), features_dc(Nx1 int32), features_rest(Nx9 int32)
+        opacities(Nx1 int32), features_dc(Nx1 int32), features_rest(Nx(3 * sh_degree) int32),
+        where sh_degree follows the encoded data
     """
-    obj = dracoreduced3dgs.decode_point_cloud(buffer, len(buffer))
+    if buffer.shape[0] == 0:
+        raise DecodingFailedException("Input is not draco encoded")
+    cdef const char * data = <const char *> &buffer[0]
+    cdef size_t length = buffer.shape[0]
+    cdef dracoreduced3dgs.PointCloudDecoder decoder
+    cdef dracoreduced3dgs.decoding_status status
+    with nogil:
+        status = decoder.decode(data, length)
 
-    if obj.decode_status == dracoreduced3dgs.not_draco_encoded:
+    if status == dracoreduced3dgs.not_draco_encoded:
         raise DecodingFailedException("Input is not draco encoded")
-    elif obj.decode_status == dracoreduced3dgs.failed_during_decoding:
+    elif status == dracoreduced3dgs.failed_during_decoding:
         raise DecodingFailedException("Failed to decode buffer")
 
-    n = obj.num_points
+    cdef int num_features_rest = decoder.num_components(dracoreduced3dgs.attr_feature_rest)
+    if num_features_rest % 3 != 0:
+        raise DecodingFailedException(f"Missing or malformed attribute: features_rest ({num_features_rest} components)")
     return PointCloud(
-        np.asarray(obj.positions).reshape(n, 3),
-        np.asarray(obj.scales).reshape(n, 1),
-        np.asarray(obj.rotations).reshape(n, 2),
-        np.asarray(obj.opacities).reshape(n, 1),
-        np.asarray(obj.features_dc).reshape(n, 1),
-        np.asarray(obj.features_rest).reshape(n, 9),
+        extract_float(&decoder, dracoreduced3dgs.attr_position, "positions", 3, allocator),
+        extract_int32(&decoder, dracoreduced3dgs.attr_scale, "scales", 1, allocator),
+        extract_int32(&decoder, dracoreduced3dgs.attr_rotation, "rotations", 2, allocator),
+        extract_int32(&decoder, dracoreduced3dgs.attr_opacity, "opacities", 1, allocator),
+        extract_int32(&decoder, dracoreduced3dgs.attr_feature_dc, "features_dc", 1, allocator),
+        extract_int32(&decoder, dracoreduced3dgs.attr_feature_rest, "features_rest", num_features_rest, allocator),
     )
+
+
+def encode_many(
+    point_clouds,
+    int compression_level=7,
+    int qp=11,
+    int qscale=0,
+    int qrotation=0,
+    int qopacity=0,
+    int qfeaturedc=0,
+    int qfeaturerest=0,
+    max_workers=None
+) -> list:
+    """
+    Encode multiple reduced 3DGS point clouds to draco buffers in parallel.
+    Draco runs with the GIL released, so the encodings scale across threads.
+
+    Args:
+        point_clouds: iterable of (positions, scales, rotations, opacities, features_dc, features_rest) tuples
+        compression_level, qp, qscale, qrotation, qopacity, qfeaturedc, qfeaturerest: same as encode
+        max_workers: number of threads (None for the ThreadPoolExecutor default)
+
+    Returns:
+        List of encoded bytes, in input order
+    """
+    def encode_one(arrays):
+        return encode(
+            *arrays, compression_level,
+            qp, qscale, qrotation, qopacity, qfeaturedc, qfeaturerest
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(encode_one, point_clouds))
+
+
+def decode_many(buffers, max_workers=None, allocator=None) -> list:
+    """
+    Decode multiple draco buffers to reduced 3DGS point clouds in parallel.
+    Draco runs with the GIL released, so the decodings scale across threads.
+
+    Args:
+        buffers: iterable of encoded draco bytes
+        max_workers: number of threads (None for the ThreadPoolExecutor default)
+        allocator: same as decode (called from the worker threads)
+
+    Returns:
+        List of PointCloud, in input order
+    """
+    def decode_one(buffer):
+        return decode(buffer, allocator)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(decode_one, buffers))
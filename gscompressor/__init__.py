@@ -1 +1,15 @@
-from .compressor import Compressor, Decompressor
+import importlib
+
+from .probe import probe
+
+# Compressor and Decompressor are imported from their module on first access, so that `import gscompressor` and the
+# modules that do not need them (draco3dgs, ply, probe, container, trace) do not import torch (see lazy.py).
+_lazy_exports = dict(Compressor=".compressor", Decompressor=".compressor")
+
+__all__ = ["Compressor", "Decompressor", "probe"]
+
+
+def __getattr__(name: str):
+    if name in _lazy_exports:
+        return getattr(importlib.import_module(_lazy_exports[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
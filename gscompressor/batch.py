@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import inspect
+import importlib
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Dict, List, Sequence
+
+# Batch runner for sweeps such as compress.sh and equivalence.sh, which start a python process (importing torch and
+# the models again) for every scene, scale and direction. A manifest lists the jobs, each the equivalent of one command:
+#   {"tool": "compress" | "quantize", "mode": "compress" | "decompress", "source": ..., "destination": ...,
+#    "iteration": ..., "sh_degree": 3, "settings": {...}}
+# where tool is the CLI (gscompressor.compress for Draco, gscompressor.quantize for VQ) and settings are the keyword
+# arguments of its compress or decompress function (qposition, num_clusters_features_rest, use_executable_backend,
+# cache, cache_size, ...; each mode ignores the ones that only the other takes). Manifests are JSON lists of jobs, JSON objects
+# {"defaults": {...}, "jobs": [...]} whose defaults are merged into every job (settings too), or JSON lines of jobs.
+# Jobs run in a pool of spawned worker processes that import the CLIs and, for VQ jobs, torch and the models once, and
+# share the cores: every worker gets cpu_count / max_workers torch threads. The jobs of one output (same destination
+# and iteration, e.g. compress then decompress) run in manifest order in the same worker, and are skipped after a
+# failure; the groups are scheduled largest input first, so that the longest jobs do not start last. Every job is
+# reported as a JSON line when its group ends, followed by the aggregate throughput; the exit status is 1 if any failed.
+
+tools = ("compress", "quantize")
+modes = ("compress", "decompress")
+
+
+def read_manifest(path: str) -> List[dict]:
+    """Jobs of a manifest file, with the defaults of the manifest and of every field applied."""
+    with open(path) as f:
+        text = f.read()
+    try:
+        manifest = json.loads(text)
+    except json.JSONDecodeError:
+        manifest = [json.loads(line) for line in text.splitlines() if line.strip()]
+    defaults = {}
+    if isinstance(manifest, dict):
+        defaults, manifest = manifest.get("defaults", {}), manifest["jobs"]
+    jobs = []
+    for job in manifest:
+        job = dict(dict(tool="compress", mode="compress", sh_degree=3, **defaults), **job)
+        job["settings"] = dict(defaults.get("settings", {}), **job.get("settings", {}))
+        for field in ("source", "destination", "iteration"):
+            if field not in job:
+                raise ValueError(f"Job {len(jobs)} of {path} has no {field}")
+        if job["tool"] not in tools:
+            raise ValueError(f"Unknown tool: {job['tool']}, expected one of {tools}")
+        if job["mode"] not in modes:
+            raise ValueError(f"Unknown mode: {job['mode']}, expected one of {modes}")
+        jobs.append(job)
+    return jobs
+
+
+def job_paths(job: dict) -> Dict[str, str]:
+    """Input and output files of a job, as the CLIs resolve them."""
+    source_dir = os.path.join(job["source"], "point_cloud", "iteration_" + str(job["iteration"]))
+    destination_dir = os.path.join(job["destination"], "point_cloud", "iteration_" + str(job["iteration"]))
+    save_drc = os.path.join(destination_dir, "point_cloud.drc")
+    if job["mode"] == "decompress":
+        return dict(load=save_drc, save=os.path.join(destination_dir, "point_cloud.ply"))
+    load_ply = os.path.join(source_dir, "point_cloud.ply")
+    if job["tool"] == "quantize" and os.path.exists(os.path.join(source_dir, "point_cloud_quantized.ply")):
+        load_ply = os.path.join(source_dir, "point_cloud_quantized.ply")
+    return dict(load=load_ply, save=save_drc)
+
+
+def group_jobs(jobs: Sequence[dict]) -> List[List[int]]:
+    """Indices of the jobs by output (destination and iteration), in manifest order within a group,
+    groups largest input first."""
+    groups: Dict[tuple, List[int]] = {}
+    for i, job in enumerate(jobs):
+        groups.setdefault((os.path.abspath(job["destination"]), job["iteration"]), []).append(i)
+
+    def input_size(group):
+        path = job_paths(jobs[group[0]])["load"]
+        return os.path.getsize(path) if os.path.exists(path) else 0
+    return sorted(groups.values(), key=input_size, reverse=True)
+
+
+def _init_worker(tools: Sequence[str], num_threads: int):
+    # The report of the parent process is the only output on stdout (the codecs and quantizers print progress)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    # Imported once per worker instead of once per job
+    import gscompressor.compress  # noqa: F401
+    if "quantize" in tools:
+        import torch
+        import gaussian_splatting  # noqa: F401
+        import reduced_3dgs.quantization  # noqa: F401
+        import gscompressor.quantize  # noqa: F401
+        torch.set_num_threads(num_threads)
+
+
+def run_job(job: dict) -> dict:
+    """Run one job (see the manifest format above) in this process; returns its record."""
+    from gscompressor.cache import EncodeCache
+    from gscompressor.compress import copy_scene_files
+    module = importlib.import_module(f"gscompressor.{job['tool']}")
+    paths = job_paths(job)
+    settings = dict(job["settings"])
+    cache, cache_size = settings.pop("cache", None), settings.pop("cache_size", None)
+    record = dict(tool=job["tool"], mode=job["mode"], source=job["source"], destination=job["destination"], iteration=job["iteration"], worker=os.getpid())
+    start = time.perf_counter()
+    # Settings shared by the jobs of both modes (e.g. manifest defaults) are passed to the mode that takes them: the
+    # parameters of the other function are dropped, while compress keeps the rest (quantize passes them to its quantizer)
+    compress_parameters, decompress_parameters = inspect.signature(module.compress).parameters, inspect.signature(module.decompress).parameters
+    match job["mode"]:
+        case "compress":
+            settings = {name: value for name, value in settings.items() if name in compress_parameters or name not in decompress_parameters}
+            module.compress(
+                sh_degree=job["sh_degree"],
+                load_ply=paths["load"],
+                save_drc=paths["save"],
+                encoder_executable=settings.pop("encoder_executable", None),
+                cache=EncodeCache(cache, cache_size) if cache else None,
+                **settings,
+            )
+        case "decompress":
+            settings = {name: value for name, value in settings.items() if name in decompress_parameters}
+            module.decompress(
+                sh_degree=job["sh_degree"],
+                load_drc=paths["load"],
+                save_ply=paths["save"],
+                decoder_executable=settings.pop("decoder_executable", None),
+                **settings,
+            )
+            copy_scene_files(job["source"], job["destination"])
+    record.update(seconds=time.perf_counter() - start, bytes_in=os.path.getsize(paths["load"]), bytes_out=os.path.getsize(paths["save"]))
+    if job["mode"] == "compress" and os.path.exists(os.path.splitext(paths["save"])[0] + ".codebook.npz"):
+        record["bytes_out"] += os.path.getsize(os.path.splitext(paths["save"])[0] + ".codebook.npz")
+    return record
+
+
+def run_group(jobs: Sequence[dict], indices: Sequence[int]) -> List[dict]:
+    """Run the jobs of one output in order; the ones after a failure are skipped."""
+    records = []
+    for i in indices:
+        if records and "error" in records[-1]:
+            records.append(dict(index=i, tool=jobs[i]["tool"], mode=jobs[i]["mode"], destination=jobs[i]["destination"], error=f"Skipped after the failure of job {failed}"))
+            continue
+        try:
+            record = run_job(jobs[i])
+        except Exception:
+            record = dict(tool=jobs[i]["tool"], mode=jobs[i]["mode"], destination=jobs[i]["destination"], error=traceback.format_exc())
+            failed = i
+        records.append(dict(record, index=i))
+    return records
+
+
+def run_batch(jobs: Sequence[dict], max_workers: int = None, callback=None) -> dict:
+    """Run the jobs in a process pool of max_workers (the number of cores by default), calling callback(record)
+    as every job ends; returns the aggregate record (number of jobs and failures, wall time, throughput)."""
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    groups = group_jobs(jobs)
+    max_workers = max(1, min(max_workers, len(groups)))
+    num_threads = max(1, (os.cpu_count() or 1) // max_workers)
+    records = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=get_context("spawn"),  # the workers do not inherit the threads or imports of this process
+        initializer=_init_worker,
+        initargs=(sorted({job["tool"] for job in jobs}), num_threads),
+    ) as executor:
+        futures = {executor.submit(run_group, jobs, group): group for group in groups}
+        for future in as_completed(futures):
+            try:
+                group_records = future.result()
+            except BrokenProcessPool:  # a worker was killed, e.g. out of memory; the pool cannot run the other jobs either
+                group_records = [
+                    dict(index=i, tool=jobs[i]["tool"], mode=jobs[i]["mode"], destination=jobs[i]["destination"], error="A worker process died (e.g. out of memory)")
+                    for i in futures[future]
+                ]
+            for record in group_records:
+                records.append(record)
+                if callback is not None:
+                    callback(record)
+    seconds = time.perf_counter() - start
+    done = [record for record in records if "error" not in record]
+    bytes_in = sum(record["bytes_in"] for record in done)
+    return dict(
+        jobs=len(jobs), failed=len(records) - len(done), max_workers=max_workers, seconds=seconds,
+        job_seconds=sum(record["seconds"] for record in done),
+        jobs_per_second=len(done) / seconds, bytes_in=bytes_in, mb_per_second=bytes_in / 1e6 / seconds,
+    )
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    parser = ArgumentParser()
+    parser.add_argument("manifest", type=str, help="JSON (or JSON lines) file of jobs")
+    parser.add_argument("--max_workers", default=None, type=int, help="number of worker processes (default: number of cores)")
+    parser.add_argument("-o", "--output", default=None, type=str, help="write all records to this JSON file")
+    args = parser.parse_args()
+    records = []
+
+    def report(record):
+        print(json.dumps(record), flush=True)
+        records.append(record)
+    summary = run_batch(read_manifest(args.manifest), args.max_workers, report)
+    print(json.dumps(summary), flush=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(dict(summary, records=sorted(records, key=lambda record: record["index"])), f, indent=2)
+    if summary["failed"]:
+        sys.exit(1)
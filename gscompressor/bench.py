@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import traceback
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, Iterable, Iterator, List
+
+import torch
+from gaussian_splatting import GaussianModel
+
+from .compressor import Compressor, Decompressor, default_encoder_executable, default_decoder_executable
+from .trace import peak_rss, trace
+
+# Synthetic benchmark of the codecs. Every case (codec, backend, number of points, SH degree) is encoded and decoded
+# in fresh processes, so that the peak resident set size of a stage is its own, and reported as one JSON record:
+# throughput (points/s, and MB/s of uncompressed attributes), peak RSS, bytes per Gaussian and the reconstruction
+# error of every attribute. Errors are measured row by row, so they are only reported when Draco keeps the order
+# of the points, i.e. at compression_level=0. The time of every stage of the pipeline (see trace.py) is reported too.
+# With --startup, the cold start of fresh interpreters is measured instead: importing the package and running the CLIs,
+# and which of the heavy dependencies (see lazy.py) they load.
+
+attribute_names = dict(positions="_xyz", scales="_scaling", rotations="_rotation", opacities="_opacity", features_dc="_features_dc", features_rest="_features_rest")
+
+
+def synthetic_model(num_points: int, sh_degree: int = 3, seed: int = 0) -> GaussianModel:
+    """Reproducible GaussianModel with the statistics of a trained one: clustered positions, small log-scales,
+    unnormalized quaternions, logit opacities and SH coefficients that decay with their degree."""
+    generator = torch.Generator().manual_seed(seed)
+    num_clusters = max(1, num_points // 1000)
+    centers = torch.rand(num_clusters, 3, generator=generator) * 20 - 10
+    xyz = centers[torch.randint(num_clusters, (num_points,), generator=generator)] + torch.randn(num_points, 3, generator=generator) * 0.5
+    num_sh_coeffs = (sh_degree + 1) ** 2 - 1
+    decay = 0.2 / (torch.arange(1, num_sh_coeffs + 1).sqrt().floor() + 1)  # coefficient k is of degree floor(sqrt(k))
+    model = GaussianModel(sh_degree)
+    model._xyz = torch.nn.Parameter(xyz)
+    model._scaling = torch.nn.Parameter(torch.randn(num_points, 3, generator=generator) * 0.5 - 4)
+    model._rotation = torch.nn.Parameter(torch.randn(num_points, 4, generator=generator))
+    model._opacity = torch.nn.Parameter(torch.randn(num_points, 1, generator=generator) * 2)
+    model._features_dc = torch.nn.Parameter(torch.randn(num_points, 1, 3, generator=generator) * 0.5)
+    model._features_rest = torch.nn.Parameter(torch.randn(num_points, num_sh_coeffs, 3, generator=generator) * decay[:, None])
+    return model
+
+
+def _quantizer(case: dict):
+    from reduced_3dgs.quantization import ExcludeZeroSHQuantizer
+    return ExcludeZeroSHQuantizer(num_clusters=case["num_clusters"], max_sh_degree=case["sh_degree"], max_iter=case["max_iter"])
+
+
+def _encode_stage(case: dict, path: str) -> dict:
+    model = synthetic_model(case["num_points"], case["sh_degree"], case["seed"])
+    rss = peak_rss()
+    result = {}
+    with torch.no_grad():
+        if case["codec"] == "vq":
+            from .quantization import VectorQuantizationCompressor
+            quantizer = _quantizer(case)
+            start = time.perf_counter()
+            quantizer.quantize(model, update_codebook=True)
+            result["fit_seconds"] = time.perf_counter() - start
+            compressor = VectorQuantizationCompressor(quantizer, embed_codebook=True, use_executable_backend=case["backend"] == "exe", **case["options"])
+        else:
+            compressor = Compressor(use_executable_backend=case["backend"] == "exe", **case["options"])
+        start = time.perf_counter()
+        with trace() as tracer:
+            compressor.save_compressed(model, path)
+        result["seconds"] = time.perf_counter() - start
+        result["stages"] = tracer.summary()
+    result["peak_rss"] = peak_rss()
+    result["peak_rss_increase"] = None if rss is None else result["peak_rss"] - rss
+    return result
+
+
+def _decode_stage(case: dict, path: str) -> dict:
+    model = GaussianModel(case["sh_degree"])
+    rss = peak_rss()
+    result = {}
+    with torch.no_grad():
+        if case["codec"] == "vq":
+            from .quantization import VectorQuantizationDecompressor
+            decompressor = VectorQuantizationDecompressor(_quantizer(case), use_executable_backend=case["backend"] == "exe")
+        else:
+            decompressor = Decompressor(use_executable_backend=case["backend"] == "exe")
+        start = time.perf_counter()
+        with trace() as tracer:
+            decompressor.load_compressed(model, path)
+        result["seconds"] = time.perf_counter() - start
+        result["stages"] = tracer.summary()
+        result["peak_rss"] = peak_rss()
+        result["peak_rss_increase"] = None if rss is None else result["peak_rss"] - rss
+        if case["options"].get("compression_level", 0) == 0:
+            reference = synthetic_model(case["num_points"], case["sh_degree"], case["seed"])
+            result["errors"] = {}
+            for name, field in attribute_names.items():
+                error = (getattr(model, field).detach().cpu().float() - getattr(reference, field).detach()).abs()
+                result["errors"][name] = dict(
+                    max=float(error.max()) if error.numel() > 0 else 0.0,
+                    rmse=float(error.square().mean().sqrt()) if error.numel() > 0 else 0.0,
+                )
+    return result
+
+
+def _in_subprocess(fn, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(fn, *args).result()
+
+
+def run_case(case: dict) -> dict:
+    """Benchmark one case, see cases() for its fields."""
+    record = dict(case)
+    if case["backend"] == "exe" and not (os.path.isfile(default_encoder_executable) and os.path.isfile(default_decoder_executable)):
+        record["skipped"] = "draco_encoder/draco_decoder executables not found"
+        return record
+    num_points = case["num_points"]
+    num_sh_coeffs = (case["sh_degree"] + 1) ** 2
+    raw_bytes = num_points * (3 + 3 + 4 + 1 + 3 * num_sh_coeffs) * 4  # float32 attributes of GaussianModel
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "point_cloud.drc")
+            encode = _in_subprocess(_encode_stage, case, path)
+            size = sum(os.path.getsize(os.path.join(temp_dir, name)) for name in os.listdir(temp_dir))
+            decode = _in_subprocess(_decode_stage, case, path)
+    except Exception:
+        record["error"] = traceback.format_exc()
+        return record
+    for stage in (encode, decode):
+        stage["points_per_second"] = num_points / stage["seconds"]
+        stage["mb_per_second"] = raw_bytes / 1e6 / stage["seconds"]
+    record.update(
+        raw_bytes=raw_bytes,
+        compressed_bytes=size,
+        bytes_per_gaussian=size / num_points,
+        compression_ratio=raw_bytes / size,
+        errors=decode.pop("errors", None),
+        encode=encode,
+        decode=decode,
+    )
+    return record
+
+
+startup_commands = dict(
+    import_package=["-c", "import gscompressor"],
+    import_codecs=["-c", "from gscompressor import draco3dgs, probe; from gscompressor.quantization import dracoreduced3dgs"],
+    import_compressors=["-c", "from gscompressor import Compressor, Decompressor; from gscompressor.quantization import VectorQuantizationDecompressor"],
+    compress_cli=["-m", "gscompressor.compress", "--help"],
+    quantize_cli=["-m", "gscompressor.quantize", "--help"],
+    probe_cli=["-m", "gscompressor.probe", "--help"],
+)
+heavy_modules = ("torch", "gaussian_splatting", "reduced_3dgs", "plyfile", "scipy")
+
+
+def startup(commands: Dict[str, List[str]] = startup_commands, repeat: int = 5) -> Iterator[dict]:
+    """Cold start of every command (python arguments) in fresh interpreters: the best and median of repeat wall times
+    and, for -c commands, the heavy modules that were actually imported (bound lazily ones are not)."""
+    check = (
+        "; import sys, json; print(json.dumps([name for name in %r if name in sys.modules"
+        " and type(sys.modules[name]).__name__ != '_LazyModule']))" % (heavy_modules,)
+    )
+    for name, argv in commands.items():
+        record = dict(name=name, command=argv)
+        argv = [argv[0], argv[1] + check, *argv[2:]] if argv[0] == "-c" else argv
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            completed = subprocess.run([sys.executable, *argv], capture_output=True, text=True)
+            seconds.append(time.perf_counter() - start)
+            if completed.returncode != 0:
+                record["error"] = completed.stderr
+                break
+        else:
+            seconds.sort()
+            record.update(seconds=seconds[0], median_seconds=seconds[len(seconds) // 2])
+            if argv[0] == "-c":
+                record["heavy_modules"] = json.loads(completed.stdout.splitlines()[-1])
+        yield record
+
+
+def cases(
+        num_points=(10000,),
+        sh_degrees=(3,),
+        codecs=("draco3dgs", "vq"),
+        backends=("pyd", "exe"),
+        seed=0,
+        num_clusters=256,
+        max_iter=500,
+        **options
+) -> Iterable[dict]:
+    """All combinations of the given sizes, SH degrees, codecs and backends.
+    options are passed to the compressors, e.g. compression_level or qposition."""
+    for codec in codecs:
+        if codec not in ("draco3dgs", "vq"):
+            raise ValueError(f"Unknown codec: {codec}")
+        for backend in backends:
+            if backend not in ("pyd", "exe"):
+                raise ValueError(f"Unknown backend: {backend}")
+            for sh_degree in sh_degrees:
+                for n in num_points:
+                    case = dict(codec=codec, backend=backend, num_points=n, sh_degree=sh_degree, seed=seed, options=options)
+                    if codec == "vq":
+                        case.update(num_clusters=num_clusters, max_iter=max_iter)
+                    yield case
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    parser = ArgumentParser()
+    parser.add_argument("-n", "--num_points", nargs="+", default=[10000, 100000, 1000000], type=int)
+    parser.add_argument("--sh_degree", nargs="+", default=[0, 3], type=int)
+    parser.add_argument("--codec", nargs="+", default=["draco3dgs", "vq"], choices=["draco3dgs", "vq"], type=str)
+    parser.add_argument("--backend", nargs="+", default=["pyd", "exe"], choices=["pyd", "exe"], type=str)
+    parser.add_argument("--seed", default=0, type=int)
+    parser.add_argument("--compression_level", default=0, type=int)
+    parser.add_argument("--qposition", default=30, type=int)
+    parser.add_argument("--qscale", default=30, type=int)
+    parser.add_argument("--qrotation", default=30, type=int)
+    parser.add_argument("--qopacity", default=30, type=int)
+    parser.add_argument("--qfeaturedc", default=30, type=int)
+    parser.add_argument("--qfeaturerest", default=30, type=int)
+    parser.add_argument("--num_clusters", default=256, type=int)
+    parser.add_argument("--max_iter", default=500, type=int)
+    parser.add_argument("-o", "--output", default=None, type=str, help="write all records to this JSON file")
+    parser.add_argument("--startup", action="store_true", help="measure the cold start of imports and CLIs instead")
+    parser.add_argument("--startup_repeat", default=5, type=int)
+    parser.add_argument("--startup_budget", default=None, type=float, help="fail if a command takes longer (seconds)")
+    args = parser.parse_args()
+    records = []
+    for record in startup(repeat=args.startup_repeat) if args.startup else []:
+        if args.startup_budget is not None and record.get("seconds", 0) > args.startup_budget:
+            record["error"] = f"Over the startup budget of {args.startup_budget} s"
+        print(json.dumps(record), flush=True)
+        records.append(record)
+    for case in [] if args.startup else cases(
+        num_points=args.num_points,
+        sh_degrees=args.sh_degree,
+        codecs=args.codec,
+        backends=args.backend,
+        seed=args.seed,
+        num_clusters=args.num_clusters,
+        max_iter=args.max_iter,
+        compression_level=args.compression_level,
+        qposition=args.qposition,
+        qscale=args.qscale,
+        qrotation=args.qrotation,
+        qopacity=args.qopacity,
+        qfeaturedc=args.qfeaturedc,
+        qfeaturerest=args.qfeaturerest,
+    ):
+        record = run_case(case)
+        print(json.dumps(record), flush=True)
+        records.append(record)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(records, f, indent=2)
+    if any("error" in record for record in records):
+        sys.exit(1)
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import os
+import shutil
+import zlib
+from typing import TYPE_CHECKING, Iterator, Sequence, Union
+
+import numpy as np
+
+from . import draco3dgs
+from .compressor import Compressor, model_attributes, set_model_attributes
+from .container import ContainerReader, ContainerWriter
+from .lazy import lazy_import
+from .memfile import replaced_on_success
+from .quantization import VectorQuantizationCompressor, VectorQuantizationDecompressor, dracoreduced3dgs
+from .quantization.assignment import quantize as quantize_model
+from .quantization.codebook import pack_codebook, split_codebook
+from .spatial import curve_order
+
+if TYPE_CHECKING:
+    from gaussian_splatting import GaussianModel
+    from reduced_3dgs.quantization import VectorQuantizer
+
+torch = lazy_import("torch")
+
+# A bundle stores the levels of a LapisGS model, from the coarsest to the finest, in one chunked container,
+# so that clients can stream it and refine the model level by level without downloading a level twice.
+# A LapisGS level starts with the Gaussians of the previous level, of which only the opacities are retrained,
+# so it is stored as the Gaussians it adds ("points" block, a Draco buffer) plus, if they changed, the new
+# opacities of the inherited Gaussians ("opacity" block, zlib-compressed raw values in decoded order).
+# Levels that do not extend the previous one are stored whole.
+# Blocks: [shared codebook section, for the quantized codec], then per level: points, [opacity].
+# Points are encoded with Draco's sequential encoder (compression level 0), the only one that keeps their order,
+# so that the opacities of later levels can address the inherited Gaussians by row.
+
+attribute_names = ["positions", "scales", "rotations", "opacities", "features_dc", "features_rest"]
+
+
+class BundleCompressor:
+    def __init__(self, compressor: Union[Compressor, VectorQuantizationCompressor]):
+        if compressor.use_executable_backend:
+            raise ValueError("Bundles are not supported by the executable backend")
+        if compressor.compression_level != 0:
+            raise ValueError("Bundles require compression_level=0, the only level at which Draco keeps the order of the points")
+        self.compressor = compressor
+
+    def save_compressed(self, models: Sequence[GaussianModel], path: str, names: Sequence[str] = None):
+        """Save the levels of a LapisGS model, from the coarsest to the finest, to one file."""
+        names = [str(i) for i in range(len(models))] if names is None else list(names)
+        quantized = isinstance(self.compressor, VectorQuantizationCompressor)
+        if quantized:
+            # One codebook for all levels, fit on the finest level (which contains the others) if the quantizer has none yet
+            quantizer = self.compressor.quantizer
+            cache = self.compressor.assignment_cache
+            _, codebook_dict = quantize_model(quantizer, models[-1], cache)
+            levels = [self.compressor._quantized_attributes(model, quantize_model(quantizer, model, cache)[0]) for model in models]
+        else:
+            levels = [model_attributes(model, sh_degree=self.compressor._sh_degree(model)) for model in models]
+
+        metadata = dict(codec="dracoreduced3dgs" if quantized else "draco3dgs", bundle="lapisgs", codebook=quantized, levels=[])
+        for i, attributes in enumerate(levels):
+            num_inherited = inherited_points(levels[i - 1], attributes) if i > 0 else 0
+            metadata["levels"].append(dict(
+                name=names[i], num_points=attributes[0].shape[0], num_inherited=num_inherited,
+                opacity=num_inherited > 0 and not np.array_equal(attributes[3][:num_inherited], levels[i - 1][3]),
+            ))
+
+        with replaced_on_success(path) as temp_path, open(temp_path, 'wb') as f, ContainerWriter(f, metadata) as writer:
+            if quantized:
+                writer.write_block(pack_codebook({k: v.cpu().numpy() for k, v in codebook_dict.items()}, self.compressor.codebook_dtype), 0)
+            decoded_order = np.zeros(0, dtype=np.int64)  # rows of the current level, in the order a decoder sees them
+            for level, attributes in zip(metadata["levels"], levels):
+                num_inherited = level["num_inherited"]
+                positions = attributes[0][num_inherited:]
+                order = num_inherited + (curve_order(positions, self.compressor.reorder) if self.compressor.reorder else np.arange(positions.shape[0]))
+                writer.write_block(
+                    self.compressor._encode([attribute[order] for attribute in attributes]),
+                    len(order), np.concatenate([positions.min(0), positions.max(0)]) if len(positions) > 0 else None,
+                )
+                if level["opacity"]:
+                    writer.write_block(zlib.compress(np.ascontiguousarray(attributes[3][decoded_order]).tobytes()), num_inherited)
+                decoded_order = np.concatenate([decoded_order[:num_inherited], order])
+
+
+def inherited_points(previous, attributes) -> int:
+    """Number of leading Gaussians of a level that are those of the previous level (up to their opacities), 0 if it does not extend it."""
+    num_points = previous[0].shape[0]
+    if attributes[0].shape[0] < num_points:
+        return 0
+    for i, (prev, attribute) in enumerate(zip(previous, attributes)):
+        if i != 3 and not np.array_equal(prev, attribute[:num_points]):
+            return 0
+    return num_points
+
+
+class BundleDecompressor:
+    def __init__(self, quantizer: VectorQuantizer = None):
+        self.quantizer = quantizer
+
+    def iter_levels(self, model: GaussianModel, path: str) -> Iterator[str]:
+        """Load the levels of a bundle into model one after the other, yielding the name of each level once it is loaded.
+        Blocks are read in file order, so a level can be shown as soon as its own blocks are available."""
+        with open(path, 'rb') as f:
+            reader = ContainerReader(f)
+            codec = reader.metadata.get("codec")
+            if reader.metadata.get("bundle") != "lapisgs" or codec not in ("draco3dgs", "dracoreduced3dgs"):
+                raise ValueError("Not a LapisGS bundle")
+            if codec == "dracoreduced3dgs" and self.quantizer is None:
+                raise ValueError("A quantizer is required to load a quantized bundle")
+            blocks = (payload for _, payload in reader)
+            codebook_dict = split_codebook(next(blocks))[1] if reader.metadata["codebook"] else None
+            decoded = None
+            for level in reader.metadata["levels"]:
+                if codec == "draco3dgs":
+                    pc = draco3dgs.decode(next(blocks), transpose_features=True)
+                else:
+                    pc = dracoreduced3dgs.decode(next(blocks))
+                arrays = [getattr(pc, name) for name in attribute_names]
+                if level["num_inherited"] > 0:
+                    arrays = [np.concatenate([inherited[:level["num_inherited"]], array]) for inherited, array in zip(decoded, arrays)]
+                if level["opacity"]:
+                    opacities = np.frombuffer(zlib.decompress(next(blocks)), dtype=arrays[3].dtype)
+                    arrays[3][:level["num_inherited"]] = opacities.reshape(-1, *arrays[3].shape[1:])
+                decoded = arrays
+                self._set_model(model, codec, decoded, codebook_dict)
+                yield level["name"]
+
+    def load_compressed(self, model: GaussianModel, path: str, level: str = None):
+        """Load a bundle up to the given level (the finest one by default)."""
+        loaded = None
+        for loaded in self.iter_levels(model, path):
+            if loaded == level:
+                return
+        if level is not None:
+            raise ValueError(f"Level {level} not found in {path}, last level is {loaded}")
+
+    def _set_model(self, model: GaussianModel, codec: str, arrays, codebook_dict):
+        tensors = {name: torch.from_numpy(array).to(model._xyz.device) for name, array in zip(attribute_names, arrays)}
+        if codec == "draco3dgs":
+            set_model_attributes(model, tensors)
+        else:
+            VectorQuantizationDecompressor(self.quantizer)._dequantize(model, tensors, codebook_dict)
+
+
+def compress(
+        sh_degree: int,
+        load_plys: Sequence[str],
+        names: Sequence[str],
+        save_bundle: str,
+        qposition=30,
+        qscale=30,
+        qrotation=30,
+        qopacity=30,
+        qfeaturedc=30,
+        qfeaturerest=30,
+        reorder=None,
+):
+    from gaussian_splatting import GaussianModel
+    models = []
+    for load_ply in load_plys:
+        gaussians = GaussianModel(sh_degree)
+        gaussians.load_ply(load_ply)
+        models.append(gaussians)
+    compressor = Compressor(
+        qposition=qposition,
+        qscale=qscale,
+        qrotation=qrotation,
+        qopacity=qopacity,
+        qfeaturedc=qfeaturedc,
+        qfeaturerest=qfeaturerest,
+        reorder=reorder,
+    )
+    BundleCompressor(compressor).save_compressed(models, save_bundle, names)
+
+
+def quantize(
+        sh_degree: int,
+        load_plys: Sequence[str],
+        names: Sequence[str],
+        save_bundle: str,
+        qposition=30,
+        reorder=None,
+        codebook_dtype="float32",
+        **kwargs
+):
+    from gaussian_splatting import GaussianModel
+    from reduced_3dgs.quantization import ExcludeZeroSHQuantizer
+    models = []
+    for load_ply in load_plys:
+        gaussians = GaussianModel(sh_degree)
+        gaussians.load_ply(load_ply)
+        models.append(gaussians)
+    compressor = VectorQuantizationCompressor(
+        ExcludeZeroSHQuantizer(**kwargs),
+        qposition=qposition,
+        reorder=reorder,
+        codebook_dtype=codebook_dtype,
+    )
+    BundleCompressor(compressor).save_compressed(models, save_bundle, names)
+
+
+def decompress(
+        sh_degree: int,
+        load_bundle: str,
+        save_plys: Sequence[str],
+):
+    from gaussian_splatting import GaussianModel
+    from reduced_3dgs.quantization import ExcludeZeroSHQuantizer
+    gaussians = GaussianModel(sh_degree)
+    decompressor = BundleDecompressor(ExcludeZeroSHQuantizer())
+    for _, save_ply in zip(decompressor.iter_levels(gaussians, load_bundle), save_plys):
+        gaussians.save_ply(save_ply)
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    parser = ArgumentParser()
+    parser.add_argument("--sh_degree", default=3, type=int)
+    parser.add_argument("-s", "--source", required=True, type=str)
+    parser.add_argument("-d", "--destination", required=True, type=str)
+    parser.add_argument("-i", "--iteration", required=True, type=int)
+    parser.add_argument("--levels", nargs="+", default=["8x", "4x", "2x", "1x"], type=str, help="from the coarsest to the finest")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+    rootparser = parser
+    parser = subparsers.add_parser("compress")
+    parser.add_argument("--qposition", default=30, type=int)
+    parser.add_argument("--qscale", default=30, type=int)
+    parser.add_argument("--qrotation", default=30, type=int)
+    parser.add_argument("--qopacity", default=30, type=int)
+    parser.add_argument("--qfeaturedc", default=30, type=int)
+    parser.add_argument("--qfeaturerest", default=30, type=int)
+    parser.add_argument("--reorder", default=None, choices=["morton", "hilbert"], type=str)
+    parser = subparsers.add_parser("quantize")
+    parser.add_argument("--qposition", default=30, type=int)
+    parser.add_argument("--reorder", default=None, choices=["morton", "hilbert"], type=str)
+    parser.add_argument("--codebook_dtype", default="float32", choices=["float32", "float16", "uint8"], type=str)
+    parser.add_argument("--num_clusters", type=int, default=256)
+    parser.add_argument("--num_clusters_rotation_re", type=int, default=None)
+    parser.add_argument("--num_clusters_rotation_im", type=int, default=None)
+    parser.add_argument("--num_clusters_opacity", type=int, default=None)
+    parser.add_argument("--num_clusters_scaling", type=int, default=None)
+    parser.add_argument("--num_clusters_features_dc", type=int, default=None)
+    parser.add_argument("--num_clusters_features_rest", nargs="+", type=int, default=[])
+    parser = subparsers.add_parser("decompress")
+    args = rootparser.parse_args()
+    iteration = os.path.join("point_cloud", "iteration_" + str(args.iteration))
+    load_plys = [os.path.join(args.source, level, iteration, "point_cloud.ply") for level in args.levels]
+    bundle = os.path.join(args.destination, iteration, "point_cloud.bundle")
+    with torch.no_grad():
+        match args.mode:
+            case "compress":
+                compress(
+                    sh_degree=args.sh_degree,
+                    load_plys=load_plys,
+                    names=args.levels,
+                    save_bundle=bundle,
+                    qposition=args.qposition,
+                    qscale=args.qscale,
+                    qrotation=args.qrotation,
+                    qopacity=args.qopacity,
+                    qfeaturedc=args.qfeaturedc,
+                    qfeaturerest=args.qfeaturerest,
+                    reorder=args.reorder,
+                )
+            case "quantize":
+                quantize(
+                    sh_degree=args.sh_degree,
+                    load_plys=load_plys,
+                    names=args.levels,
+                    save_bundle=bundle,
+                    qposition=args.qposition,
+                    reorder=args.reorder,
+                    codebook_dtype=args.codebook_dtype,
+                    num_clusters=args.num_clusters,
+                    num_clusters_rotation_re=args.num_clusters_rotation_re,
+                    num_clusters_rotation_im=args.num_clusters_rotation_im,
+                    num_clusters_opacity=args.num_clusters_opacity,
+                    num_clusters_scaling=args.num_clusters_scaling,
+                    num_clusters_features_dc=args.num_clusters_features_dc,
+                    num_clusters_features_rest=args.num_clusters_features_rest
+                )
+            case "decompress":
+                save_plys = [os.path.join(args.destination, level, iteration, "point_cloud.ply") for level in args.levels]
+                for save_ply in save_plys:
+                    os.makedirs(os.path.dirname(save_ply), exist_ok=True)
+                decompress(
+                    sh_degree=args.sh_degree,
+                    load_bundle=bundle,
+                    save_plys=save_plys,
+                )
+                for level in args.levels:
+                    shutil.copy2(os.path.join(args.source, level, "cfg_args"), os.path.join(args.destination, level, "cfg_args"))
+                    shutil.copy2(os.path.join(args.source, level, "cameras.json"), os.path.join(args.destination, level, "cameras.json"))
+            case _:
+                raise ValueError(f"Unknown mode: {args.mode}")
@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import shutil
+import uuid
+import hashlib
+import tempfile
+from typing import Optional, Sequence
+
+# On-disk cache of encoded files, so that reruns of the CLIs on the same inputs and settings (e.g. compress.sh) copy
+# the previous output instead of loading, quantizing and encoding again. Entries are keyed by the content of the input
+# file and the parameters of the encode, and hold the files of one output: the .drc file and, with the legacy codebook
+# layout, its .codebook.npz file. Every entry is a directory <key> under the cache directory, written as a temporary
+# directory and renamed into place, and removed by renaming it away first, so that other processes see whole entries
+# or none without any lock; a reader that loses an entry to eviction takes it as a miss. Entries are evicted least
+# recently used first (a hit touches the directory) once their total size exceeds max_bytes.
+
+CACHE_VERSION = 1  # part of every key; bump when the output of the same parameters changes
+BLOCK_SIZE = 16 * 2**20
+stale_seconds = 24 * 3600  # temporary directories of interrupted processes are removed after this long
+
+
+def file_digest(path: str) -> bytes:
+    """BLAKE2b digest of the content of a file."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while block := f.read(BLOCK_SIZE):
+            digest.update(block)
+    return digest.digest()
+
+
+def encoder_parameters(encoder, codec: str, **parameters) -> dict:
+    """Parameters of the cache key of an encode by encoder (a Compressor or VectorQuantizationCompressor): the codec,
+    every setting of the encoder, defaults included, but the ones that do not change its output (executable, pool size,
+    assignment cache),
+    and parameters (e.g. the settings of the quantizer)."""
+    settings = {
+        name: value for name, value in vars(encoder).items()
+        if not name.startswith("_") and name not in ("encoder_executable", "max_workers", "quantizer", "assignment_cache")
+    }
+    return dict(settings, **parameters, codec=codec)
+
+
+class EncodeCache:
+    """Outputs of encodes in directory, at most max_bytes of them (unbounded if None)."""
+
+    def __init__(self, directory: str, max_bytes: int = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(path: str, parameters: dict) -> str:
+        """Key of the encode of the file at path with parameters (JSON-serializable, e.g. codec and quantization bits)."""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(file_digest(path))
+        digest.update(json.dumps(dict(parameters, cache_version=CACHE_VERSION), sort_keys=True).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str, path: str) -> Optional[dict]:
+        """Copy the cached output of key to path (and the files next to it) and return the info it was stored with,
+        None if it is not cached."""
+        entry = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry, "entry.json")) as f:
+                manifest = json.load(f)
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            stem = os.path.splitext(path)[0]
+            for i, suffix in enumerate(manifest["suffixes"]):
+                shutil.copyfile(os.path.join(entry, str(i)), path if suffix is None else stem + suffix)
+            os.utime(entry)
+        except FileNotFoundError:
+            return None
+        return manifest["info"]
+
+    def put(self, key: str, path: str, suffixes: Sequence[str] = (), info: dict = None):
+        """Store the output at path as key, with the files written next to it (path without extension + suffix,
+        e.g. ".codebook.npz") and info (JSON-serializable) for get."""
+        entry = os.path.join(self.directory, key)
+        if os.path.isdir(entry):
+            os.utime(entry)
+            return
+        temp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        try:
+            suffixes = [None, *suffixes]
+            stem = os.path.splitext(path)[0]
+            for i, suffix in enumerate(suffixes):
+                shutil.copyfile(path if suffix is None else stem + suffix, os.path.join(temp_dir, str(i)))
+            with open(os.path.join(temp_dir, "entry.json"), "w") as f:
+                json.dump(dict(suffixes=suffixes, info=info or {}), f)
+            os.rename(temp_dir, entry)
+        except OSError:
+            if not os.path.isdir(entry):  # not just another process storing the same entry first
+                raise
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until they fit in max_bytes."""
+        if self.max_bytes is None:
+            return
+        entries, total = [], 0
+        for item in os.scandir(self.directory):
+            try:
+                if item.name.startswith(".tmp-"):
+                    if time.time() - item.stat().st_mtime > stale_seconds:
+                        shutil.rmtree(item.path, ignore_errors=True)
+                    continue
+                size = sum(file.stat().st_size for file in os.scandir(item.path))
+                entries.append((item.stat().st_mtime, size, item.path))
+                total += size
+            except FileNotFoundError:  # evicted by another process
+                continue
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            removed = os.path.join(self.directory, f".tmp-{uuid.uuid4().hex}")
+            try:
+                os.rename(entry, removed)
+            except FileNotFoundError:
+                continue
+            else:
+                shutil.rmtree(removed, ignore_errors=True)
+            total -= size
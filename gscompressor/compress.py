@@ -1,8 +1,13 @@
 import shutil
-import torch
 import os
-from gaussian_splatting import GaussianModel
+import asyncio
+from contextlib import nullcontext
+from functools import partial
+from typing import List
 from gscompressor import Compressor, Decompressor
+from gscompressor.cache import EncodeCache, encoder_parameters
+from gscompressor.ply import PlyAttributes
+from gscompressor.trace import trace
 
 
 def compress(
@@ -18,9 +23,14 @@ def compress(
         qfeaturedc=30,
         qfeaturerest=30,
         use_executable_backend=False,
+        chunk_size=None,
+        spatial_partition=False,
+        reorder=None,
+        target_size=None,
+        max_error=None,
+        progressive_layers=None,
+        cache: EncodeCache = None,
 ):
-    gaussians = GaussianModel(sh_degree)
-    gaussians.load_ply(load_ply)
     compressor = Compressor(
         encoder_executable=encoder_executable,
         compression_level=compression_level,
@@ -31,8 +41,38 @@ def compress(
         qfeaturedc=qfeaturedc,
         qfeaturerest=qfeaturerest,
         use_executable_backend=use_executable_backend,
+        chunk_size=chunk_size,
+        spatial_partition=spatial_partition,
+        reorder=reorder,
+        target_size=target_size,
+        max_error=max_error,
+        progressive_layers=progressive_layers,
     )
-    compressor.save_compressed(gaussians, save_drc)
+    # Opened (only its header is read) before the cache is looked up, so that hits check the SH degree too
+    gaussians = read_ply(load_ply, sh_degree)
+    if cache is not None:
+        key = cache.key(load_ply, encoder_parameters(compressor, "draco3dgs"))
+        info = cache.get(key, save_drc)
+        if info is not None:
+            print_settings(info.get("settings"))
+            return
+    settings = compressor.save_compressed(gaussians, save_drc)
+    print_settings(settings)
+    if cache is not None:
+        cache.put(key, save_drc, info=dict(settings=settings))
+
+
+def print_settings(settings):
+    if settings is not None:
+        print("Rate control chose", " ".join(f"--{name}={bits}" for name, bits in settings.items()))
+
+
+def read_ply(path: str, sh_degree: int) -> PlyAttributes:
+    # The PLY file is memory-mapped and encoded in place, without a GaussianModel (see ply.py)
+    gaussians = PlyAttributes(path)
+    if gaussians.max_sh_degree != sh_degree:
+        raise ValueError(f"{path} has SH degree {gaussians.max_sh_degree}, expected {sh_degree}")
+    return gaussians
 
 
 def decompress(
@@ -42,13 +82,94 @@ def decompress(
         decoder_executable: str,
         use_executable_backend=False,
 ):
-    gaussians = GaussianModel(sh_degree)
+    # Decoded straight into the PLY file (see Decompressor.save_ply); the SH degree is that of the file
     decompressor = Decompressor(
         decoder_executable=decoder_executable,
         use_executable_backend=use_executable_backend,
     )
-    decompressor.load_compressed(gaussians, load_drc)
-    gaussians.save_ply(save_ply)
+    decompressor.save_ply(load_drc, save_ply)
+
+
+def copy_scene_files(source: str, destination: str):
+    """Copy the files of a scene that are not compressed (cfg_args, cameras.json and, if any, input.ply) next to the decompressed one."""
+    shutil.copy2(os.path.join(source, "cfg_args"), os.path.join(destination, "cfg_args"))
+    shutil.copy2(os.path.join(source, "cameras.json"), os.path.join(destination, "cameras.json"))
+    if os.path.exists(os.path.join(source, "input.ply")):
+        shutil.copy2(os.path.join(source, "input.ply"), os.path.join(destination, "input.ply"))
+
+
+def find_scenes(root: str, relative_path: str) -> List[str]:
+    """Directories under root (relative to it, sorted) that contain relative_path."""
+    return sorted(
+        os.path.relpath(directory, root) for directory, _, _ in os.walk(root)
+        if os.path.isfile(os.path.join(directory, relative_path))
+    )
+
+
+async def compress_many(
+        sh_degree: int,
+        source: str,
+        destination: str,
+        iteration: int,
+        max_workers=None,
+        cache: EncodeCache = None,
+        **kwargs
+) -> List[str]:
+    # Every scene under source (any directory with point_cloud/iteration_<iteration>/point_cloud.ply) is compressed
+    # to the same relative path under destination. Scenes overlap: PLY files are opened in the event loop's default
+    # executor while the compressor's pool encodes and writes the previous ones, and at most 2 * max_workers of them
+    # are mapped at once. kwargs are passed to Compressor. Cached scenes are copied from the cache (hashed and copied
+    # in the default executor).
+    loop = asyncio.get_running_loop()
+    iteration_dir = os.path.join("point_cloud", "iteration_" + str(iteration))
+    scenes = find_scenes(source, os.path.join(iteration_dir, "point_cloud.ply"))
+    semaphore = asyncio.Semaphore(2 * (max_workers or os.cpu_count() or 1))
+
+    async def compress_scene(scene: str):
+        load_ply = os.path.join(source, scene, iteration_dir, "point_cloud.ply")
+        save_drc = os.path.join(destination, scene, iteration_dir, "point_cloud.drc")
+        async with semaphore:
+            gaussians = await loop.run_in_executor(None, read_ply, load_ply, sh_degree)
+            if cache is not None:
+                key = await loop.run_in_executor(None, cache.key, load_ply, parameters)
+                if await loop.run_in_executor(None, cache.get, key, save_drc) is not None:
+                    return
+            settings = await compressor.save_compressed_async(gaussians, save_drc)
+            if cache is not None:
+                await loop.run_in_executor(None, partial(cache.put, key, save_drc, info=dict(settings=settings)))
+
+    with Compressor(max_workers=max_workers, **kwargs) as compressor:
+        parameters = encoder_parameters(compressor, "draco3dgs")  # the key of compress for the same settings
+        await asyncio.gather(*map(compress_scene, scenes))
+    return scenes
+
+
+async def decompress_many(
+        sh_degree: int,
+        source: str,
+        destination: str,
+        iteration: int,
+        max_workers=None,
+        **kwargs
+) -> List[str]:
+    # Counterpart of compress_many: every point_cloud.drc under destination is decompressed next to itself
+    # on the decompressor's pool, and the cfg_args, cameras.json and input.ply files of the scene are copied from source.
+    loop = asyncio.get_running_loop()
+    iteration_dir = os.path.join("point_cloud", "iteration_" + str(iteration))
+    scenes = find_scenes(destination, os.path.join(iteration_dir, "point_cloud.drc"))
+    semaphore = asyncio.Semaphore(2 * (max_workers or os.cpu_count() or 1))
+
+    async def decompress_scene(scene: str):
+        async with semaphore:
+            load_drc = os.path.join(destination, scene, iteration_dir, "point_cloud.drc")
+            await loop.run_in_executor(decompressor.executor, decompressor.save_ply, load_drc, os.path.splitext(load_drc)[0] + ".ply")
+        for name in ["cfg_args", "cameras.json", "input.ply"]:
+            if os.path.exists(os.path.join(source, scene, name)):
+                shutil.copy2(os.path.join(source, scene, name), os.path.join(destination, scene, name))
+
+    with Decompressor(max_workers=max_workers, **kwargs) as decompressor:
+        await asyncio.gather(*map(decompress_scene, scenes))
+    return scenes
 
 
 if __name__ == "__main__":
@@ -58,6 +179,10 @@ if __name__ == "__main__":
     parser.add_argument("-s", "--source", required=True, type=str)
     parser.add_argument("-d", "--destination", required=True, type=str)
     parser.add_argument("-i", "--iteration", required=True, type=int)
+    parser.add_argument("--many", action="store_true", help="source and destination are directories of scenes")
+    parser.add_argument("--max_workers", default=None, type=int)
+    parser.add_argument("--trace", default=None, type=str, help="save the timings of the stages to this file")
+    parser.add_argument("--trace_format", default="chrome", choices=["chrome", "json"], type=str)
     subparsers = parser.add_subparsers(dest="mode", required=True)
     rootparser = parser
     parser = subparsers.add_parser("compress")
@@ -70,13 +195,47 @@ if __name__ == "__main__":
     parser.add_argument("--qfeaturedc", default=30, type=int)
     parser.add_argument("--qfeaturerest", default=30, type=int)
     parser.add_argument("--use_executable_backend", action="store_true")
+    parser.add_argument("--chunk_size", default=None, type=int)
+    parser.add_argument("--spatial_partition", action="store_true")
+    parser.add_argument("--reorder", default=None, choices=["morton", "hilbert"], type=str)
+    parser.add_argument("--target_size", default=None, type=int, help="choose the q* bits for this size in bytes")
+    parser.add_argument("--max_error", default=None, type=float, help="choose the q* bits for this maximum error of every attribute")
+    parser.add_argument("--progressive_layers", default=None, type=int, help="order the Gaussians by importance in this many layers, to render prefixes of the file")
+    parser.add_argument("--cache", default=None, type=str, help="directory of a cache of encoded files, to skip unchanged inputs")
+    parser.add_argument("--cache_size", default=None, type=int, help="maximum size of the cache in bytes")
     parser = subparsers.add_parser("decompress")
     parser.add_argument("--decoder_executable", default=None, type=str)
     parser.add_argument("--use_executable_backend", action="store_true")
     args = rootparser.parse_args()
     save_drc = os.path.join(args.destination, "point_cloud", "iteration_" + str(args.iteration), "point_cloud.drc")
-    with torch.no_grad():
+    # Neither mode needs torch: PLY files are encoded in place and decoded straight into PLY files
+    with trace() if args.trace else nullcontext() as tracer:
         match args.mode:
+            case "compress" if args.many:
+                scenes = asyncio.run(compress_many(
+                    sh_degree=args.sh_degree,
+                    source=args.source,
+                    destination=args.destination,
+                    iteration=args.iteration,
+                    max_workers=args.max_workers,
+                    encoder_executable=args.encoder_executable,
+                    compression_level=args.compression_level,
+                    qposition=args.qposition,
+                    qscale=args.qscale,
+                    qrotation=args.qrotation,
+                    qopacity=args.qopacity,
+                    qfeaturedc=args.qfeaturedc,
+                    qfeaturerest=args.qfeaturerest,
+                    use_executable_backend=args.use_executable_backend,
+                    chunk_size=args.chunk_size,
+                    spatial_partition=args.spatial_partition,
+                    reorder=args.reorder,
+                    target_size=args.target_size,
+                    max_error=args.max_error,
+                    progressive_layers=args.progressive_layers,
+                    cache=EncodeCache(args.cache, args.cache_size) if args.cache else None,
+                ))
+                print(f"Compressed {len(scenes)} scenes")
             case "compress":
                 compress(
                     sh_degree=args.sh_degree,
@@ -91,8 +250,26 @@ if __name__ == "__main__":
                     qfeaturedc=args.qfeaturedc,
                     qfeaturerest=args.qfeaturerest,
                     use_executable_backend=args.use_executable_backend,
+                    chunk_size=args.chunk_size,
+                    spatial_partition=args.spatial_partition,
+                    reorder=args.reorder,
+                    target_size=args.target_size,
+                    max_error=args.max_error,
+                    progressive_layers=args.progressive_layers,
+                    cache=EncodeCache(args.cache, args.cache_size) if args.cache else None,
                 )
                 # Save the compressed model
+            case "decompress" if args.many:
+                scenes = asyncio.run(decompress_many(
+                    sh_degree=args.sh_degree,
+                    source=args.source,
+                    destination=args.destination,
+                    iteration=args.iteration,
+                    max_workers=args.max_workers,
+                    decoder_executable=args.decoder_executable,
+                    use_executable_backend=args.use_executable_backend,
+                ))
+                print(f"Decompressed {len(scenes)} scenes")
             case "decompress":
                 decompress(
                     sh_degree=args.sh_degree,
@@ -101,9 +278,8 @@ if __name__ == "__main__":
                     decoder_executable=args.decoder_executable,
                     use_executable_backend=args.use_executable_backend,
                 )
-                shutil.copy2(os.path.join(args.source, "cfg_args"), os.path.join(args.destination, "cfg_args"))
-                shutil.copy2(os.path.join(args.source, "cameras.json"), os.path.join(args.destination, "cameras.json"))
-                if os.path.exists(os.path.join(args.source, "input.ply")):
-                    shutil.copy2(os.path.join(args.source, "input.ply"), os.path.join(args.destination, "input.ply"))
+                copy_scene_files(args.source, args.destination)
             case _:
                 raise ValueError(f"Unknown mode: {args.mode}")
+    if args.trace:
+        tracer.save(args.trace, args.trace_format)
@@ -1,16 +1,119 @@
+from __future__ import annotations
+
 import os
+import copy
+import asyncio
 import platform
-import tempfile
 import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterator, Sequence, Tuple
 
-import torch
-from gaussian_splatting import GaussianModel
+import numpy as np
 
 from . import draco3dgs
+from .container import ContainerReader, ContainerWriter, is_container, prefix_blocks, read_prefix_header
+from .lazy import lazy_import
+from .memfile import replaced_on_success, temporary_files
+from .parallel import imap
+from .ply import PlyAllocator, PlyAttributes
+from .ratecontrol import AttributeStatistics, RateModel, allocate_bits, quantization_settings
+from .spatial import aabb_intersects, curve_order, morton_code, octree_partition
+from .staging import HostArrays, TensorAllocator, to_host
+from .trace import stage
+
+if TYPE_CHECKING:
+    from gaussian_splatting import GaussianModel
+
+torch = lazy_import("torch")
 
 default_encoder_executable = os.path.join(os.path.dirname(__file__), "draco_encoder") + (".exe" if platform.system() == "Windows" else "")
 default_decoder_executable = os.path.join(os.path.dirname(__file__), "draco_decoder") + (".exe" if platform.system() == "Windows" else "")
 
+attribute_shapes = dict(positions=(3,), scales=(3,), rotations=(4,), opacities=(1,), features_dc=(1, 3))  # GaussianModel layout, features_rest is (num_sh_coeffs, 3)
+
+
+def model_attributes(model: GaussianModel, index=slice(None), sh_degree: int = None):
+    return stage_model_attributes(model, index, sh_degree).result()
+
+
+def stage_model_attributes(model: GaussianModel, index=slice(None), sh_degree: int = None) -> HostArrays:
+    # The attributes of a model on a GPU are copied to the host asynchronously, all at once (see staging.to_host),
+    # so that the next chunk is staged while the previous ones are encoded
+    with stage("attributes") as s:
+        if isinstance(model, PlyAttributes):
+            staged = HostArrays(model.attributes(index, sh_degree))
+        else:
+            staged = to_host(_model_tensors(model, index, sh_degree))
+        s.set(bytes_out=sum(attribute.nbytes for attribute in staged.arrays))
+    return staged
+
+
+def _model_tensors(model: GaussianModel, index=slice(None), sh_degree: int = None):
+    # IMPORTANT: Use the same data layout as PLY format (transpose+flatten) for cross-compatibility
+    # with the executable backend. Direct reshape would produce different data ordering.
+    # If sh_degree is given, the SH features of higher degrees are dropped.
+    if isinstance(index, np.ndarray):
+        index = torch.from_numpy(index).to(model._xyz.device)
+    num_sh_coeffs = model._features_rest.shape[1] if sh_degree is None else (sh_degree + 1) ** 2 - 1
+    positions = model._xyz.detach()[index]  # (N, 3)
+    scales = model._scaling.detach()[index]  # (N, 3)
+    rotations = model._rotation.detach()[index]  # (N, 4)
+    opacities = model._opacity.detach()[index]  # (N, 1)
+    features_dc = model._features_dc.detach()[index].transpose(1, 2).flatten(start_dim=1)  # (N, 1, 3) -> (N, 3)
+    features_rest = model._features_rest.detach()[index][:, :num_sh_coeffs].transpose(1, 2).flatten(start_dim=1)  # (N, 15, 3) -> (N, 45) for SH degree 3
+    return positions, scales, rotations, opacities, features_dc, features_rest
+
+
+def model_positions(model: GaussianModel) -> np.ndarray:
+    if isinstance(model, PlyAttributes):
+        return model.positions
+    return model._xyz.detach().cpu().numpy()
+
+
+def importance_order(model: GaussianModel) -> np.ndarray:
+    """Indices of the Gaussians by decreasing importance: opacity (sigmoid of the stored logit) times volume (product of the exp of the stored log-scales)."""
+    if isinstance(model, PlyAttributes):
+        opacities, scales = model.opacities, model.scales
+    else:
+        opacities, scales = model._opacity.detach().cpu().numpy(), model._scaling.detach().cpu().numpy()
+    log_importance = -np.logaddexp(0, -opacities[:, 0].astype(np.float64)) + scales.astype(np.float64).sum(1)
+    return np.argsort(-log_importance, kind="stable")
+
+
+def layer_bounds(num_points: int, num_layers: int):
+    """Rows (begin, end) of the non-empty layers of a progressive file: the first num_points / 2^(num_layers - 1)
+    Gaussians, then every layer doubles the number decoded so far."""
+    ends = [round(num_points / 2 ** (num_layers - 1 - layer)) for layer in range(num_layers)]
+    return [(begin, end) for begin, end in zip([0] + ends[:-1], ends) if end > begin]
+
+
+def set_model_attributes(model: GaussianModel, tensors: Dict[str, torch.Tensor]):
+    """Replace the attributes of model with decoded tensors in GaussianModel layout; the model takes their SH degree."""
+    # IMPORTANT: features are stored as in PLY files, i.e. (N, num_channels, num_sh_coeffs) flattened,
+    # and transposed to (N, num_sh_coeffs, num_channels) by the decoder.
+    model._xyz = torch.nn.Parameter(tensors["positions"].requires_grad_(True))
+    model._scaling = torch.nn.Parameter(tensors["scales"].requires_grad_(True))
+    model._rotation = torch.nn.Parameter(tensors["rotations"].requires_grad_(True))
+    model._opacity = torch.nn.Parameter(tensors["opacities"].requires_grad_(True))
+    model._features_dc = torch.nn.Parameter(tensors["features_dc"].requires_grad_(True))
+    model._features_rest = torch.nn.Parameter(tensors["features_rest"].requires_grad_(True))
+    model.max_sh_degree = model.active_sh_degree = draco3dgs.sh_degree_of(tensors["features_rest"].shape[1] * 3)
+
+
+def draco_header(buffer) -> Tuple[int, int]:
+    """Number of points and SH degree of a Draco buffer, from its header."""
+    header = draco3dgs.probe(buffer, quantization_bits=False)
+    return header["num_points"], draco3dgs.sh_degree_of(header["attributes"].get("features_rest", {}).get("num_components", 0))
+
+
+def _executor(owner) -> ThreadPoolExecutor:
+    # Worker pool of a Compressor or Decompressor, created by the first thread that needs it
+    with owner._executor_lock:
+        if owner._executor is None:
+            owner._executor = ThreadPoolExecutor(max_workers=owner.max_workers)
+        return owner._executor
+
 
 class Compressor:
     def __init__(
@@ -24,7 +127,27 @@ class Compressor:
         qfeaturedc=30,
         qfeaturerest=30,
         use_executable_backend: bool = False,
+        max_workers: int = None,
+        chunk_size: int = None,
+        spatial_partition: bool = False,
+        reorder: str = None,
+        sh_degree: int = None,
+        target_size: int = None,
+        max_error=None,
+        progressive_layers: int = None,
     ):
+        if use_executable_backend and chunk_size:
+            raise ValueError("Chunked encoding is not supported by the executable backend")
+        if use_executable_backend and reorder:
+            raise ValueError("Reordering is not supported by the executable backend")
+        if use_executable_backend and sh_degree is not None:
+            raise ValueError("SH degree truncation is not supported by the executable backend")
+        if reorder not in (None, "morton", "hilbert"):
+            raise ValueError(f"Unknown reorder curve: {reorder}")
+        if spatial_partition and not chunk_size:
+            raise ValueError("Spatial partitioning requires chunk_size")
+        if progressive_layers is not None and (use_executable_backend or spatial_partition or progressive_layers < 1):
+            raise ValueError("Progressive layers require the extension backend, no spatial partitioning and at least one layer")
         if encoder_executable is None:
             encoder_executable = default_encoder_executable
         self.encoder_executable = encoder_executable
@@ -36,70 +159,228 @@ class Compressor:
         self.qfeaturedc = qfeaturedc
         self.qfeaturerest = qfeaturerest
         self.use_executable_backend = use_executable_backend
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.spatial_partition = spatial_partition
+        self.reorder = reorder
+        self.sh_degree = sh_degree
+        # Rate control: if target_size (bytes) and/or max_error (maximum reconstruction error, for all attributes or
+        # a dict of attribute name to error, see ratecontrol.quantization_settings) are set, the quantization bits
+        # are chosen by save_compressed and the q* arguments are ignored
+        self.target_size = target_size
+        self.max_error = max_error
+        # Progressive files (progressive_layers) are chunked files whose blocks hold the Gaussians by decreasing importance,
+        # in layers that double the number of Gaussians decoded so far (split into chunks of at most chunk_size, if set),
+        # so that a client can render every prefix of the file as it downloads (see PrefixDecoder)
+        self.progressive_layers = progressive_layers
+        # Both backends run Draco outside the GIL (the extension releases it, the executable is a subprocess),
+        # so a thread pool is enough to spread the encodings across cores. It is created on the first submit and lives
+        # as long as the compressor, so that batch jobs do not pay for a new pool per call. Only the pool persists:
+        # draco_encoder is a one-shot tool without a job protocol, so the executable backend still starts one
+        # process per job, while the extension is imported once per process and needs no worker processes.
+        self._executor = None
+        self._executor_lock = threading.Lock()
 
     def save_compressed(self, model: GaussianModel, path: str):
+        # model may also be a PlyAttributes, to compress a PLY file without loading it into a GaussianModel
+        if self.target_size is not None or self.max_error is not None:
+            with stage("rate_control", path=path):
+                return self._save_rate_controlled(model, path)
         if self.use_executable_backend:
             self._save_compressed_executable(model, path)
         else:
             self._save_compressed_pyd(model, path)
 
+    def _save_rate_controlled(self, model: GaussianModel, path: str, max_full_encodes: int = 3) -> Dict[str, int]:
+        # Returns the chosen bits, as keyword arguments of Compressor. The encodes write to a temporary file, which
+        # replaces path only once it is within the budget, so that a failure leaves no oversized file behind.
+        with replaced_on_success(path) as temp_path:
+            return self._encode_rate_controlled(model, temp_path, max_full_encodes)
+
+    def _encode_rate_controlled(self, model: GaussianModel, path: str, max_full_encodes: int) -> Dict[str, int]:
+        attributes = model_attributes(model, self._order(model), self._sh_degree(model))
+        statistics = AttributeStatistics(attributes)
+        # Without a byte budget, the attributes that max_error does not bound keep the q* bits of the compressor;
+        # with one, they start from the fewest bits and get the bits that the budget allows
+        unbounded_bits = {name: getattr(self, setting) for name, setting in quantization_settings.items()} if self.target_size is None else None
+        min_bits = statistics.bits_for_error(self.max_error if self.max_error is not None else {}, min_bits=4, unbounded_bits=unbounded_bits)
+        if self.target_size is None:
+            return self._save_with_bits(model, path, min_bits)
+        rate_model = RateModel(attributes, compression_level=self.compression_level, max_workers=self.max_workers)
+        target_size = self.target_size
+        for _ in range(max_full_encodes):
+            settings = self._save_with_bits(model, path, allocate_bits(statistics, rate_model, target_size, min_bits))
+            size = os.path.getsize(path)
+            if size <= self.target_size:
+                return settings
+            # The rate model underestimated the size: aim lower by the overshoot
+            target_size *= self.target_size / size
+        raise ValueError(f"No settings within {self.target_size} bytes found in {max_full_encodes} encodes, the last one took {size} bytes")
+
+    def _save_with_bits(self, model: GaussianModel, path: str, bits: Dict[str, int]) -> Dict[str, int]:
+        settings = {quantization_settings[name]: value for name, value in bits.items()}
+        compressor = copy.copy(self)
+        compressor.__dict__.update(settings, target_size=None, max_error=None)
+        compressor.save_compressed(model, path)
+        return settings
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Worker pool of max_workers threads, created on first use."""
+        return _executor(self)
+
+    def submit(self, model: GaussianModel, path: str) -> Future:
+        """Queue save_compressed(model, path) on the worker pool (max_workers jobs run at once, i.e. at most
+        max_workers encoder processes with the executable backend). The model must not change until the future is done."""
+        return self.executor.submit(self.save_compressed, model, path)
+
+    async def save_compressed_async(self, model: GaussianModel, path: str):
+        """save_compressed on the worker pool, awaitable without blocking the event loop; returns what it returns."""
+        return await asyncio.wrap_future(self.submit(model, path))
+
+    def save_compressed_many(self, models: Sequence[GaussianModel], paths: Sequence[str]):
+        for future in [self.submit(model, path) for model, path in zip(models, paths)]:
+            future.result()
+
+    def close(self):
+        """Wait for the queued jobs and stop the worker pool."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def _save_compressed_executable(self, model: GaussianModel, path: str):
-        with tempfile.TemporaryDirectory() as temp_dir:
-            ply_path = os.path.join(temp_dir, "point_cloud.ply")
-            model.save_ply(ply_path)
+        with temporary_files("point_cloud.ply") as (ply_path,):
+            if isinstance(model, PlyAttributes):
+                ply_path = model.path  # already a PLY file
+            else:
+                model.save_ply(ply_path)
             os.makedirs(os.path.dirname(path), exist_ok=True)
-            subprocess.check_call([
-                self.encoder_executable,
-                "-i", ply_path, "-o", path,
-                "-cl", str(self.compression_level),
-                "-qp", str(self.qposition),
-                "-qscale", str(self.qscale),
-                "-qrotation", str(self.qrotation),
-                "-qopacity", str(self.qopacity),
-                "-qfeaturedc", str(self.qfeaturedc),
-                "-qfeaturerest", str(self.qfeaturerest),
-            ])
+            with stage("encode_executable", path=path):
+                subprocess.check_call([
+                    self.encoder_executable,
+                    "-i", ply_path, "-o", path,
+                    "-cl", str(self.compression_level),
+                    "-qp", str(self.qposition),
+                    "-qscale", str(self.qscale),
+                    "-qrotation", str(self.qrotation),
+                    "-qopacity", str(self.qopacity),
+                    "-qfeaturedc", str(self.qfeaturedc),
+                    "-qfeaturerest", str(self.qfeaturerest),
+                ])
 
     def _save_compressed_pyd(self, model: GaussianModel, path: str):
         # NOTE: This method does NOT save normals data, unlike _save_compressed_executable.
         # The executable backend reads from a PLY file which includes normals (nx, ny, nz),
         # while this Python extension (draco3dgs) only encodes the attributes listed below.
         # As a result, the compressed output from this method will differ from the executable backend.
-
-        # Extract model attributes
-        # IMPORTANT: Use the same data layout as PLY format (transpose+flatten) for cross-compatibility
-        # with the executable backend. Direct reshape would produce different data ordering.
-        positions = model._xyz.detach().cpu().numpy()  # (N, 3)
-        scales = model._scaling.detach().cpu().numpy()  # (N, 3)
-        rotations = model._rotation.detach().cpu().numpy()  # (N, 4)
-        opacities = model._opacity.detach().cpu().numpy()  # (N, 1)
-        features_dc = model._features_dc.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()  # (N, 1, 3) -> (N, 3)
-        features_rest = model._features_rest.detach().transpose(1, 2).flatten(start_dim=1).contiguous().cpu().numpy()  # (N, 15, 3) -> (N, 45)
+        if self.chunk_size or self.progressive_layers:
+            return self._save_compressed_chunked(model, path)
 
         # Encode
-        encoded = draco3dgs.encode(
-            positions, scales, rotations, opacities, features_dc, features_rest,
-            self.compression_level,
-            self.qposition, self.qscale, self.qrotation,
-            self.qopacity, self.qfeaturedc, self.qfeaturerest
-        )
+        encoded = self._encode(model_attributes(model, self._order(model), self._sh_degree(model)))
 
         # Write to file
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, 'wb') as f:
+        with stage("write", path=path, bytes_in=len(encoded)), open(path, 'wb') as f:
             f.write(encoded)
 
+    def _save_compressed_chunked(self, model: GaussianModel, path: str):
+        # Every chunk of at most chunk_size Gaussians is an independent Draco point cloud,
+        # so only one chunk per worker has to be staged on the host at a time.
+        # Progressive files are chunked by layer of importance, and then by chunk_size if it is set.
+        num_points = model_positions(model).shape[0]
+        layers = None
+        if self.progressive_layers:
+            order, positions = importance_order(model), model_positions(model)
+            layers = layer_bounds(num_points, self.progressive_layers)
+            chunks = []
+            for begin, end in layers:
+                layer = order[begin:end]
+                if self.reorder:  # within the layer, which keeps the layers in order of importance
+                    layer = layer[curve_order(positions[layer], self.reorder)]
+                size = self.chunk_size or len(layer)
+                chunks += [layer[i:i + size] for i in range(0, len(layer), size)]
+        elif self.spatial_partition:
+            # Chunks are octree cells in Morton order, so that their bounding boxes are tight
+            # and a region can be decoded from only the cells it intersects (this also makes reorder redundant).
+            codes = morton_code(model_positions(model)) if num_points > 0 else np.zeros(0, dtype=np.uint64)
+            order = np.argsort(codes, kind="stable")
+            chunks = [order[begin:end] for begin, end in octree_partition(codes[order], self.chunk_size)]
+        else:
+            chunks = [slice(begin, min(begin + self.chunk_size, num_points)) for begin in range(0, num_points, self.chunk_size)]
+            if self.reorder:
+                order = self._order(model)
+                chunks = [order[chunk] for chunk in chunks]
+
+        sh_degree = self._sh_degree(model)
+
+        def encode_chunk(chunk):
+            attributes = chunk.result() if isinstance(chunk, HostArrays) else model_attributes(model, chunk, sh_degree)
+            positions = attributes[0]
+            return self._encode(attributes), positions.shape[0], np.concatenate([positions.min(0), positions.max(0)])
+
+        metadata = dict(codec="draco3dgs", chunk_size=self.chunk_size, spatial_partition=self.spatial_partition, sh_degree=sh_degree)
+        if layers is not None:
+            metadata["layers"] = [end - begin for begin, end in layers]
+        # The index is written last, so the container replaces path only once it is complete (see memfile.py)
+        with replaced_on_success(path) as temp_path, open(temp_path, 'wb') as f, ContainerWriter(f, metadata) as writer:
+            # The chunks of a model on a GPU are staged here, up to 2 * max_workers ahead of the workers that encode them;
+            # the others are gathered by the workers themselves
+            if not isinstance(model, PlyAttributes) and model._xyz.is_cuda:
+                chunks = (stage_model_attributes(model, chunk, sh_degree) for chunk in chunks)
+            for encoded, num_chunk_points, aabb in imap(encode_chunk, chunks, self.max_workers):
+                with stage("write", path=path, bytes_in=len(encoded)):
+                    writer.write_block(encoded, num_chunk_points, aabb)
+
+    def _sh_degree(self, model: GaussianModel) -> int:
+        # The SH degree is carried by the number of features_rest components, so lower degrees just encode fewer of them
+        if self.sh_degree is None:
+            return model.max_sh_degree
+        if self.sh_degree > model.max_sh_degree:
+            raise ValueError(f"Cannot encode SH degree {self.sh_degree} from a model of SH degree {model.max_sh_degree}")
+        return self.sh_degree
+
+    def _order(self, model: GaussianModel):
+        # Splats are unordered, so sorting them along a space-filling curve is free and lets
+        # Draco's predictors see spatially coherent neighbours; the permutation is not stored.
+        if not self.reorder:
+            return slice(None)
+        return curve_order(model_positions(model), self.reorder)
+
+    def _encode(self, attributes):
+        with stage("encode", bytes_in=sum(attribute.nbytes for attribute in attributes)) as s:
+            encoded = draco3dgs.encode_buffer(
+                *attributes,
+                self.compression_level,
+                self.qposition, self.qscale, self.qrotation,
+                self.qopacity, self.qfeaturedc, self.qfeaturerest,
+                stats=s.stats
+            )
+            s.set(bytes_out=len(encoded))
+        return encoded
+
 
 class Decompressor:
     def __init__(
         self,
         decoder_executable: str = None,
         use_executable_backend: bool = False,
+        max_workers: int = None,
     ):
         if decoder_executable is None:
             decoder_executable = default_decoder_executable
         self.decoder_executable = decoder_executable
         self.use_executable_backend = use_executable_backend
+        self.max_workers = max_workers
+        self._executor = None  # see Compressor
+        self._executor_lock = threading.Lock()
 
     def load_compressed(self, model: GaussianModel, path: str):
         if self.use_executable_backend:
@@ -107,32 +388,225 @@ class Decompressor:
         else:
             self._load_compressed_pyd(model, path)
 
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Worker pool of max_workers threads, created on first use."""
+        return _executor(self)
+
+    def submit(self, model: GaussianModel, path: str) -> Future:
+        """Queue load_compressed(model, path) on the worker pool; the future resolves to model once it is loaded."""
+        def load():
+            self.load_compressed(model, path)
+            return model
+        return self.executor.submit(load)
+
+    async def load_compressed_async(self, model: GaussianModel, path: str) -> GaussianModel:
+        """load_compressed on the worker pool, awaitable without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(model, path))
+
+    def load_compressed_many(self, models: Sequence[GaussianModel], paths: Sequence[str]):
+        for future in [self.submit(model, path) for model, path in zip(models, paths)]:
+            future.result()
+
+    def close(self):
+        """Wait for the queued jobs and stop the worker pool."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def _load_compressed_executable(self, model: GaussianModel, path: str):
-        with tempfile.TemporaryDirectory() as temp_dir:
-            ply_path = os.path.join(temp_dir, "point_cloud.ply")
-            subprocess.check_call([
-                self.decoder_executable,
-                "-i", path, "-o", ply_path,
-            ])
-            model.load_ply(ply_path)
+        with temporary_files("point_cloud.ply") as (ply_path,):
+            with stage("decode_executable", path=path):
+                subprocess.check_call([
+                    self.decoder_executable,
+                    "-i", path, "-o", ply_path,
+                ])
+            with stage("read_ply", path=ply_path):
+                model.load_ply(ply_path)
+
+    def iter_compressed(self, path: str, aabb=None, attributes=None) -> Iterator[draco3dgs.PointCloud]:
+        # Chunked files are decoded block by block (in parallel, with a bounded number of blocks in flight);
+        # plain Draco files are a single block.
+        # If aabb ([min x, min y, min z], [max x, max y, max z]) is given, only the blocks whose bounding box
+        # intersects it are read from the index and decoded; plain Draco files are still decoded in full.
+        # If attributes (names in draco3dgs.attribute_names) are given, the others are skipped and None.
+        def decode(payload):
+            return draco3dgs.decode(payload, attributes=attributes)
+
+        with open(path, 'rb') as f:
+            if not is_container(f):
+                yield decode(f.read())
+                return
+            reader = self._open_container(f)
+            if aabb is None:
+                yield from imap(decode, (payload for _, payload in reader), self.max_workers)
+                return
+            yield from imap(decode, map(reader.read_block, self._select_blocks(reader, aabb)), self.max_workers)
+
+    def _open_container(self, f) -> ContainerReader:
+        reader = ContainerReader(f)
+        if reader.metadata.get("codec") != "draco3dgs":
+            raise ValueError(f"Unsupported codec: {reader.metadata.get('codec')}")
+        return reader
+
+    def _select_blocks(self, reader: ContainerReader, aabb=None):
+        if aabb is None:
+            return reader.blocks
+        aabb = np.asarray(aabb, dtype=np.float64).reshape(2, 3)
+        return [block for block in reader.blocks if aabb_intersects(np.asarray(block.aabb).reshape(2, 3), aabb)]
+
+    def load_region(self, model: GaussianModel, path: str, aabb):
+        """Load the Gaussians of every cell intersecting aabb; cells are loaded whole, so points
+        slightly outside the box are included. Best used on files saved with spatial_partition."""
+        self._load_blocks(model, path, aabb)
+
+    def load_attributes(self, path: str, attributes, aabb=None, device="cpu") -> Dict[str, torch.Tensor]:
+        """Decode only some attributes (names in draco3dgs.attribute_names) to tensors in GaussianModel layout,
+        without building a GaussianModel, e.g. positions and opacities for previews or bounding volumes.
+        The other attributes are skipped by the decoder. aabb is as in load_region."""
+        return self._decode_blocks(path, device, aabb, attributes)
 
     def _load_compressed_pyd(self, model: GaussianModel, path: str):
-        # Read from file
+        self._load_blocks(model, path)
+
+    def _load_blocks(self, model: GaussianModel, path: str, aabb=None):
+        set_model_attributes(model, self._decode_blocks(path, model._xyz.device, aabb, sh_degree=model.max_sh_degree))
+
+    def save_ply(self, path: str, ply_path: str):
+        """Decode path straight into a binary PLY file at ply_path (the format of GaussianModel.save_ply), without
+        torch or a GaussianModel: Draco writes every attribute into the preallocated vertex records, which are
+        written at once. The PLY file of the executable backend is rewritten in the same format, so that both
+        backends write the same file."""
+        if self.use_executable_backend:
+            with temporary_files("point_cloud.ply") as (decoded_path,):
+                with stage("decode_executable", path=path):
+                    subprocess.check_call([self.decoder_executable, "-i", path, "-o", decoded_path])
+                with stage("read_ply", path=decoded_path):
+                    allocator = PlyAllocator.read(decoded_path)
+        else:
+            allocator = self._decode_into(path, PlyAllocator)
+        with stage("write", path=ply_path, bytes_in=allocator.vertices.nbytes):
+            allocator.write(ply_path)
+
+    def _decode_blocks(self, path: str, device, aabb=None, attributes=None, sh_degree=None) -> Dict[str, torch.Tensor]:
+        allocator = self._decode_into(path, lambda num_points, _: TensorAllocator(device, num_points), aabb, attributes, True, sh_degree)
+        with stage("upload", device=str(device)):
+            return allocator.to(device)
+
+    def _decode_into(self, path: str, make_allocator, aabb=None, attributes=None, transpose_features=False, sh_degree=None):
+        # Draco writes every attribute straight into the final memory, make_allocator(num_points, sh_degree)
+        # (e.g. tensors, pinned if they are bound for a GPU, or PLY vertex records), in its final layout,
+        # and the blocks of a chunked file each into their own rows,
+        # so the attributes are neither copied, concatenated nor transposed on the host.
         with open(path, 'rb') as f:
-            buffer = f.read()
-
-        # Decode
-        pc = draco3dgs.decode(buffer)
-
-        # Set model attributes
-        # IMPORTANT: Use the same data layout as PLY format for cross-compatibility.
-        # Features are stored in PLY as (N, num_channels, num_sh_coeffs) and then transposed.
-        # - features_dc: (N, 3) -> reshape to (N, 3, 1) -> transpose to (N, 1, 3)
-        # - features_rest: (N, 45) -> reshape to (N, 3, 15) -> transpose to (N, 15, 3)
-        device = model._xyz.device
-        model._xyz = torch.nn.Parameter(torch.tensor(pc.positions, dtype=torch.float, device=device).requires_grad_(True))
-        model._scaling = torch.nn.Parameter(torch.tensor(pc.scales, dtype=torch.float, device=device).requires_grad_(True))
-        model._rotation = torch.nn.Parameter(torch.tensor(pc.rotations, dtype=torch.float, device=device).requires_grad_(True))
-        model._opacity = torch.nn.Parameter(torch.tensor(pc.opacities, dtype=torch.float, device=device).requires_grad_(True))
-        model._features_dc = torch.nn.Parameter(torch.tensor(pc.features_dc.reshape(-1, 3, 1), dtype=torch.float, device=device).transpose(1, 2).contiguous().requires_grad_(True))
-        model._features_rest = torch.nn.Parameter(torch.tensor(pc.features_rest.reshape(-1, 3, 15), dtype=torch.float, device=device).transpose(1, 2).contiguous().requires_grad_(True))
+            if not is_container(f):
+                with stage("read", path=path) as s:
+                    buffer = f.read()
+                    s.set(bytes_out=len(buffer))
+                allocator = make_allocator(*draco_header(buffer))
+                self._decode(buffer, allocator, transpose_features, attributes)
+            else:
+                reader = self._open_container(f)
+                blocks = self._select_blocks(reader, aabb)
+                sh_degree = reader.metadata.get("sh_degree", sh_degree)
+                if sh_degree is None and blocks:
+                    sh_degree = draco_header(reader.read_block(blocks[0]))[1]
+                allocator = make_allocator(sum(block.num_points for block in blocks), sh_degree)
+                offsets = np.cumsum([0] + [block.num_points for block in blocks[:-1]]).tolist()
+
+                def decode_block(item):
+                    block, payload, offset = item
+                    if self._decode(payload, allocator.at(offset), transpose_features, attributes).num_points != block.num_points:
+                        raise ValueError("Decoded block does not match the container index")
+
+                def read_block(block):
+                    with stage("read", path=path, bytes_out=block.size):
+                        return reader.read_block(block)
+
+                # Payloads are read here, in file order, and decoded by the workers
+                for _ in imap(decode_block, ((block, read_block(block), offset) for block, offset in zip(blocks, offsets)), self.max_workers):
+                    pass
+                if not blocks:  # e.g. a region outside the scene
+                    for name, shape in dict(attribute_shapes, features_rest=((sh_degree + 1) ** 2 - 1, 3)).items():
+                        if attributes is None or name in attributes:
+                            allocator(name, (0, *shape), "float32")
+        return allocator
+
+    def _decode(self, buffer, allocator, transpose_features=False, attributes=None) -> draco3dgs.PointCloud:
+        with stage("decode", bytes_in=len(buffer)) as s:
+            return draco3dgs.decode(buffer, allocator, transpose_features=transpose_features, attributes=attributes, stats=s.stats)
+
+    def decode_prefix(self, prefix, device="cpu") -> Dict[str, torch.Tensor]:
+        """Decode the Gaussians of the complete blocks of a prefix of a chunked file (e.g. a partial download) to tensors
+        in GaussianModel layout; for files saved with progressive_layers, these are the most important ones.
+        Use a PrefixDecoder to decode a growing download without decoding its blocks again."""
+        decoder = PrefixDecoder(self.max_workers)
+        decoder.update(prefix)
+        return decoder.tensors(device)
+
+    def load_prefix(self, model: GaussianModel, prefix) -> int:
+        """Load the Gaussians of the complete blocks of a prefix of a chunked file into model; returns their number."""
+        tensors = self.decode_prefix(prefix, model._xyz.device)
+        set_model_attributes(model, tensors)
+        return tensors["positions"].shape[0]
+
+
+class PrefixDecoder:
+    """Decoder of a chunked file as it downloads: update(prefix) with the bytes received so far decodes the blocks
+    completed since the last update, and tensors() / load(model) return the Gaussians of all decoded blocks,
+    e.g. to render the most important Gaussians of a file saved with progressive_layers first."""
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers
+        self.metadata = None
+        self.offset = None  # of the next block
+        self.blocks = []  # tensors of the decoded blocks, in file order
+        self.num_points = 0
+
+    def update(self, prefix) -> int:
+        """Decode the blocks of prefix (the first bytes of the file, the previous ones included) that were not
+        complete before; returns the number of Gaussians decoded so far."""
+        if self.metadata is None:
+            header = read_prefix_header(prefix)  # plain Draco files cannot be decoded from a prefix
+            if header is None:
+                return self.num_points
+            self.metadata, self.offset = header
+            if self.metadata.get("codec") != "draco3dgs":
+                raise ValueError(f"Unsupported codec: {self.metadata.get('codec')}")
+        blocks = list(prefix_blocks(prefix, self.offset))
+        if not blocks:
+            return self.num_points
+
+        def decode_block(item):
+            block, payload = item
+            allocator = TensorAllocator("cpu", block.num_points)
+            with stage("decode", bytes_in=block.size) as s:
+                if draco3dgs.decode(payload, allocator, transpose_features=True, stats=s.stats).num_points != block.num_points:
+                    raise ValueError("Decoded block does not match its header")
+            return allocator.tensors
+
+        self.blocks += imap(decode_block, blocks, self.max_workers)
+        self.offset = blocks[-1][0].offset + blocks[-1][0].size
+        self.num_points += sum(block.num_points for block, _ in blocks)
+        return self.num_points
+
+    def tensors(self, device="cpu") -> Dict[str, torch.Tensor]:
+        """The Gaussians decoded so far, as tensors in GaussianModel layout on device (no rows before the first block)."""
+        if not self.blocks:
+            sh_degree = (self.metadata or {}).get("sh_degree") or 0
+            shapes = dict(attribute_shapes, features_rest=((sh_degree + 1) ** 2 - 1, 3))
+            return {name: torch.empty((0, *shape), device=device) for name, shape in shapes.items()}
+        with stage("upload", device=str(device)):
+            return {name: torch.cat([block[name] for block in self.blocks]).to(device) for name in self.blocks[0]}
+
+    def load(self, model: GaussianModel) -> int:
+        """Load the Gaussians decoded so far into model; returns their number."""
+        set_model_attributes(model, self.tensors(model._xyz.device))
+        return self.num_points
@@ -0,0 +1,163 @@
+import json
+import struct
+import math
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# Chunked container layout (all integers little-endian):
+#   header:  magic "GSCC" | u16 version | u16 reserved | u32 metadata length | metadata (UTF-8 JSON)
+#   blocks:  magic "GSCB" | u64 payload size | u32 number of points | 6 x f32 bounding box | payload (an independent Draco buffer)
+#   index:   magic "GSCI" | (u64 payload offset | u64 payload size | u32 number of points | 6 x f32 bounding box) per block
+#   trailer: u32 number of blocks | u64 index offset | magic "GSCE"
+# The index is written after the blocks so that the writer can stream blocks without knowing their count,
+# while the self-delimiting blocks still let a reader walk the file sequentially without the index.
+# Bounding boxes are (min x, min y, min z, max x, max y, max z) of the block positions, NaN if unknown.
+
+MAGIC = b"GSCC"
+VERSION = 1
+BLOCK_MAGIC = b"GSCB"
+INDEX_MAGIC = b"GSCI"
+END_MAGIC = b"GSCE"
+
+_header = struct.Struct("<4sHHI")
+_block_header = struct.Struct("<4sQI6f")
+_index_entry = struct.Struct("<QQI6f")
+_trailer = struct.Struct("<IQ4s")
+
+
+class BlockInfo(NamedTuple):
+    offset: int
+    size: int
+    num_points: int
+    aabb: Tuple[float, float, float, float, float, float] = (math.nan,) * 6
+
+
+def is_container(file: BinaryIO) -> bool:
+    position = file.tell()
+    magic = file.read(len(MAGIC))
+    file.seek(position)
+    return magic == MAGIC
+
+
+def read_prefix_header(prefix) -> Optional[Tuple[dict, int]]:
+    """Metadata and offset of the first block of a container from a prefix of it (e.g. a partial download),
+    None if the prefix ends before them."""
+    prefix = memoryview(prefix)
+    if prefix.nbytes < _header.size:
+        return None
+    magic, version, _, meta_size = _header.unpack(prefix[:_header.size])
+    if magic != MAGIC:
+        raise ValueError("Not a chunked container")
+    if version > VERSION:
+        raise ValueError(f"Unsupported container version: {version}")
+    if prefix.nbytes < _header.size + meta_size:
+        return None
+    return json.loads(bytes(prefix[_header.size:_header.size + meta_size]).decode("utf-8")), _header.size + meta_size
+
+
+def prefix_blocks(prefix, offset: int) -> Iterator[Tuple[BlockInfo, memoryview]]:
+    """Blocks of a prefix of a container, from the one at offset on, that are complete in the prefix."""
+    prefix = memoryview(prefix)
+    while prefix.nbytes >= offset + len(BLOCK_MAGIC):
+        magic = bytes(prefix[offset:offset + len(BLOCK_MAGIC)])
+        if magic == INDEX_MAGIC:
+            return
+        if magic != BLOCK_MAGIC:
+            raise ValueError("Corrupted container block")
+        if prefix.nbytes < offset + _block_header.size:
+            return
+        _, size, num_points, *aabb = _block_header.unpack(prefix[offset:offset + _block_header.size])
+        block = BlockInfo(offset + _block_header.size, size, num_points, tuple(aabb))
+        if prefix.nbytes < block.offset + block.size:
+            return
+        yield block, prefix[block.offset:block.offset + block.size]
+        offset = block.offset + block.size
+
+
+class ContainerWriter:
+    def __init__(self, file: BinaryIO, metadata: dict = None):
+        self.file = file
+        self.blocks: List[BlockInfo] = []
+        meta = json.dumps(metadata or {}).encode("utf-8")
+        self.file.write(_header.pack(MAGIC, VERSION, 0, len(meta)))
+        self.file.write(meta)
+
+    def write_block(self, payload, num_points: int, aabb: Sequence[float] = None) -> BlockInfo:
+        payload = memoryview(payload)
+        aabb = (math.nan,) * 6 if aabb is None else tuple(float(v) for v in aabb)
+        self.file.write(_block_header.pack(BLOCK_MAGIC, payload.nbytes, num_points, *aabb))
+        block = BlockInfo(self.file.tell(), payload.nbytes, num_points, aabb)
+        self.file.write(payload)
+        self.blocks.append(block)
+        return block
+
+    def close(self):
+        index_offset = self.file.tell()
+        self.file.write(INDEX_MAGIC)
+        for block in self.blocks:
+            self.file.write(_index_entry.pack(*block[:3], *block.aabb))
+        self.file.write(_trailer.pack(len(self.blocks), index_offset, END_MAGIC))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+
+class ContainerReader:
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        magic, version, _, meta_size = _header.unpack(self._read_exactly(_header.size))
+        if magic != MAGIC:
+            raise ValueError("Not a chunked container")
+        if version > VERSION:
+            raise ValueError(f"Unsupported container version: {version}")
+        self.version = version
+        self.metadata = json.loads(self._read_exactly(meta_size).decode("utf-8"))
+        self.data_offset = self.file.tell()
+        self._blocks = None
+
+    def _read_exactly(self, size: int) -> bytes:
+        data = self.file.read(size)
+        if len(data) != size:
+            raise ValueError("Truncated container")
+        return data
+
+    @property
+    def blocks(self) -> List[BlockInfo]:
+        """Block index, read from the end of the file on first access."""
+        if self._blocks is None:
+            self.file.seek(-_trailer.size, 2)
+            num_blocks, index_offset, magic = _trailer.unpack(self._read_exactly(_trailer.size))
+            if magic != END_MAGIC:
+                raise ValueError("Container has no index (truncated or still being written)")
+            self.file.seek(index_offset)
+            if self._read_exactly(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                raise ValueError("Corrupted container index")
+            index = self._read_exactly(num_blocks * _index_entry.size)
+            self._blocks = [BlockInfo(*entry[:3], entry[3:]) for entry in _index_entry.iter_unpack(index)]
+        return self._blocks
+
+    @property
+    def num_points(self) -> int:
+        return sum(block.num_points for block in self.blocks)
+
+    def read_block(self, block: BlockInfo) -> bytes:
+        self.file.seek(block.offset)
+        return self._read_exactly(block.size)
+
+    def __iter__(self) -> Iterator[Tuple[BlockInfo, bytes]]:
+        """Walk the blocks in file order, reading one payload at a time."""
+        offset = self.data_offset
+        while True:
+            self.file.seek(offset)
+            magic = self.file.read(len(BLOCK_MAGIC))
+            if magic == INDEX_MAGIC or magic == b"":
+                return
+            if magic != BLOCK_MAGIC:
+                raise ValueError("Corrupted container block")
+            _, size, num_points, *aabb = _block_header.unpack(magic + self._read_exactly(_block_header.size - len(magic)))
+            block = BlockInfo(offset + _block_header.size, size, num_points, tuple(aabb))
+            yield block, self.read_block(block)
+            offset = block.offset + block.size
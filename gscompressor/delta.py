@@ -0,0 +1,427 @@
+from __future__ import annotations
+
+import io
+import os
+import copy
+import zlib
+import shutil
+import hashlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterator, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+from . import draco3dgs
+from .compressor import Compressor, model_attributes, set_model_attributes
+from .container import ContainerReader, ContainerWriter, is_container
+from .lazy import lazy_import
+from .ply import PlyAllocator
+from .quantization import VectorQuantizationCompressor, VectorQuantizationDecompressor, dracoreduced3dgs
+from .quantization.assignment import quantize as quantize_model
+from .quantization.codebook import split_codebook
+from .quantization.compressor import dequantize_vertices
+from .trace import stage
+
+if TYPE_CHECKING:
+    from gaussian_splatting import GaussianModel
+    from reduced_3dgs.quantization import VectorQuantizer
+
+torch = lazy_import("torch")
+
+# Delta frames store a model relative to a reference .drc file (a whole file of either codec, or another delta frame),
+# for sequences of checkpoints or the frames of dynamic scenes, where most Gaussians keep their row and change little.
+# Rows are matched by index: the rows both have are stored as the rows that changed, attribute by attribute, with the
+# residual to the decoded reference quantized to the step that Draco would use for the same bits (closed loop, so
+# errors do not build up along a sequence), or, for the codebook ids of the quantized codec, as their new ids; rows
+# beyond the reference are a Draco buffer, as in whole files; rows beyond the model are dropped. Quantized frames
+# reuse the codebooks of their reference. A frame whose delta would not be smaller than the whole file of its chain
+# is stored whole instead (e.g. after densification reshuffles the rows).
+# A delta frame is a container (see container.py) with codec "delta" and the delta description in its metadata:
+#   blocks: [added rows, a Draco buffer], then per changed attribute: zlib(u32 row index increments | values)
+# where values are integers in component-major order: residuals in steps, or codebook ids.
+# References are paths relative to the frame and are checked against their BLAKE2b digest. All files are encoded with
+# Draco's sequential encoder (compression level 0) and not reordered, so that decoded rows stay in model order.
+
+residual_bits = dict(
+    positions="qposition", scales="qscale", rotations="qrotation",
+    opacities="qopacity", features_dc="qfeaturedc", features_rest="qfeaturerest",
+)
+
+
+class Frame(NamedTuple):
+    codec: str  # of the point cloud, "draco3dgs" or "dracoreduced3dgs"
+    point_cloud: Union[draco3dgs.PointCloud, dracoreduced3dgs.PointCloud]  # features in the layout of PLY files
+    codebook_dict: Optional[Dict[str, np.ndarray]]
+    digest: str  # of the file
+    size: int  # of the whole file its chain starts with
+
+
+def digest_of(data) -> str:
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def _point_cloud(codec: str, arrays: Sequence[np.ndarray]):
+    return draco3dgs.PointCloud(*arrays) if codec == "draco3dgs" else dracoreduced3dgs.PointCloud(*arrays)
+
+
+def _int_dtype(values: np.ndarray) -> np.dtype:
+    bound = int(np.abs(values).max()) if values.size > 0 else 0
+    return next(np.dtype(dtype) for dtype in ("<i1", "<i2", "<i4") if bound <= np.iinfo(dtype).max)
+
+
+def pack_rows(rows: np.ndarray, values: np.ndarray) -> bytes:
+    increments = np.diff(rows, prepend=0).astype("<u4")
+    return zlib.compress(increments.tobytes() + np.ascontiguousarray(values.T).tobytes(), 9)
+
+
+def unpack_rows(payload, num_rows: int, num_components: int, dtype: str):
+    data = zlib.decompress(payload)
+    rows = np.cumsum(np.frombuffer(data, dtype="<u4", count=num_rows), dtype=np.int64)
+    values = np.frombuffer(data, dtype=dtype, offset=4 * num_rows).reshape(num_components, num_rows).T
+    return rows, values
+
+
+def delta_attribute(reference: np.ndarray, new: np.ndarray, step: float = None):
+    """Changed rows, their values (residuals in steps of step, or new ids if step is None) and the reconstruction."""
+    if step is None:
+        rows = np.flatnonzero((new != reference).any(axis=1))
+        values = new[rows]
+        reconstruction = reference.copy()
+        reconstruction[rows] = values
+        return rows, values.astype(_int_dtype(values)), reconstruction
+    step = np.float32(step)
+    if step > 0:
+        steps = np.rint((new - reference) / step).clip(np.iinfo(np.int32).min, np.iinfo(np.int32).max).astype(np.int32)
+    else:  # constant attribute
+        steps = np.zeros(reference.shape, dtype=np.int32)
+    rows = np.flatnonzero(steps.any(axis=1))
+    values = steps[rows]
+    reconstruction = reference.copy()
+    reconstruction[rows] += step * values.astype(np.float32)  # exactly as in apply_delta
+    return rows, values.astype(_int_dtype(values)), reconstruction
+
+
+class DeltaCompressor:
+    """Saves models as whole files or as delta frames of a reference, with a Compressor or a
+    VectorQuantizationCompressor; references are decoded (and cached) by decompressor."""
+
+    def __init__(self, compressor: Union[Compressor, VectorQuantizationCompressor], decompressor: DeltaDecompressor = None):
+        if compressor.use_executable_backend:
+            raise ValueError("Delta frames are not supported by the executable backend")
+        if compressor.compression_level != 0:
+            raise ValueError("Delta frames require compression_level=0, the only level at which Draco keeps the order of the points")
+        if compressor.reorder:
+            raise ValueError("Delta frames require the points in model order, without reorder")
+        if isinstance(compressor, Compressor) and compressor.spatial_partition:
+            raise ValueError("Delta frames require the points in model order, without spatial_partition")
+        if isinstance(compressor, Compressor) and compressor.progressive_layers is not None:
+            raise ValueError("Delta frames require the points in model order, without progressive_layers")
+        if isinstance(compressor, Compressor) and (compressor.target_size is not None or compressor.max_error is not None):
+            raise ValueError("Delta frames are not supported with rate control")
+        self.compressor = compressor
+        self.decompressor = DeltaDecompressor() if decompressor is None else decompressor
+
+    def save_compressed(self, model: GaussianModel, path: str, reference: str = None) -> bool:
+        """Save model to path relative to the reference file (whole if reference is None, or if the delta would not be
+        smaller). model may also be a PlyAttributes for the draco3dgs codec. Returns whether a delta frame was saved."""
+        quantized = isinstance(self.compressor, VectorQuantizationCompressor)
+        if reference is None:
+            self.compressor.save_compressed(model, path)
+            return False
+        frame = self.decompressor.decode(reference)
+        if frame.codec != ("dracoreduced3dgs" if quantized else "draco3dgs"):
+            raise ValueError(f"Cannot save a delta of a {frame.codec} reference with {type(self.compressor).__name__}")
+        compressor = self.compressor
+        if quantized:
+            # Quantized with the codebooks of the reference, which the frame then shares
+            compressor = copy.copy(compressor)
+            compressor.quantizer = copy.copy(compressor.quantizer)
+            kwargs = dict(dtype=torch.float32, device=model._xyz.device)
+            compressor.quantizer._codebook_dict = {name: torch.tensor(array, **kwargs) for name, array in frame.codebook_dict.items()}
+            if model.max_sh_degree != frame.point_cloud.sh_degree:
+                raise ValueError(f"Cannot save a model of SH degree {model.max_sh_degree} relative to a reference of SH degree {frame.point_cloud.sh_degree}")
+            with stage("quantize"):
+                ids_dict, _ = quantize_model(compressor.quantizer, model, compressor.assignment_cache)
+            attributes = compressor._quantized_attributes(model, ids_dict)
+            steps = dict(positions=self._step("positions", frame, attributes[0]))
+        else:
+            sh_degree = compressor._sh_degree(model)
+            if sh_degree != frame.point_cloud.sh_degree:
+                raise ValueError(f"Cannot save SH degree {sh_degree} relative to a reference of SH degree {frame.point_cloud.sh_degree}")
+            attributes = model_attributes(model, sh_degree=sh_degree)
+            steps = {name: self._step(name, frame, attribute) for name, attribute in zip(draco3dgs.attribute_names, attributes)}
+
+        with stage("delta", path=path, reference=reference) as s:
+            payload, point_cloud = self._delta(frame, attributes, steps, os.path.relpath(reference, os.path.dirname(os.path.abspath(path))))
+            s.set(bytes_out=len(payload))
+        if len(payload) >= frame.size:
+            compressor.save_compressed(model, path)
+            return False
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with stage("write", path=path, bytes_in=len(payload)), open(path, "wb") as f:
+            f.write(payload)
+        self.decompressor.remember(path, Frame(frame.codec, point_cloud, frame.codebook_dict, digest_of(payload), frame.size))
+        return True
+
+    def _step(self, name: str, frame: Frame, attribute: np.ndarray) -> float:
+        # The step of Draco's quantization of the attribute with the same bits, over the values of both models
+        reference = getattr(frame.point_cloud, name)
+        values = [array for array in (attribute, reference) if array.size > 0]
+        if not values:
+            return 0.0
+        value_range = max(float(array.max()) for array in values) - min(float(array.min()) for array in values)
+        return float(np.float32(value_range / (2 ** getattr(self.compressor, residual_bits[name]) - 1)))
+
+    def _delta(self, frame: Frame, attributes, steps: Dict[str, float], reference: str):
+        num_points, num_reference_points = attributes[0].shape[0], frame.point_cloud.num_points
+        num_common = min(num_points, num_reference_points)
+        metadata = dict(
+            codec="delta", base_codec=frame.codec, reference=reference, reference_digest=frame.digest,
+            num_points=num_points, num_reference_points=num_reference_points, sh_degree=frame.point_cloud.sh_degree,
+            added=num_points > num_reference_points, attributes={},
+        )
+        blocks, reconstruction = [], []
+        for name, attribute in zip(draco3dgs.attribute_names, attributes):
+            step = steps.get(name)
+            rows, values, reconstructed = delta_attribute(getattr(frame.point_cloud, name)[:num_common], attribute[:num_common], step)
+            reconstruction.append(reconstructed)
+            if rows.size > 0:
+                metadata["attributes"][name] = dict(num_rows=int(rows.size), dtype=values.dtype.str, step=step)
+                blocks.append((pack_rows(rows, values), int(rows.size)))
+        buffer = io.BytesIO()
+        with ContainerWriter(buffer, metadata) as writer:
+            if metadata["added"]:
+                added = [attribute[num_reference_points:] for attribute in attributes]
+                encoded = self.compressor._encode(added)
+                writer.write_block(encoded, num_points - num_reference_points, np.concatenate([added[0].min(0), added[0].max(0)]))
+                decoded = _decode_buffer(frame.codec, encoded)
+                reconstruction = [np.concatenate([array, getattr(decoded, name)]) for array, name in zip(reconstruction, draco3dgs.attribute_names)]
+            for payload, num_rows in blocks:
+                writer.write_block(payload, num_rows)
+        return buffer.getvalue(), _point_cloud(frame.codec, reconstruction)
+
+
+def _decode_buffer(codec: str, buffer):
+    with stage("decode", bytes_in=len(buffer)):
+        return draco3dgs.decode(buffer) if codec == "draco3dgs" else dracoreduced3dgs.decode(buffer)
+
+
+def read_whole(path: str, data: bytes) -> Frame:
+    """Frame of a whole .drc file of either codec (plain, or a chunked draco3dgs container)."""
+    digest = digest_of(data)
+    if is_container(io.BytesIO(data)):
+        reader = ContainerReader(io.BytesIO(data))
+        if reader.metadata.get("codec") != "draco3dgs" or reader.metadata.get("bundle"):
+            raise ValueError(f"Unsupported reference: {path}")
+        point_clouds = [_decode_buffer("draco3dgs", payload) for _, payload in reader]
+        sh_degree = reader.metadata.get("sh_degree", 0)
+        shapes = dict(positions=3, scales=3, rotations=4, opacities=1, features_dc=3, features_rest=3 * ((sh_degree + 1) ** 2 - 1))
+        arrays = [np.concatenate([getattr(pc, name) for pc in point_clouds]) if point_clouds else np.zeros((0, shapes[name]), dtype=np.float32) for name in draco3dgs.attribute_names]
+        return Frame("draco3dgs", draco3dgs.PointCloud(*arrays), None, digest, len(data))
+    buffer, codebook_dict = split_codebook(data)
+    header = draco3dgs.probe(buffer, quantization_bits=False)
+    if header["attributes"].get("scales", {}).get("dtype") != "int32":
+        return Frame("draco3dgs", _decode_buffer("draco3dgs", buffer), None, digest, len(data))
+    if codebook_dict is None:  # legacy layout
+        codebook_dict = dict(np.load(os.path.splitext(path)[0] + ".codebook.npz"))
+    return Frame("dracoreduced3dgs", _decode_buffer("dracoreduced3dgs", buffer), codebook_dict, digest, len(data))
+
+
+def apply_delta(frame: Frame, data: bytes) -> Frame:
+    """Frame of a delta frame (the content of its file) from the frame of its reference."""
+    reader = ContainerReader(io.BytesIO(data))
+    metadata = reader.metadata
+    if metadata["reference_digest"] != frame.digest:
+        raise ValueError(f"Reference {metadata['reference']} does not match the one the delta was saved against")
+    with stage("apply_delta", bytes_in=len(data)):
+        num_common = min(metadata["num_points"], metadata["num_reference_points"])
+        arrays = {name: getattr(frame.point_cloud, name)[:num_common].copy() for name in draco3dgs.attribute_names}
+        blocks = (payload for _, payload in reader)
+        added = _decode_buffer(frame.codec, next(blocks)) if metadata["added"] else None
+        for (name, attribute), payload in zip(metadata["attributes"].items(), blocks):
+            rows, values = unpack_rows(payload, attribute["num_rows"], arrays[name].shape[1], attribute["dtype"])
+            if attribute["step"] is None:
+                arrays[name][rows] = values
+            else:
+                arrays[name][rows] += np.float32(attribute["step"]) * values.astype(np.float32)
+        if added is not None:
+            arrays = {name: np.concatenate([array, getattr(added, name)]) for name, array in arrays.items()}
+    return Frame(frame.codec, _point_cloud(frame.codec, [arrays[name] for name in draco3dgs.attribute_names]), frame.codebook_dict, digest_of(data), frame.size)
+
+
+def delta_metadata(data: bytes) -> Optional[dict]:
+    """Metadata of a delta frame (the content of its file), None if it is a whole file."""
+    if not is_container(io.BytesIO(data)):
+        return None
+    metadata = ContainerReader(io.BytesIO(data)).metadata
+    return metadata if metadata.get("codec") == "delta" else None
+
+
+class DeltaDecompressor:
+    """Decodes whole files and delta frames. The last max_frames decoded frames are kept, so that the frames of a
+    sequence decoded in order each only apply their delta to the previous one."""
+
+    def __init__(self, quantizer: VectorQuantizer = None, max_frames: int = 2):
+        self.quantizer = quantizer
+        self.max_frames = max_frames
+        self.frames: "OrderedDict[tuple, Frame]" = OrderedDict()
+
+    def decode(self, path: str) -> Frame:
+        chain, keys = [], set()  # delta frames to apply, from the last one back to the first one
+        while True:
+            key = _file_key(path)
+            if key in self.frames:
+                frame = self.frames[key]
+                self.frames.move_to_end(key)
+                break
+            if key in keys:
+                raise ValueError(f"Cyclic delta references at {path}")
+            keys.add(key)
+            with stage("read", path=path) as s, open(path, "rb") as f:
+                data = f.read()
+                s.set(bytes_out=len(data))
+            metadata = delta_metadata(data)
+            if metadata is None:
+                frame = read_whole(path, data)
+                self._remember(key, frame)
+                break
+            chain.append((key, data))
+            path = os.path.join(os.path.dirname(os.path.abspath(path)), metadata["reference"])
+        for key, data in reversed(chain):
+            frame = apply_delta(frame, data)
+            self._remember(key, frame)
+        return frame
+
+    def iter_frames(self, paths: Sequence[str]) -> Iterator[Frame]:
+        for path in paths:
+            yield self.decode(path)
+
+    def remember(self, path: str, frame: Frame):
+        """Keep the frame of the file at path, e.g. the reconstruction of a frame that was just saved."""
+        self._remember(_file_key(path), frame)
+
+    def _remember(self, key: tuple, frame: Frame):
+        self.frames[key] = frame
+        self.frames.move_to_end(key)
+        while len(self.frames) > self.max_frames:
+            self.frames.popitem(last=False)
+
+    def load_compressed(self, model: GaussianModel, path: str):
+        """Load a whole file or a delta frame into model (the model takes its SH degree)."""
+        frame = self.decode(path)
+        pc, device = frame.point_cloud, model._xyz.device
+        if frame.codec == "draco3dgs":
+            num_points = pc.num_points
+            tensors = dict(
+                positions=pc.positions, scales=pc.scales, rotations=pc.rotations, opacities=pc.opacities,
+                features_dc=pc.features_dc.reshape(num_points, 3, 1).transpose(0, 2, 1),
+                features_rest=pc.features_rest.reshape(num_points, 3, -1).transpose(0, 2, 1),
+            )
+            set_model_attributes(model, {name: torch.tensor(np.ascontiguousarray(array), device=device) for name, array in tensors.items()})
+            return
+        if self.quantizer is None:
+            raise ValueError("A quantizer is required to load a quantized frame")
+        tensors = {name: torch.tensor(getattr(pc, name), device=device) for name in draco3dgs.attribute_names}
+        VectorQuantizationDecompressor(self.quantizer)._dequantize(model, tensors, frame.codebook_dict)
+
+    def save_ply(self, path: str, ply_path: str):
+        """Decode a whole file or a delta frame into a binary PLY file at ply_path (see Decompressor.save_ply)."""
+        frame = self.decode(path)
+        pc = frame.point_cloud
+        if frame.codec == "draco3dgs":
+            vertices = PlyAllocator(pc.num_points, pc.sh_degree)
+            for name in draco3dgs.attribute_names:
+                array = getattr(pc, name)
+                vertices(name, array.shape, "float32")[...] = array
+        else:
+            with stage("dequantize"):
+                vertices = dequantize_vertices(pc, frame.codebook_dict)
+        with stage("write", path=ply_path, bytes_in=vertices.vertices.nbytes):
+            vertices.write(ply_path)
+
+
+def _file_key(path: str) -> tuple:
+    stat = os.stat(path)
+    return os.path.realpath(path), stat.st_size, stat.st_mtime_ns
+
+
+def save_sequence(compressor: DeltaCompressor, models, paths: Sequence[str], key_interval: int = None) -> List[bool]:
+    """Save models (e.g. checkpoints or frames, loaded one at a time if models is an iterator) to paths, every one
+    relative to the previous one, except every key_interval-th (and the first), which is whole.
+    Returns which frames were saved as deltas."""
+    saved = []
+    for i, (model, path) in enumerate(zip(models, paths)):
+        key = i == 0 or (key_interval is not None and i % key_interval == 0)
+        saved.append(compressor.save_compressed(model, path, None if key else paths[i - 1]))
+    return saved
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    from .ply import PlyAttributes
+    parser = ArgumentParser()
+    parser.add_argument("--sh_degree", default=3, type=int)
+    parser.add_argument("-s", "--source", required=True, type=str)
+    parser.add_argument("-d", "--destination", required=True, type=str)
+    parser.add_argument("-i", "--iterations", nargs="+", required=True, type=int, help="checkpoints, in sequence order")
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+    rootparser = parser
+    parser = subparsers.add_parser("compress")
+    parser.add_argument("--qposition", default=30, type=int)
+    parser.add_argument("--qscale", default=30, type=int)
+    parser.add_argument("--qrotation", default=30, type=int)
+    parser.add_argument("--qopacity", default=30, type=int)
+    parser.add_argument("--qfeaturedc", default=30, type=int)
+    parser.add_argument("--qfeaturerest", default=30, type=int)
+    parser.add_argument("--key_interval", default=None, type=int, help="save every key_interval-th checkpoint whole")
+    parser = subparsers.add_parser("quantize")
+    parser.add_argument("--qposition", default=30, type=int)
+    parser.add_argument("--embed_codebook", action="store_true")
+    parser.add_argument("--codebook_dtype", default="float32", choices=["float32", "float16", "uint8"], type=str)
+    parser.add_argument("--key_interval", default=None, type=int, help="save every key_interval-th checkpoint whole")
+    parser.add_argument("--num_clusters", type=int, default=256)
+    parser = subparsers.add_parser("decompress")
+    args = rootparser.parse_args()
+    iterations = [os.path.join("point_cloud", "iteration_" + str(iteration)) for iteration in args.iterations]
+    load_plys = [os.path.join(args.source, iteration, "point_cloud.ply") for iteration in iterations]
+    drcs = [os.path.join(args.destination, iteration, "point_cloud.drc") for iteration in iterations]
+    match args.mode:
+        case "compress":
+            compressor = DeltaCompressor(Compressor(
+                qposition=args.qposition,
+                qscale=args.qscale,
+                qrotation=args.qrotation,
+                qopacity=args.qopacity,
+                qfeaturedc=args.qfeaturedc,
+                qfeaturerest=args.qfeaturerest,
+            ))
+            saved = save_sequence(compressor, map(PlyAttributes, load_plys), drcs, args.key_interval)
+            print(f"Saved {sum(saved)} of {len(drcs)} checkpoints as deltas")
+        case "quantize":
+            from gaussian_splatting import GaussianModel
+            from reduced_3dgs.quantization import ExcludeZeroSHQuantizer
+
+            def load_models():
+                for load_ply in load_plys:
+                    gaussians = GaussianModel(args.sh_degree)
+                    gaussians.load_ply(load_ply)
+                    yield gaussians
+
+            compressor = DeltaCompressor(VectorQuantizationCompressor(
+                ExcludeZeroSHQuantizer(num_clusters=args.num_clusters),
+                qposition=args.qposition,
+                embed_codebook=args.embed_codebook,
+                codebook_dtype=args.codebook_dtype,
+            ))
+            with torch.no_grad():
+                saved = save_sequence(compressor, load_models(), drcs, args.key_interval)
+            print(f"Saved {sum(saved)} of {len(drcs)} checkpoints as deltas")
+        case "decompress":
+            decompressor = DeltaDecompressor()
+            for drc in drcs:
+                decompressor.save_ply(drc, os.path.splitext(drc)[0] + ".ply")
+            for name in ["cfg_args", "cameras.json", "input.ply"]:
+                if os.path.exists(os.path.join(args.source, name)):
+                    shutil.copy2(os.path.join(args.source, name), os.path.join(args.destination, name))
+        case _:
+            raise ValueError(f"Unknown mode: {args.mode}")
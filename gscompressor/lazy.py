@@ -0,0 +1,22 @@
+import sys
+import importlib.util
+from types import ModuleType
+
+# torch, gaussian_splatting, reduced_3dgs and plyfile take seconds to import and are only needed by the GaussianModel
+# and executable paths, so the modules that also serve the numpy paths (draco3dgs/dracoreduced3dgs buffers, PLY files,
+# probes) bind them with lazy_import: they are imported on first use, and `import gscompressor`, the PLY conversions and
+# the CLIs that only use them start without them. Names that are only used in annotations are imported for type checkers.
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Top-level module name, imported on first attribute access (importlib.util.LazyLoader); it is returned as is if it is already imported."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
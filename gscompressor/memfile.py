@@ -0,0 +1,48 @@
+import os
+import uuid
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, List
+
+# The executable backends exchange PLY and Draco files with draco_encoder/draco_decoder by path, and the tools
+# choose the file format from the extension, so the files cannot simply be piped through stdin/stdout.
+# On Linux they are kept in memory instead: each one is a memfd, reached through a symlink with the right name
+# in a temporary directory (/proc/<pid>/fd/<fd> reopens the memfd in any process), so only the symlinks touch the disk.
+# Elsewhere they are regular temporary files.
+# Outputs that are written in several steps (containers, rate-controlled encodes) go to a temporary file next to their
+# path, which replaces it once they are complete, so that a failure leaves the previous file (or none) in place.
+
+
+@contextmanager
+def temporary_files(*names: str) -> Iterator[List[str]]:
+    """Paths of empty temporary files with the given names, kept in memory where the platform supports it."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = [os.path.join(temp_dir, name) for name in names]
+        fd_dir = f"/proc/{os.getpid()}/fd"
+        if not hasattr(os, "memfd_create") or not os.path.isdir(fd_dir):
+            yield paths
+            return
+        fds = []
+        try:
+            for path in paths:
+                fds.append(os.memfd_create(os.path.basename(path)))
+                os.symlink(os.path.join(fd_dir, str(fds[-1])), path)
+            yield paths
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+
+@contextmanager
+def replaced_on_success(path: str) -> Iterator[str]:
+    """Path of a temporary file next to path, which replaces path if the block exits without an exception
+    and is removed otherwise."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".tmp-{uuid.uuid4().hex}-{os.path.basename(path)}")
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,23 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def imap(fn: Callable[[T], R], iterable: Iterable[T], max_workers: int = None) -> Iterator[R]:
+    """Ordered, lazy ThreadPoolExecutor.map: at most 2 * max_workers items are in flight,
+    so memory stays bounded when the input is a stream of large blocks."""
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) + 4)  # ThreadPoolExecutor's default
+    window = 2 * max_workers
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = deque()
+        for item in iterable:
+            futures.append(executor.submit(fn, item))
+            if len(futures) >= window:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
@@ -0,0 +1,178 @@
+import os
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from . import draco3dgs
+
+# Binary PLY files of Gaussians (GaussianModel.save_ply) read and written without plyfile, torch or a GaussianModel.
+# Every attribute is a strided view of its consecutive fields in the vertex records: draco3dgs.encode reads the views
+# of a memory-mapped file in place, so the values are copied once, by Draco, and only the pages it reads are loaded;
+# draco3dgs.decode writes into the views of preallocated records (PlyAllocator), which are then written at once.
+# Attributes are in the layout of compressor.model_attributes, which is the order of the fields in the file.
+
+ply_types = dict(
+    char="i1", uchar="u1", short="i2", ushort="u2", int="i4", uint="u4", float="f4", double="f8",
+    int8="i1", uint8="u1", int16="i2", uint16="u2", int32="i4", uint32="u4", float32="f4", float64="f8",
+)
+inverse_ply_types = dict(i1="char", u1="uchar", i2="short", u2="ushort", i4="int", u4="uint", f4="float", f8="double")
+ply_formats = dict(binary_little_endian="<", binary_big_endian=">")
+
+
+def attribute_fields(sh_degree: int) -> Dict[str, List[str]]:
+    """Names of the PLY properties of every attribute (see draco3dgs.attribute_names)."""
+    return dict(
+        positions=["x", "y", "z"],
+        scales=[f"scale_{i}" for i in range(3)],
+        rotations=[f"rot_{i}" for i in range(4)],
+        opacities=["opacity"],
+        features_dc=[f"f_dc_{i}" for i in range(3)],
+        features_rest=[f"f_rest_{i}" for i in range(3 * ((sh_degree + 1) ** 2 - 1))],
+    )
+
+
+def vertex_dtype(sh_degree: int) -> np.dtype:
+    """Vertex records of GaussianModel.save_ply (with zero normals)."""
+    fields = attribute_fields(sh_degree)
+    names = fields["positions"] + ["nx", "ny", "nz"] + fields["features_dc"] + fields["features_rest"] + fields["opacities"] + fields["scales"] + fields["rotations"]
+    return np.dtype([(name, "<f4") for name in names])
+
+
+def write_ply(path: str, vertices: np.ndarray):
+    """Write vertex records as a binary little-endian PLY file, in the format of plyfile."""
+    header = ["ply", "format binary_little_endian 1.0", f"element vertex {vertices.shape[0]}"]
+    header += [f"property {inverse_ply_types[vertices.dtype[name].str[1:]]} {name}" for name in vertices.dtype.names]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(("\n".join(header + ["end_header"]) + "\n").encode("ascii"))
+        vertices.tofile(f)
+
+
+def read_ply_header(f) -> Tuple[str, List[Tuple[str, int, List[Tuple[str, str]]]], int]:
+    """Byte order ("<" or ">"), elements (name, count, [(property, numpy type)]) and size of the header of a PLY file."""
+    if f.readline().rstrip(b"\r\n") != b"ply":
+        raise ValueError("Not a PLY file")
+    byte_order, elements = None, []
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError("Truncated PLY header")
+        words = line.decode("ascii").split()
+        if not words or words[0] in ("comment", "obj_info"):
+            continue
+        match words[0]:
+            case "format":
+                if words[1] not in ply_formats:
+                    raise ValueError(f"Unsupported PLY format: {words[1]}")
+                byte_order = ply_formats[words[1]]
+            case "element":
+                elements.append((words[1], int(words[2]), []))
+            case "property":
+                if words[1] == "list":
+                    raise ValueError(f"Unsupported PLY list property: {words[-1]}")
+                if words[1] not in ply_types:
+                    raise ValueError(f"Unknown PLY property type: {words[1]}")
+                elements[-1][2].append((words[2], byte_order + ply_types[words[1]]))
+            case "end_header":
+                if byte_order is None:
+                    raise ValueError("PLY header without format")
+                return byte_order, elements, f.tell()
+            case _:
+                raise ValueError(f"Unknown PLY header line: {line!r}")
+
+
+def field_rows(vertices: np.ndarray, names: List[str], begin: int = 0, end: int = None) -> np.ndarray:
+    """(N, len(names)) float32 view of consecutive float32 fields of vertex records [begin:end]."""
+    end = vertices.shape[0] if end is None else end
+    offset = vertices.dtype.fields[names[0]][1] + begin * vertices.dtype.itemsize
+    return np.ndarray((end - begin, len(names)), dtype=np.float32, buffer=vertices, offset=offset, strides=(vertices.dtype.itemsize, 4))
+
+
+class PlyAttributes:
+    """The Gaussians of a binary PLY file, memory-mapped, in place of a GaussianModel for Compressor."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            _, elements, offset = read_ply_header(f)
+        for name, count, properties in elements:
+            dtype = np.dtype(properties)
+            if name == "vertex":
+                break
+            offset += count * dtype.itemsize  # elements before the vertices
+        else:
+            raise ValueError(f"No vertex element in {path}")
+        self.num_points = count
+        self.vertices = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,)) if count > 0 else np.zeros(0, dtype=dtype)
+        self.num_features_rest = sum(name.startswith("f_rest_") for name in dtype.names)
+        self.max_sh_degree = draco3dgs.sh_degree_of(self.num_features_rest)
+        fields = attribute_fields(self.max_sh_degree)
+        self.positions = self._rows(fields["positions"])
+        self.scales = self._rows(fields["scales"])
+        self.rotations = self._rows(fields["rotations"])
+        self.opacities = self._rows(fields["opacities"])
+        self.features_dc = self._rows(fields["features_dc"])
+        self.features_rest = self._rows(fields["features_rest"])
+
+    def _rows(self, names: List[str]) -> np.ndarray:
+        # A strided (N, len(names)) view if the fields are consecutive float32 values, a copy otherwise
+        fields = self.vertices.dtype.fields
+        if not names:  # features_rest of SH degree 0
+            return np.zeros((self.num_points, 0), dtype=np.float32)
+        missing = [name for name in names if name not in fields]
+        if missing:
+            raise ValueError(f"Missing PLY properties in {self.path}: {', '.join(missing)}")
+        first_type, first_offset = fields[names[0]][:2]
+        if first_type == np.dtype(np.float32) and self.num_points > 0 and all(
+                fields[name][0] == first_type and fields[name][1] == first_offset + i * 4 for i, name in enumerate(names)):
+            return field_rows(self.vertices, names)
+        return np.stack([self.vertices[name].astype(np.float32) for name in names], axis=1).reshape(self.num_points, len(names))
+
+    def attributes(self, index=slice(None), sh_degree: int = None):
+        """Like compressor.model_attributes; index is a slice or indices (numpy or torch), sh_degree drops higher degrees."""
+        features_rest = self.features_rest
+        if sh_degree is not None and sh_degree != self.max_sh_degree:
+            # f_rest_* are channel-major: channel c of coefficient k is f_rest_<c * num_sh_coeffs + k>
+            num_sh_coeffs, kept = self.num_features_rest // 3, (sh_degree + 1) ** 2 - 1
+            features_rest = features_rest[:, [c * num_sh_coeffs + k for c in range(3) for k in range(kept)]]
+        if not isinstance(index, slice):
+            index = np.asarray(index)
+        return tuple(attribute[index] for attribute in (self.positions, self.scales, self.rotations, self.opacities, self.features_dc, features_rest))
+
+
+class PlyAllocator:
+    """Allocator for draco3dgs.decode that hands out the fields of the vertex records of a PLY file (vertex_dtype),
+    preallocated for num_points Gaussians of SH degree sh_degree; blocks are decoded into their rows through at(offset),
+    as with staging.TensorAllocator. Features must not be transposed."""
+
+    def __init__(self, num_points: int, sh_degree: int):
+        self.vertices = np.zeros(num_points, dtype=vertex_dtype(sh_degree))
+        self.fields = attribute_fields(sh_degree)
+        self.lock = threading.Lock()
+
+    def at(self, offset: int):
+        def allocate(name: str, shape: tuple, dtype: str):
+            names = self.fields[name]
+            if shape[1:] != (len(names),) or dtype != "float32" or offset + shape[0] > self.vertices.shape[0]:
+                raise ValueError(f"Decoded {name} of shape {shape} does not fit at row {offset} of {self.vertices.shape[0]} vertices with {len(names)} {name} fields")
+            if not names or shape[0] == 0:
+                return np.zeros(shape, dtype=np.float32)
+            return field_rows(self.vertices, names, offset, offset + shape[0])
+        return allocate
+
+    def __call__(self, name: str, shape: tuple, dtype: str):
+        return self.at(0)(name, shape, dtype)
+
+    @classmethod
+    def read(cls, path: str) -> "PlyAllocator":
+        """Vertex records of the Gaussians of a PLY file whose properties may be in any order or type
+        (e.g. written by draco_decoder), in the layout of GaussianModel.save_ply."""
+        ply = PlyAttributes(path)
+        allocator = cls(ply.num_points, ply.max_sh_degree)
+        for name, attribute in zip(draco3dgs.attribute_names, ply.attributes()):
+            allocator(name, attribute.shape, "float32")[...] = attribute
+        return allocator
+
+    def write(self, path: str):
+        write_ply(path, self.vertices)
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import mmap
+import zipfile
+from typing import Dict, Iterator
+
+import numpy as np
+
+from . import draco3dgs
+from .container import ContainerReader, is_container
+from .quantization.codebook import codebook_entries, read_codebook_entries
+
+# Metadata of compressed files for scheduling, without decoding them: the header and index of containers,
+# the Draco header and attribute descriptors of the (first) Draco buffer, the quantization parameters that
+# Draco stores after the values of all attributes (optional, see draco3dgs.probe) and the shapes of the codebooks
+# of quantized files. Files are memory-mapped, so only the parsed pages are read from disk.
+# Both codecs are read with draco3dgs, which knows the attribute layout of the quantized codec too.
+
+
+def probe(path: str, quantization_bits: bool = True) -> dict:
+    """Describe a .drc file (plain or chunked, either codec) or a LapisGS bundle: size, codec, num_points, sh_degree,
+    Draco encoding and version, attributes (num_components, dtype and quantization_bits, see draco3dgs.probe),
+    codebook (name -> shape and dtype, None if the file is not quantized) and, for containers, num_blocks and metadata."""
+    info = dict(path=path, size=os.path.getsize(path), container=False)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            codebook = None
+            if is_container(f):
+                reader = ContainerReader(f)
+                blocks = reader.blocks
+                info.update(container=True, num_blocks=len(blocks), metadata=reader.metadata)
+                if reader.metadata.get("bundle"):  # see bundle.py
+                    if reader.metadata.get("codebook"):
+                        codebook = codebook_entries(view[blocks[0].offset:blocks[0].offset + blocks[0].size])
+                        blocks = blocks[1:]
+                    levels = reader.metadata.get("levels", [])
+                    num_points = levels[-1]["num_points"] if levels else 0
+                elif reader.metadata.get("codec") == "delta":  # see delta.py, described by its metadata
+                    num_points, blocks = reader.metadata["num_points"], []
+                else:
+                    num_points = reader.num_points
+                draco = draco3dgs.probe(view[blocks[0].offset:blocks[0].offset + blocks[0].size], quantization_bits) if blocks else None
+                codec = reader.metadata.get("codec")
+            else:
+                draco = draco3dgs.probe(view, quantization_bits)
+                num_points = draco["num_points"]
+                codebook = read_codebook_entries(f)
+                if codebook is None and os.path.isfile(os.path.splitext(path)[0] + ".codebook.npz"):  # legacy layout
+                    codebook = list(_npz_entries(os.path.splitext(path)[0] + ".codebook.npz"))
+                codec = None
+        finally:
+            view.release()
+    attributes = {} if draco is None else draco["attributes"]
+    if codec is None:  # quantized files store the codebook ids of scales as one int32
+        codec = "dracoreduced3dgs" if attributes.get("scales", {}).get("dtype") == "int32" else "draco3dgs"
+    num_features_rest = attributes.get("features_rest", {}).get("num_components", 0)
+    if draco is None:
+        sh_degree = info.get("metadata", {}).get("sh_degree")
+    elif codec == "dracoreduced3dgs":
+        sh_degree = num_features_rest // 3
+    else:
+        sh_degree = draco3dgs.sh_degree_of(num_features_rest)
+    info.update(
+        codec=codec,
+        num_points=num_points,
+        sh_degree=sh_degree,
+        encoding=None if draco is None else draco["encoding"],
+        version=None if draco is None else draco["version"],
+        attributes=attributes,
+        codebook=None if codebook is None else {entry["name"]: dict(shape=entry["shape"], dtype=entry["dtype"]) for entry in codebook},
+    )
+    return info
+
+
+def _npz_entries(path: str) -> Iterator[Dict]:
+    """Name, shape and dtype of the arrays of a .npz file, from the headers of its members."""
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            with archive.open(name) as f:
+                version = np.lib.format.read_magic(f)
+                read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+                shape, _, dtype = read_header(f)
+            yield dict(name=os.path.splitext(name)[0], shape=list(shape), dtype=str(dtype))
+
+
+def find_files(paths, extensions=(".drc", ".bundle")) -> Iterator[str]:
+    """The given files, and the files with the given extensions under the given directories (sorted)."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, _, names in sorted(os.walk(path)):
+            for name in sorted(names):
+                if name.endswith(extensions):
+                    yield os.path.join(directory, name)
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    parser = ArgumentParser()
+    parser.add_argument("paths", nargs="+", type=str, help=".drc/.bundle files, or directories to search for them")
+    parser.add_argument("--no_quantization_bits", action="store_true", help="only read the headers (microseconds per file)")
+    args = parser.parse_args()
+    failed = False
+    for path in find_files(args.paths):
+        try:
+            record = probe(path, quantization_bits=not args.no_quantization_bits)
+        except Exception as e:
+            record, failed = dict(path=path, error=f"{type(e).__name__}: {e}"), True
+        print(json.dumps(record), flush=True)
+    if failed:
+        sys.exit(1)
@@ -1 +1,12 @@
-from .compressor import VectorQuantizationCompressor, VectorQuantizationDecompressor
+import importlib
+
+# Imported on first access, like the exports of gscompressor, so that codebook and dracoreduced3dgs do not import torch
+_lazy_exports = dict(VectorQuantizationCompressor=".compressor", VectorQuantizationDecompressor=".compressor")
+
+__all__ = ["VectorQuantizationCompressor", "VectorQuantizationDecompressor"]
+
+
+def __getattr__(name: str):
+    if name in _lazy_exports:
+        return getattr(importlib.import_module(_lazy_exports[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import numpy as np
+
+from ..lazy import lazy_import
+
+if TYPE_CHECKING:
+    from gaussian_splatting import GaussianModel
+    from reduced_3dgs.quantization import VectorQuantizer
+
+torch = lazy_import("torch")
+
+# Nearest-centroid assignment for fitted VectorQuantizer codebooks, replacing VectorQuantizer.one_nearst
+# (torch.cdist of 65536 points against the whole codebook at a time, i.e. gigabytes of distances and a brute-force
+# search for codebooks of tens of thousands of centroids). On the CPU, 1-D codebooks are searched by bisection and
+# larger codebooks with a KD-tree (exact, multithreaded); otherwise distances are computed by blocks of bounded size.
+# Assignments can be cached by content (an AssignmentCache given to the VectorQuantizationCompressor), so that
+# re-encoding a model with the same codebooks (e.g. at other Draco settings) skips the search; hashing the model copies
+# its attributes to the host, so without a cache nothing is hashed.
+
+BLOCK_BYTES = 256 * 2**20  # memory for the distances or query points of one block
+KDTREE_MIN_CLUSTERS = 64
+
+
+def nearest_centroids(points: torch.Tensor, codebook: torch.Tensor) -> torch.Tensor:
+    """Index (int32) of the nearest centroid of codebook (K, D) for every point (N, D)."""
+    ids = torch.zeros(points.shape[0], dtype=torch.int32, device=points.device)
+    if codebook.shape[0] <= 1 or points.shape[0] == 0:
+        return ids
+    if points.device.type == "cpu" and codebook.shape[1] == 1:
+        centroids, order = torch.sort(codebook[:, 0].double(), stable=True)
+        values = points[:, 0].double()
+        right = torch.searchsorted(centroids, values).clamp_(1, centroids.shape[0] - 1)
+        left = right - 1
+        nearest = torch.where(values - centroids[left] <= centroids[right] - values, left, right)
+        return order[nearest].int()
+    if points.device.type == "cpu" and codebook.shape[0] >= KDTREE_MIN_CLUSTERS and _kdtree() is not None:
+        tree = _kdtree()(codebook.double().numpy())
+        block = max(1, BLOCK_BYTES // (8 * points.shape[1]))
+        for start in range(0, points.shape[0], block):
+            _, nearest = tree.query(points[start:start + block].double().numpy(), workers=-1)
+            ids[start:start + block] = torch.from_numpy(nearest.astype(np.int32))
+        return ids
+    block = max(1, BLOCK_BYTES // (4 * codebook.shape[0]))
+    for start in range(0, points.shape[0], block):
+        ids[start:start + block] = torch.cdist(points[start:start + block], codebook).argmin(1)
+    return ids
+
+
+def _kdtree():
+    # scipy.spatial takes almost half a second to import, so it is imported by the first search that needs it
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:  # scipy comes with scikit-learn, which reduced-3dgs uses for k-means
+        return None
+    return cKDTree
+
+
+def find_nearest_cluster_id(quantizer: VectorQuantizer, model: GaussianModel, codebook_dict: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+    """quantizer.find_nearest_cluster_id with nearest_centroids as the search."""
+    quantizer = copy.copy(quantizer)  # shallow, so that the instance attribute below does not leak to other threads
+    quantizer.one_nearst = nearest_centroids
+    return quantizer.find_nearest_cluster_id(model, codebook_dict)
+
+
+class AssignmentCache:
+    """Least recently used assignments (ids_dict), keyed by the content of the quantized attributes and codebooks."""
+
+    def __init__(self, max_entries: int = 2):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[bytes, Dict[str, torch.Tensor]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(quantizer: VectorQuantizer, model: GaussianModel, codebook_dict: Dict[str, torch.Tensor]) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{type(quantizer).__module__}.{type(quantizer).__qualname__} {model.max_sh_degree}".encode("utf-8"))
+        tensors = [model._features_dc, model._features_rest, model._rotation, model._opacity, model._scaling]
+        tensors += [codebook_dict[name] for name in sorted(codebook_dict)]
+        for name, tensor in zip(["_"] * 5 + sorted(codebook_dict), tensors):
+            tensor = tensor.detach().cpu().contiguous()
+            digest.update(f"{name} {tensor.dtype} {tuple(tensor.shape)}".encode("utf-8"))
+            digest.update(tensor.numpy().view(np.uint8).data)
+        return digest.digest()
+
+    def get(self, key: bytes) -> Optional[Dict[str, torch.Tensor]]:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            return self.entries.get(key)
+
+    def put(self, key: bytes, ids_dict: Dict[str, torch.Tensor]):
+        with self.lock:
+            self.entries[key] = ids_dict
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+
+def quantize(quantizer: VectorQuantizer, model: GaussianModel, cache: Optional[AssignmentCache] = None) -> Tuple[Dict[str, torch.Tensor], Dict[str, torch.Tensor]]:
+    """quantizer.quantize(model, update_codebook=False) with the fast assignment and, if given, the cache.
+    The returned ids may be shared with the cache and must not be modified."""
+    with torch.no_grad():
+        if quantizer._codebook_dict == {}:
+            ids_dict, codebook_dict = quantizer.quantize(model, update_codebook=False)  # fits the codebooks with k-means
+            if cache is not None:
+                cache.put(cache.key(quantizer, model, codebook_dict), ids_dict)
+            return ids_dict, codebook_dict
+        codebook_dict = quantizer._codebook_dict
+        key = None if cache is None else cache.key(quantizer, model, codebook_dict)
+        ids_dict = None if cache is None else cache.get(key)
+        if ids_dict is None:
+            ids_dict = find_nearest_cluster_id(quantizer, model, codebook_dict)
+            if cache is not None:
+                cache.put(key, ids_dict)
+        return ids_dict, codebook_dict
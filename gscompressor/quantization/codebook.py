@@ -0,0 +1,137 @@
+import json
+import struct
+import zlib
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Codebook section, appended after the Draco buffer of a .drc file (all integers little-endian):
+#   section: zlib(u32 header length | header (UTF-8 JSON) | concatenated codebook data)
+#   footer:  u64 section size | magic "GSVQ"
+# The header lists, for every codebook, its name, shape and storage dtype, plus the per-column
+# offset and step of uint8 codebooks. Draco ignores the trailing bytes, and readers find the
+# section from the end of the file, so files without it are plain Draco buffers.
+
+MAGIC = b"GSVQ"
+CODEBOOK_DTYPES = ("float32", "float16", "uint8")
+
+_header_size = struct.Struct("<I")
+_footer = struct.Struct("<Q4s")
+
+
+def _columns(shape) -> Tuple[int, int]:
+    """Shape of a codebook as rows of columns, also for codebooks without rows (reshape cannot infer -1 then)."""
+    return (shape[0], int(np.prod(shape[1:])))
+
+
+def pack_codebook(codebook_dict: Dict[str, np.ndarray], dtype: str = "float32", level: int = 9) -> bytes:
+    """Serialize codebooks to a codebook section (including its footer).
+
+    dtype is the storage precision: float32 is lossless, float16 halves the size and uint8
+    quantizes every column linearly between its minimum and maximum. Empty dicts and codebooks
+    without rows are written as zero-count entries."""
+    if dtype not in CODEBOOK_DTYPES:
+        raise ValueError(f"Unknown codebook dtype: {dtype}")
+    entries, chunks = [], []
+    for name, codebook in codebook_dict.items():
+        codebook = np.asarray(codebook, dtype=np.float32)
+        entry = dict(name=name, shape=list(codebook.shape), dtype=dtype)
+        if dtype == "uint8":
+            columns = codebook.reshape(_columns(codebook.shape))
+            low = columns.min(0) if columns.shape[0] > 0 else np.zeros(columns.shape[1], dtype=np.float32)
+            step = (columns.max(0) - low) / 255 if columns.shape[0] > 0 else np.ones(columns.shape[1], dtype=np.float32)
+            step[step <= 0] = 1
+            entry.update(low=low.tolist(), step=step.tolist())
+            data = np.round((columns - low) / step).clip(0, 255).astype(np.uint8)
+        else:
+            data = codebook.astype(dtype)
+        entries.append(entry)
+        chunks.append(np.ascontiguousarray(data).tobytes())
+    header = json.dumps(entries).encode("utf-8")
+    section = zlib.compress(_header_size.pack(len(header)) + header + b"".join(chunks), level)
+    return section + _footer.pack(len(section), MAGIC)
+
+
+def unpack_codebook(section) -> Dict[str, np.ndarray]:
+    """Deserialize a codebook section (without its footer) to float32 codebooks."""
+    data = zlib.decompress(section)
+    header_size, = _header_size.unpack_from(data)
+    entries = json.loads(data[_header_size.size:_header_size.size + header_size].decode("utf-8"))
+    offset = _header_size.size + header_size
+    codebook_dict = {}
+    for entry in entries:
+        shape = tuple(entry["shape"])
+        count = int(np.prod(shape))
+        codebook = np.frombuffer(data, dtype=entry["dtype"], count=count, offset=offset)
+        offset += codebook.nbytes
+        if entry["dtype"] == "uint8":
+            columns = codebook.reshape(_columns(shape))
+            codebook = np.asarray(entry["low"], dtype=np.float32) + columns * np.asarray(entry["step"], dtype=np.float32)
+        codebook_dict[entry["name"]] = codebook.astype(np.float32).reshape(shape)
+    return codebook_dict
+
+
+def codebook_entries(section) -> List[dict]:
+    """Header of a codebook section (with or without its footer): name, shape and dtype of every codebook.
+    Only the start of the section is inflated."""
+    section = memoryview(section)
+    return _inflate_entries(section[i:i + _chunk_size] for i in range(0, section.nbytes, _chunk_size))
+
+
+def read_codebook_entries(file: BinaryIO) -> Optional[List[dict]]:
+    """Header of the codebooks embedded at the end of an open .drc file (see codebook_entries), None if there are none."""
+    size = file.seek(0, 2)
+    file.seek(max(size - _footer.size, 0))
+    section = _find_section(file.read(_footer.size), size)
+    if section is None:
+        return None
+    begin, end = section
+    file.seek(begin)
+    return _inflate_entries(file.read(min(_chunk_size, end - offset)) for offset in range(begin, end, _chunk_size))
+
+
+_chunk_size = 16384
+
+
+def _inflate_entries(chunks: Iterable[bytes]) -> List[dict]:
+    decompressor, data = zlib.decompressobj(), b""
+    for chunk in chunks:
+        data += decompressor.decompress(chunk)
+        if len(data) >= _header_size.size and len(data) >= _header_size.size + _header_size.unpack_from(data)[0]:
+            header_size, = _header_size.unpack_from(data)
+            return json.loads(data[_header_size.size:_header_size.size + header_size].decode("utf-8"))
+    raise ValueError("Corrupted codebook section")
+
+
+def split_codebook(buffer) -> Tuple[memoryview, Optional[Dict[str, np.ndarray]]]:
+    """Split the content of a .drc file into its Draco buffer and its embedded codebooks (None if there are none)."""
+    buffer = memoryview(buffer)
+    section = _find_section(buffer[-_footer.size:], buffer.nbytes)
+    if section is None:
+        return buffer, None
+    begin, end = section
+    return buffer[:begin], unpack_codebook(buffer[begin:end])
+
+
+def read_codebook(file: BinaryIO) -> Tuple[int, Optional[Dict[str, np.ndarray]]]:
+    """Read the codebooks embedded at the end of an open .drc file.
+    Returns the size of the Draco buffer at the start of the file and the codebooks (None if there are none)."""
+    size = file.seek(0, 2)
+    file.seek(max(size - _footer.size, 0))
+    section = _find_section(file.read(_footer.size), size)
+    if section is None:
+        return size, None
+    begin, end = section
+    file.seek(begin)
+    return begin, unpack_codebook(file.read(end - begin))
+
+
+def _find_section(footer, size: int) -> Optional[Tuple[int, int]]:
+    """Byte range of the codebook section of a file of the given size, from its last bytes."""
+    if len(footer) < _footer.size or bytes(footer[-len(MAGIC):]) != MAGIC:
+        return None
+    section_size, _ = _footer.unpack(footer)
+    end = size - _footer.size
+    if section_size > end:
+        raise ValueError("Corrupted codebook section")
+    return end - section_size, end
@@ -1,14 +1,28 @@
+from __future__ import annotations
+
 import os
 import platform
 import subprocess
-import tempfile
-from plyfile import PlyData, PlyElement
+from typing import TYPE_CHECKING
+
 import numpy as np
-import torch
-from gaussian_splatting import GaussianModel
-from reduced_3dgs.quantization import VectorQuantizer
 
 from . import dracoreduced3dgs
+from .assignment import AssignmentCache, quantize
+from .codebook import CODEBOOK_DTYPES, pack_codebook, read_codebook, split_codebook
+from ..lazy import lazy_import
+from ..memfile import temporary_files
+from ..ply import PlyAllocator
+from ..spatial import curve_order
+from ..staging import TensorAllocator, to_host
+from ..trace import stage
+
+if TYPE_CHECKING:
+    from gaussian_splatting import GaussianModel
+    from reduced_3dgs.quantization import VectorQuantizer
+
+torch = lazy_import("torch")
+plyfile = lazy_import("plyfile")
 
 default_encoder_executable = os.path.join(os.path.dirname(__file__), "draco_encoder") + (".exe" if platform.system() == "Windows" else "")
 default_decoder_executable = os.path.join(os.path.dirname(__file__), "draco_decoder") + (".exe" if platform.system() == "Windows" else "")
@@ -27,7 +41,15 @@ class VectorQuantizationCompressor:
         qfeaturedc=30,
         qfeaturerest=30,
         use_executable_backend: bool = False,
+        reorder: str = None,
+        embed_codebook: bool = False,
+        codebook_dtype: str = "float32",
+        assignment_cache: AssignmentCache = None,
     ):
+        if reorder not in (None, "morton", "hilbert"):
+            raise ValueError(f"Unknown reorder curve: {reorder}")
+        if codebook_dtype not in CODEBOOK_DTYPES:
+            raise ValueError(f"Unknown codebook dtype: {codebook_dtype}")
         self.quantizer = quantizer
         if encoder_executable is None:
             encoder_executable = default_encoder_executable
@@ -40,6 +62,12 @@ class VectorQuantizationCompressor:
         self.qfeaturedc = qfeaturedc
         self.qfeaturerest = qfeaturerest
         self.use_executable_backend = use_executable_backend
+        self.reorder = reorder
+        self.embed_codebook = embed_codebook
+        self.codebook_dtype = codebook_dtype
+        # Assignments of the models saved with this compressor, e.g. AssignmentCache() to re-encode the same model
+        # at other settings without searching the codebooks again (it keeps the ids of its entries alive)
+        self.assignment_cache = assignment_cache
 
     def save_compressed(self, model: GaussianModel, path: str):
         if self.use_executable_backend:
@@ -48,7 +76,8 @@ class VectorQuantizationCompressor:
             self._save_compressed_pyd(model, path)
 
     def _save_compressed_executable(self, model: GaussianModel, path: str):
-        ids_dict, codebook_dict = self.quantizer.quantize(model, update_codebook=False)
+        with stage("quantize"):
+            ids_dict, codebook_dict = quantize(self.quantizer, model, self.assignment_cache)
         dtype_full = self.quantizer.ply_dtype(model.max_sh_degree)
         data_full = self.quantizer.ply_data(model, ids_dict)
         for i in range(len(dtype_full)):
@@ -56,62 +85,86 @@ class VectorQuantizationCompressor:
                 dtype_full[i] = (dtype_full[i][0], 'i4')
 
         elements = np.rec.fromarrays([data.squeeze(-1) for data in data_full], dtype=dtype_full)
-        el = PlyElement.describe(elements, 'vertex')
+        elements = elements[self._order(model)]
+        el = plyfile.PlyElement.describe(elements, 'vertex')
 
-        with tempfile.TemporaryDirectory() as temp_dir:
-            ply_path = os.path.join(temp_dir, "point_cloud.ply")
-            PlyData([el]).write(ply_path)
+        with temporary_files("point_cloud.ply") as (ply_path,):
+            plyfile.PlyData([el]).write(ply_path)
             os.makedirs(os.path.dirname(path), exist_ok=True)
-            subprocess.check_call([
-                self.encoder_executable,
-                "-i", ply_path, "-o", path,
-                "-cl", str(self.compression_level),
-                "-qp", str(self.qposition),
-                "-qscale", str(self.qscale),
-                "-qrotation", str(self.qrotation),
-                "-qopacity", str(self.qopacity),
-                "-qfeaturedc", str(self.qfeaturedc),
-                "-qfeaturerest", str(self.qfeaturerest),
-            ])
-
-        np.savez(
-            os.path.join(os.path.splitext(path)[0] + ".codebook.npz"),
-            **{k: v.cpu().numpy() for k, v in codebook_dict.items()}
-        )
+            with stage("encode_executable", path=path):
+                subprocess.check_call([
+                    self.encoder_executable,
+                    "-i", ply_path, "-o", path,
+                    "-cl", str(self.compression_level),
+                    "-qp", str(self.qposition),
+                    "-qscale", str(self.qscale),
+                    "-qrotation", str(self.qrotation),
+                    "-qopacity", str(self.qopacity),
+                    "-qfeaturedc", str(self.qfeaturedc),
+                    "-qfeaturerest", str(self.qfeaturerest),
+                ])
+
+        self._save_codebook(codebook_dict, path)
 
     def _save_compressed_pyd(self, model: GaussianModel, path: str):
-        ids_dict, codebook_dict = self.quantizer.quantize(model, update_codebook=False)
-
-        # Extract model attributes (reduced 3DGS format) directly from model and ids_dict
-        positions = model._xyz.detach().cpu().numpy()  # (N, 3)
-        scales = ids_dict["scaling"].cpu().numpy().reshape(-1, 1)  # (N, 1)
-        rotations = np.column_stack([
-            ids_dict["rotation_re"].cpu().numpy(),
-            ids_dict["rotation_im"].cpu().numpy()
-        ])  # (N, 2)
-        opacities = ids_dict["opacity"].cpu().numpy().reshape(-1, 1)  # (N, 1)
-        features_dc = ids_dict["features_dc"].cpu().numpy().reshape(-1, 1)  # (N, 1)
-        # features_rest: combine all sh_degrees into (N, 9)
-        features_rest_list = [ids_dict[f"features_rest_{sh_degree}"].cpu().numpy() for sh_degree in range(model.max_sh_degree)]
-        features_rest = np.column_stack(features_rest_list)  # (N, 9)
+        with stage("quantize"):
+            ids_dict, codebook_dict = quantize(self.quantizer, model, self.assignment_cache)
 
         # Encode
-        encoded = dracoreduced3dgs.encode(
-            positions, scales, rotations, opacities, features_dc, features_rest,
-            self.compression_level,
-            self.qposition, self.qscale, self.qrotation,
-            self.qopacity, self.qfeaturedc, self.qfeaturerest
-        )
+        with stage("attributes") as s:
+            attributes = self._quantized_attributes(model, ids_dict, self._order(model))
+            s.set(bytes_out=sum(attribute.nbytes for attribute in attributes))
+        encoded = self._encode(attributes)
 
         # Write to file
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, 'wb') as f:
+        with stage("write", path=path, bytes_in=len(encoded)), open(path, 'wb') as f:
             f.write(encoded)
 
-        np.savez(
-            os.path.join(os.path.splitext(path)[0] + ".codebook.npz"),
-            **{k: v.cpu().numpy() for k, v in codebook_dict.items()}
-        )
+        self._save_codebook(codebook_dict, path)
+
+    def _quantized_attributes(self, model: GaussianModel, ids_dict, index=slice(None)):
+        # Extract model attributes (reduced 3DGS format) directly from model and ids_dict,
+        # reordered by index on their device and copied to the host at once (see staging.to_host)
+        if isinstance(index, np.ndarray):
+            index = torch.from_numpy(index)
+        positions = model._xyz.detach()  # (N, 3)
+        scales = ids_dict["scaling"].reshape(-1, 1)  # (N, 1)
+        rotations = torch.column_stack([ids_dict["rotation_re"], ids_dict["rotation_im"]])  # (N, 2)
+        opacities = ids_dict["opacity"].reshape(-1, 1)  # (N, 1)
+        features_dc = ids_dict["features_dc"].reshape(-1, 1)  # (N, 1)
+        # features_rest: combine all sh_degrees into (N, 3 * max_sh_degree), i.e. (N, 9) for SH degree 3
+        features_rest_list = [ids_dict[f"features_rest_{sh_degree}"] for sh_degree in range(model.max_sh_degree)]
+        features_rest = torch.column_stack(features_rest_list) if features_rest_list else torch.zeros((positions.shape[0], 0), dtype=torch.int32, device=positions.device)
+        return to_host([attribute[index] for attribute in (positions, scales, rotations, opacities, features_dc, features_rest)]).result()
+
+    def _encode(self, attributes):
+        with stage("encode", bytes_in=sum(attribute.nbytes for attribute in attributes)) as s:
+            encoded = dracoreduced3dgs.encode_buffer(
+                *attributes,
+                self.compression_level,
+                self.qposition, self.qscale, self.qrotation,
+                self.qopacity, self.qfeaturedc, self.qfeaturerest
+            )
+            s.set(bytes_out=len(encoded))
+        return encoded
+
+    def _save_codebook(self, codebook_dict, path: str):
+        with stage("codebook", path=path):
+            codebook_dict = {k: v.cpu().numpy() for k, v in codebook_dict.items()}
+            if self.embed_codebook:
+                # Appended after the Draco buffer, so that the .drc file is self-contained
+                with open(path, 'ab') as f:
+                    f.write(pack_codebook(codebook_dict, self.codebook_dtype))
+            else:
+                np.savez(os.path.join(os.path.splitext(path)[0] + ".codebook.npz"), **codebook_dict)
+
+    def _order(self, model: GaussianModel):
+        # Sort along a space-filling curve so that Draco's predictors see spatially coherent
+        # neighbours; splats are unordered, so the permutation is not stored.
+        if not self.reorder:
+            return slice(None)
+        return curve_order(model._xyz.detach().cpu().numpy(), self.reorder)
 
 
 class VectorQuantizationDecompressor:
@@ -134,59 +187,121 @@ class VectorQuantizationDecompressor:
             return self._load_compressed_pyd(model, path)
 
     def _load_compressed_executable(self, model: GaussianModel, path: str):
-        with tempfile.TemporaryDirectory() as temp_dir:
-            ply_path = os.path.join(temp_dir, "point_cloud.ply")
-            subprocess.check_call([
-                self.decoder_executable,
-                "-i", path, "-o", ply_path
-            ])
-            plydata = PlyData.read(ply_path)
+        with temporary_files("point_cloud.drc", "point_cloud.ply") as (drc_path, ply_path):
+            with open(path, 'rb') as f:
+                draco_size, codebook_dict = read_codebook(f)
+                if codebook_dict is not None:
+                    # Hand only the Draco buffer to the decoder
+                    f.seek(0)
+                    with open(drc_path, 'wb') as draco_file:
+                        draco_file.write(f.read(draco_size))
+            with stage("decode_executable", path=path):
+                subprocess.check_call([
+                    self.decoder_executable,
+                    "-i", path if codebook_dict is None else drc_path, "-o", ply_path
+                ])
+            plydata = plyfile.PlyData.read(ply_path)
             ids_dict = self.quantizer.parse_ids(plydata, model.max_sh_degree, model._xyz.device)
             kwargs = dict(dtype=torch.float32, device=model._xyz.device)
-            codebook_dict = {name: torch.tensor(array, **kwargs) for name, array in np.load(os.path.splitext(path)[0] + ".codebook.npz").items()}
+            if codebook_dict is None:  # legacy layout
+                codebook_dict = np.load(os.path.splitext(path)[0] + ".codebook.npz")
+            codebook_dict = {name: torch.tensor(array, **kwargs) for name, array in codebook_dict.items()}
             xyz = self.quantizer.parse_xyz(plydata, model._xyz.device)
             self._codebook_dict = codebook_dict
             del plydata
-            return self.quantizer.dequantize(model, ids_dict, codebook_dict, xyz=xyz, replace=True)
+            with stage("dequantize"):
+                return self.quantizer.dequantize(model, ids_dict, codebook_dict, xyz=xyz, replace=True)
 
-    def _load_compressed_pyd(self, model: GaussianModel, path: str):
-        # Read from file
-        with open(path, 'rb') as f:
-            buffer = f.read()
+    def save_ply(self, path: str, ply_path: str):
+        """Decode path straight into a binary PLY file at ply_path (the format of GaussianModel.save_ply), without
+        torch or a GaussianModel: the codebooks are gathered by the decoded ids into the preallocated vertex records,
+        which are written at once."""
+        if self.use_executable_backend:
+            raise ValueError("Direct PLY output is not supported by the executable backend")
+        buffer, codebook_dict = self._read(path)
+        decoded = self._decode(buffer)
+        del buffer
+        if codebook_dict is None:  # legacy layout
+            codebook_dict = np.load(os.path.splitext(path)[0] + ".codebook.npz")
+        with stage("dequantize"):
+            vertices = dequantize_vertices(decoded, codebook_dict)
+        with stage("write", path=ply_path, bytes_in=vertices.vertices.nbytes):
+            vertices.write(ply_path)
 
-        # Decode
-        pc = dracoreduced3dgs.decode(buffer)
+    def _load_compressed_pyd(self, model: GaussianModel, path: str):
+        # Read from file, in one read whether the codebook is embedded or not
+        buffer, codebook_dict = self._read(path)
 
-        # Reconstruct ids_dict from decoded data
+        # Decode straight into torch tensors (pinned if they are bound for a GPU) and upload them without blocking
         device = model._xyz.device
-        kwargs = dict(dtype=torch.float32, device=device)
+        allocator = TensorAllocator(device)
+        self._decode(buffer, allocator)
+        del buffer
+        with stage("upload", device=str(device)):
+            decoded = allocator.to(device)
+
+        # Load codebook, from the legacy .codebook.npz file if it is not embedded
+        if codebook_dict is None:
+            codebook_dict = np.load(os.path.splitext(path)[0] + ".codebook.npz")
+        return self._dequantize(model, decoded, codebook_dict)
 
+    def _dequantize(self, model: GaussianModel, decoded, codebook_dict):
         # Build ids_dict from decoded data
-        # The decoded data contains: positions(Nx3), scales(Nx1), rotations(Nx2),
-        # opacities(Nx1), features_dc(Nx1), features_rest(Nx9)
-        # The values are stored as floats but represent integer indices
+        # The decoded data contains: positions(Nx3 float), scales(Nx1), rotations(Nx2),
+        # opacities(Nx1), features_dc(Nx1), features_rest(Nx(3 * sh_degree)) int32 indices
+        # Columns are split on the device, so that only contiguous tensors are transferred
         ids_dict = {
-            'scaling': torch.tensor(pc.scales.flatten(), device=device),
-            'rotation_re': torch.tensor(pc.rotations[:, 0], device=device),
-            'rotation_im': torch.tensor(pc.rotations[:, 1], device=device),
-            'opacity': torch.tensor(pc.opacities.flatten(), device=device),
-            'features_dc': torch.tensor(pc.features_dc.flatten(), device=device).unsqueeze(-1),
+            'scaling': decoded["scales"][:, 0],
+            'rotation_re': decoded["rotations"][:, 0],
+            'rotation_im': decoded["rotations"][:, 1],
+            'opacity': decoded["opacities"][:, 0],
+            'features_dc': decoded["features_dc"],
         }
 
-        # features_rest: Nx9 -> split into 3 sh_degrees, each with Nx3
-        features_rest = pc.features_rest  # (N, 9)
+        # features_rest: Nx(3 * sh_degree) -> split into sh_degrees, each with Nx3
+        # The SH degree comes from the file, and the model follows it
+        model.max_sh_degree = model.active_sh_degree = decoded["features_rest"].shape[1] // 3
         for sh_degree in range(model.max_sh_degree):
-            start_idx = sh_degree * 3
-            end_idx = start_idx + 3
-            ids_dict[f'features_rest_{sh_degree}'] = torch.tensor(
-                features_rest[:, start_idx:end_idx], device=device
-            )
+            ids_dict[f'features_rest_{sh_degree}'] = decoded["features_rest"][:, sh_degree * 3:(sh_degree + 1) * 3]
 
-        # Load codebook
-        codebook_dict = {name: torch.tensor(array, **kwargs) for name, array in np.load(os.path.splitext(path)[0] + ".codebook.npz").items()}
+        kwargs = dict(dtype=torch.float32, device=model._xyz.device)
+        codebook_dict = {name: torch.tensor(array, **kwargs) for name, array in codebook_dict.items()}
         self._codebook_dict = codebook_dict
 
-        # Get xyz from decoded positions
-        xyz = torch.tensor(pc.positions, **kwargs)
+        with stage("dequantize"):
+            return self.quantizer.dequantize(model, ids_dict, codebook_dict, xyz=decoded["positions"], replace=True)
+
+    def _read(self, path: str):
+        with stage("read", path=path) as s, open(path, 'rb') as f:
+            data = f.read()
+            s.set(bytes_out=len(data))
+            return split_codebook(data)
+
+    def _decode(self, buffer, allocator=None):
+        with stage("decode", bytes_in=len(buffer)):
+            return dracoreduced3dgs.decode(buffer, allocator)
+
 
-        return self.quantizer.dequantize(model, ids_dict, codebook_dict, xyz=xyz, replace=True)
+def dequantize_vertices(decoded, codebook_dict) -> PlyAllocator:
+    """VectorQuantizer.dequantize of a decoded point cloud (dracoreduced3dgs.PointCloud) into PLY vertex records,
+    with one gather per codebook straight into the fields it fills."""
+    codebook_dict = {name: np.asarray(array, dtype=np.float32) for name, array in codebook_dict.items()}
+    num_points, sh_degree = decoded.num_points, decoded.sh_degree
+    vertices = PlyAllocator(num_points, sh_degree)
+    vertices("positions", (num_points, 3), "float32")[...] = decoded.positions
+    np.take(codebook_dict["scaling"], decoded.scales[:, 0], axis=0, out=vertices("scales", (num_points, 3), "float32"))
+    rotations = vertices("rotations", (num_points, 4), "float32")
+    np.take(codebook_dict["rotation_re"], decoded.rotations[:, 0], axis=0, out=rotations[:, :1])
+    np.take(codebook_dict["rotation_im"], decoded.rotations[:, 1], axis=0, out=rotations[:, 1:])
+    np.take(codebook_dict["opacity"], decoded.opacities[:, 0], axis=0, out=vertices("opacities", (num_points, 1), "float32"))
+    np.take(codebook_dict["features_dc"], decoded.features_dc[:, 0], axis=0, out=vertices("features_dc", (num_points, 3), "float32"))
+    # f_rest_* are channel-major (f_rest_<channel * num_sh_coeffs + coefficient>), and every degree has a codebook
+    # of its coefficients, whose ids are stored per channel
+    num_sh_coeffs = (sh_degree + 1) ** 2 - 1
+    features_rest = vertices("features_rest", (num_points, 3 * num_sh_coeffs), "float32")
+    for degree in range(sh_degree):
+        begin, end = (degree + 1) ** 2 - 1, (degree + 2) ** 2 - 1
+        for channel in range(3):
+            columns = slice(channel * num_sh_coeffs + begin, channel * num_sh_coeffs + end)
+            np.take(codebook_dict[f"features_rest_{degree}"], decoded.features_rest[:, degree * 3 + channel], axis=0, out=features_rest[:, columns])
+    return vertices
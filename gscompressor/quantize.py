@@ -1,9 +1,12 @@
-import torch
 import os
-import shutil
-from gaussian_splatting import GaussianModel
-from reduced_3dgs.quantization import ExcludeZeroSHQuantizer as VectorQuantizer
+from contextlib import nullcontext
+from gscompressor.cache import EncodeCache, encoder_parameters
+from gscompressor.compress import copy_scene_files
+from gscompressor.lazy import lazy_import
 from gscompressor.quantization import VectorQuantizationCompressor, VectorQuantizationDecompressor
+from gscompressor.trace import trace
+
+torch = lazy_import("torch")
 
 
 def compress(
@@ -19,18 +22,15 @@ def compress(
         qfeaturedc=30,
         qfeaturerest=30,
         use_executable_backend=False,
+        reorder=None,
+        embed_codebook=False,
+        codebook_dtype="float32",
+        cache: EncodeCache = None,
         **kwargs
 ):
-    gaussians = GaussianModel(sh_degree)
-    quantizer = VectorQuantizer(**kwargs)
-    if load_ply.endswith("point_cloud_quantized.ply"):
-        quantizer.load_quantized(gaussians, ply_path=load_ply)
-    elif load_ply.endswith("point_cloud.ply"):
-        gaussians.load_ply(load_ply)
-    else:
-        raise ValueError(f"Unsupported file format: {load_ply}. Expected point_cloud.ply or point_cloud_quantized.ply file.")
+    # The quantizer is set once the cache missed, so that hits do not import the models (kwargs configure it)
     compressor = VectorQuantizationCompressor(
-        quantizer,
+        None,
         encoder_executable=encoder_executable,
         compression_level=compression_level,
         qposition=qposition,
@@ -40,8 +40,29 @@ def compress(
         qfeaturedc=qfeaturedc,
         qfeaturerest=qfeaturerest,
         use_executable_backend=use_executable_backend,
+        reorder=reorder,
+        embed_codebook=embed_codebook,
+        codebook_dtype=codebook_dtype,
     )
-    compressor.save_compressed(gaussians, save_drc)
+    if cache is not None:
+        key = cache.key(load_ply, encoder_parameters(compressor, "vq", sh_degree=sh_degree, quantizer=kwargs))
+        if cache.get(key, save_drc) is not None:
+            return
+    from gaussian_splatting import GaussianModel
+    from reduced_3dgs.quantization import ExcludeZeroSHQuantizer as VectorQuantizer
+    gaussians = GaussianModel(sh_degree)
+    quantizer = VectorQuantizer(**kwargs)
+    if load_ply.endswith("point_cloud_quantized.ply"):
+        quantizer.load_quantized(gaussians, ply_path=load_ply)
+    elif load_ply.endswith("point_cloud.ply"):
+        gaussians.load_ply(load_ply)
+    else:
+        raise ValueError(f"Unsupported file format: {load_ply}. Expected point_cloud.ply or point_cloud_quantized.ply file.")
+    compressor.quantizer = quantizer
+    with torch.no_grad():
+        compressor.save_compressed(gaussians, save_drc)
+    if cache is not None:
+        cache.put(key, save_drc, suffixes=[] if embed_codebook else [".codebook.npz"])
 
 
 def decompress(
@@ -51,13 +72,20 @@ def decompress(
         decoder_executable: str,
         use_executable_backend=False,
 ):
-    gaussians = GaussianModel(sh_degree)
+    if not use_executable_backend:
+        # Dequantized straight into the PLY file (see VectorQuantizationDecompressor.save_ply), without the quantizer or torch
+        VectorQuantizationDecompressor(None).save_ply(load_drc, save_ply)
+        return
+    from gaussian_splatting import GaussianModel
+    from reduced_3dgs.quantization import ExcludeZeroSHQuantizer as VectorQuantizer
     decompressor = VectorQuantizationDecompressor(
         VectorQuantizer(),
         decoder_executable=decoder_executable,
         use_executable_backend=use_executable_backend,
     )
-    decompressor.load_compressed(gaussians, load_drc)
+    gaussians = GaussianModel(sh_degree)
+    with torch.no_grad():
+        decompressor.load_compressed(gaussians, load_drc)
     gaussians.save_ply(save_ply)
 
 
@@ -68,6 +96,8 @@ if __name__ == "__main__":
     parser.add_argument("-s", "--source", required=True, type=str)
     parser.add_argument("-d", "--destination", required=True, type=str)
     parser.add_argument("-i", "--iteration", required=True, type=int)
+    parser.add_argument("--trace", default=None, type=str, help="save the timings of the stages to this file")
+    parser.add_argument("--trace_format", default="chrome", choices=["chrome", "json"], type=str)
     subparsers = parser.add_subparsers(dest="mode", required=True)
     rootparser = parser
     parser = subparsers.add_parser("compress")
@@ -87,12 +117,17 @@ if __name__ == "__main__":
     parser.add_argument("--num_clusters_features_dc", type=int, default=None)
     parser.add_argument("--num_clusters_features_rest", nargs="+", type=int, default=[])
     parser.add_argument("--use_executable_backend", action="store_true")
+    parser.add_argument("--reorder", default=None, choices=["morton", "hilbert"], type=str)
+    parser.add_argument("--embed_codebook", action="store_true")
+    parser.add_argument("--codebook_dtype", default="float32", choices=["float32", "float16", "uint8"], type=str)
+    parser.add_argument("--cache", default=None, type=str, help="directory of a cache of encoded files, to skip unchanged inputs")
+    parser.add_argument("--cache_size", default=None, type=int, help="maximum size of the cache in bytes")
     parser = subparsers.add_parser("decompress")
     parser.add_argument("--decoder_executable", default=None, type=str)
     parser.add_argument("--use_executable_backend", action="store_true")
     args = rootparser.parse_args()
     save_drc = os.path.join(args.destination, "point_cloud", "iteration_" + str(args.iteration), "point_cloud.drc")
-    with torch.no_grad():
+    with trace() if args.trace else nullcontext() as tracer:
         match args.mode:
             case "compress":
                 load_ply = os.path.join(args.source, "point_cloud", "iteration_" + str(args.iteration), "point_cloud_quantized.ply")
@@ -111,6 +146,10 @@ if __name__ == "__main__":
                     qfeaturedc=args.qfeaturedc,
                     qfeaturerest=args.qfeaturerest,
                     use_executable_backend=args.use_executable_backend,
+                    reorder=args.reorder,
+                    embed_codebook=args.embed_codebook,
+                    codebook_dtype=args.codebook_dtype,
+                    cache=EncodeCache(args.cache, args.cache_size) if args.cache else None,
                     num_clusters=args.num_clusters,
                     num_clusters_rotation_re=args.num_clusters_rotation_re,
                     num_clusters_rotation_im=args.num_clusters_rotation_im,
@@ -128,9 +167,8 @@ if __name__ == "__main__":
                     decoder_executable=args.decoder_executable,
                     use_executable_backend=args.use_executable_backend,
                 )
-                shutil.copy2(os.path.join(args.source, "cfg_args"), os.path.join(args.destination, "cfg_args"))
-                shutil.copy2(os.path.join(args.source, "cameras.json"), os.path.join(args.destination, "cameras.json"))
-                if os.path.exists(os.path.join(args.source, "input.ply")):
-                    shutil.copy2(os.path.join(args.source, "input.ply"), os.path.join(args.destination, "input.ply"))
+                copy_scene_files(args.source, args.destination)
             case _:
                 raise ValueError(f"Unknown mode: {args.mode}")
+    if args.trace:
+        tracer.save(args.trace, args.trace_format)
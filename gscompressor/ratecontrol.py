@@ -0,0 +1,141 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Sequence, Tuple, Union
+
+import numpy as np
+
+from . import draco3dgs
+
+# Rate control: choose the quantization bits of every attribute for an error bound or a byte budget.
+# Draco quantizes an attribute uniformly over the largest range of its components with 2^bits - 1 steps, so the
+# maximum error of a setting is known without encoding (half a step, plus float32 rounding of the dequantized values).
+# Sizes are not, so a byte budget is met with a rate model measured on a random subset of the points: the size of
+# every attribute at every number of bits is the size difference of proxy encodes in which only its bits change
+# (at the compression level of the compressor, so that the proxy is entropy coded the same way; Draco encodes the
+# attributes independently, so their sizes add up, exactly at level 0 and approximately above), measured in parallel
+# when first needed and memoized. Bits are then allocated greedily, one at a time to the attribute whose relative
+# quantization noise (noise power over signal power) decreases most per byte.
+# NOTE: Draco's encoding time and memory grow with 2^bits (about 4 GB at 30 bits), whatever the number of points.
+
+quantization_settings = dict(positions="qposition", scales="qscale", rotations="qrotation", opacities="qopacity", features_dc="qfeaturedc", features_rest="qfeaturerest")
+# Beyond 24 bits the quantization step of a float32 attribute is below its rounding error (see max_error), while Draco's
+# encoding time and memory keep growing, so error bounds and bit allocation both stop there
+MAX_BITS = 24
+
+
+def _per_attribute(value, name: str):
+    return value.get(name) if isinstance(value, dict) else value
+
+
+class AttributeStatistics:
+    """Ranges and variances of the attributes, in the layout of draco3dgs.encode."""
+
+    def __init__(self, attributes: Sequence[np.ndarray]):
+        self.ranges, self.magnitudes, self.variances, self.num_components = {}, {}, {}, {}
+        for name, attribute in zip(quantization_settings, attributes):
+            attribute = attribute.reshape(attribute.shape[0], -1)
+            empty = attribute.size == 0
+            self.ranges[name] = 0.0 if empty else float((attribute.max(0) - attribute.min(0)).max())
+            self.magnitudes[name] = 0.0 if empty else float(np.abs(attribute).max())
+            self.variances[name] = 0.0 if empty else float(attribute.var(0, dtype=np.float64).sum())
+            self.num_components[name] = attribute.shape[1]
+
+    def max_error(self, name: str, bits: int) -> float:
+        """Maximum reconstruction error of an attribute quantized to bits."""
+        return self.ranges[name] / ((1 << bits) - 1) / 2 + self.magnitudes[name] * 2.0 ** -23
+
+    def noise(self, name: str, bits: int) -> float:
+        """Quantization noise power of an attribute relative to its signal power."""
+        if self.variances[name] == 0:
+            return 0.0
+        step = self.ranges[name] / ((1 << bits) - 1)
+        return self.num_components[name] * step ** 2 / 12 / self.variances[name]
+
+    def bits_for_error(self, max_error: Union[float, Dict[str, float]], min_bits: int = 1, unbounded_bits: Dict[str, int] = None) -> Dict[str, int]:
+        """Fewest bits (at least min_bits) that keep the error of every attribute within max_error
+        (a bound for all attributes or one per attribute name; attributes without a bound get their unbounded_bits,
+        e.g. the q* settings of the compressor, or min_bits if None)."""
+        bits = {}
+        for name in quantization_settings:
+            bound = _per_attribute(max_error, name)
+            bits[name] = min_bits
+            if bound is None:
+                if unbounded_bits is not None:
+                    bits[name] = unbounded_bits[name]
+                continue
+            if self.ranges[name] == 0:
+                continue
+            while self.max_error(name, bits[name]) > bound:
+                if bits[name] == MAX_BITS:
+                    raise ValueError(f"Error bound {bound} of {name} needs more than {MAX_BITS} bits")
+                bits[name] += 1
+        return bits
+
+
+class RateModel:
+    """Estimated size of a Draco buffer at compression_level as a function of the bits of every attribute,
+    from proxy encodes of a random subset of the points."""
+
+    def __init__(self, attributes: Sequence[np.ndarray], compression_level: int = 0, sample_size: int = 20000, base_bits: int = 8, max_workers: int = None, seed: int = 0):
+        num_points = attributes[0].shape[0]
+        index = slice(None)
+        if num_points > sample_size:
+            # Sorted, so that the proxy keeps the order (and hence the locality) of the points
+            index = np.sort(np.random.default_rng(seed).choice(num_points, sample_size, replace=False))
+        self.sample = [np.ascontiguousarray(attribute[index]) for attribute in attributes]
+        self.scale = num_points / max(self.sample[0].shape[0], 1)
+        self.compression_level = compression_level
+        self.base_bits = base_bits
+        self.max_workers = max_workers
+        self.base_size = self._encoded_size({})
+        self.deltas: Dict[Tuple[str, int], int] = {}  # (attribute, bits) -> size difference from base_bits
+
+    def _encoded_size(self, bits: Dict[str, int]) -> int:
+        settings = [bits.get(name, self.base_bits) for name in quantization_settings]
+        return len(draco3dgs.encode_buffer(*self.sample, self.compression_level, *settings))
+
+    def measure(self, candidates: Iterable[Tuple[str, int]]):
+        """Run the proxy encodes of the (attribute, bits) pairs that are not measured yet, in parallel."""
+        missing = [(name, bits) for name, bits in dict.fromkeys(candidates) if (name, bits) not in self.deltas and bits != self.base_bits]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            sizes = list(executor.map(lambda candidate: self._encoded_size(dict([candidate])), missing))
+        for candidate, size in zip(missing, sizes):
+            self.deltas[candidate] = size - self.base_size
+
+    def size(self, bits: Dict[str, int]) -> float:
+        """Estimated size in bytes of all the points encoded with bits."""
+        self.measure(bits.items())
+        return self.scale * (self.base_size + sum(self.deltas.get(candidate, 0) for candidate in bits.items()))
+
+
+def allocate_bits(
+        statistics: AttributeStatistics,
+        rate_model: RateModel,
+        target_size: float,
+        min_bits: Dict[str, int],
+        max_bits: int = MAX_BITS,
+        weights: Dict[str, float] = None,
+) -> Dict[str, int]:
+    """Greedy bit allocation: starting from min_bits, add the bit with the largest weighted noise reduction per byte
+    while the estimated size stays within target_size."""
+    bits = dict(min_bits)
+    if rate_model.size(bits) > target_size:
+        raise ValueError(f"Even the smallest settings {bits} take about {rate_model.size(bits):.0f} bytes, more than {target_size}")
+    candidates = [name for name in bits if statistics.num_components[name] > 0 and statistics.variances[name] > 0]
+    size = rate_model.size(bits)
+    while True:
+        candidates = [name for name in candidates if bits[name] < max_bits]
+        rate_model.measure((name, bits[name] + 1) for name in candidates)
+        best, best_ratio, best_size = None, -1.0, None
+        for name in candidates:
+            next_size = rate_model.size(dict(bits, **{name: bits[name] + 1}))
+            if next_size > target_size:
+                continue
+            weight = 1.0 if weights is None else weights.get(name, 1.0)
+            gain = weight * (statistics.noise(name, bits[name]) - statistics.noise(name, bits[name] + 1))
+            ratio = gain / max(next_size - size, 1.0)
+            if ratio > best_ratio:
+                best, best_ratio, best_size = name, ratio, next_size
+        if best is None:
+            return bits
+        bits[best] += 1
+        size = best_size
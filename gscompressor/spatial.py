@@ -0,0 +1,104 @@
+from typing import List, Literal, Tuple
+
+import numpy as np
+
+MORTON_BITS = 21  # 3 * 21 = 63 bits fit in a uint64 code
+
+
+def _part1by2(x: np.ndarray) -> np.ndarray:
+    """Spread the lower 21 bits of x so that there are two zero bits between each of them."""
+    x = x & np.uint64(0x1fffff)
+    x = (x | (x << np.uint64(32))) & np.uint64(0x1f00000000ffff)
+    x = (x | (x << np.uint64(16))) & np.uint64(0x1f0000ff0000ff)
+    x = (x | (x << np.uint64(8))) & np.uint64(0x100f00f00f00f00f)
+    x = (x | (x << np.uint64(4))) & np.uint64(0x10c30c30c30c30c3)
+    x = (x | (x << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return x
+
+
+def quantize_positions(xyz: np.ndarray, bits: int = MORTON_BITS) -> np.ndarray:
+    """Quantize positions to a 2^bits grid spanning their bounding box; axes without extent map to 0."""
+    xyz = np.asarray(xyz, dtype=np.float64)
+    lo, hi = xyz.min(0), xyz.max(0)
+    scale = np.where(hi > lo, (2 ** bits - 1) / np.where(hi > lo, hi - lo, 1), 0)
+    return ((xyz - lo) * scale).astype(np.uint64)
+
+
+def morton_code(xyz: np.ndarray, bits: int = MORTON_BITS) -> np.ndarray:
+    """Morton (Z-order) code of each position, with x in the lowest bit of every triple."""
+    grid = quantize_positions(xyz, bits)
+    return _part1by2(grid[:, 0]) | (_part1by2(grid[:, 1]) << np.uint64(1)) | (_part1by2(grid[:, 2]) << np.uint64(2))
+
+
+def hilbert_code(xyz: np.ndarray, bits: int = MORTON_BITS) -> np.ndarray:
+    """Hilbert curve index of each position, vectorized from Skilling's AxesToTranspose."""
+    x = [axis.copy() for axis in quantize_positions(xyz, bits).T]
+    # Inverse undo excess work
+    q = 1 << (bits - 1)
+    while q > 1:
+        p = np.uint64(q - 1)
+        for i in range(3):
+            high = (x[i] & np.uint64(q)) != 0
+            t = np.where(high, np.uint64(0), (x[0] ^ x[i]) & p)
+            x[0] = np.where(high, x[0] ^ p, x[0] ^ t)
+            if i > 0:
+                x[i] = x[i] ^ t
+        q >>= 1
+    # Gray encode
+    for i in range(1, 3):
+        x[i] = x[i] ^ x[i - 1]
+    t = np.zeros_like(x[0])
+    q = 1 << (bits - 1)
+    while q > 1:
+        t = np.where((x[2] & np.uint64(q)) != 0, t ^ np.uint64(q - 1), t)
+        q >>= 1
+    x = [axis ^ t for axis in x]
+    # The transposed index holds its bits spread over the axes, most significant in x[0]
+    return (_part1by2(x[0]) << np.uint64(2)) | (_part1by2(x[1]) << np.uint64(1)) | _part1by2(x[2])
+
+
+def curve_order(xyz: np.ndarray, curve: Literal["morton", "hilbert"] = "morton") -> np.ndarray:
+    """Permutation that sorts positions along a space-filling curve."""
+    if len(xyz) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if curve == "morton":
+        codes = morton_code(xyz)
+    elif curve == "hilbert":
+        codes = hilbert_code(xyz)
+    else:
+        raise ValueError(f"Unknown space-filling curve: {curve}")
+    return np.argsort(codes, kind="stable")
+
+
+def octree_partition(sorted_codes: np.ndarray, max_points: int, bits: int = MORTON_BITS) -> List[Tuple[int, int]]:
+    """Split Morton-sorted points into runs of at most max_points that follow octree cell boundaries.
+
+    Cells are subdivided until they fit into max_points, then consecutive leaves are merged back
+    while they still fit, so that blocks are both spatially compact and close to max_points in size.
+    """
+    leaves = []
+    stack = [(0, len(sorted_codes), 0)]
+    while stack:
+        begin, end, level = stack.pop()
+        if end - begin <= max_points or level >= bits:
+            leaves.append((begin, end))
+            continue
+        # Children of a cell at this level are the points sharing the next 3 bits of the code
+        children = sorted_codes[begin:end] >> np.uint64(3 * (bits - level - 1))
+        boundaries = [begin, *(np.flatnonzero(np.diff(children)) + begin + 1).tolist(), end]
+        stack.extend((b, e, level + 1) for b, e in reversed(list(zip(boundaries[:-1], boundaries[1:]))))
+
+    cells = []
+    for begin, end in leaves:
+        if end - begin > max_points:  # points sharing a full-resolution code
+            cells.extend((b, min(b + max_points, end)) for b in range(begin, end, max_points))
+        elif cells and end - cells[-1][0] <= max_points:
+            cells[-1] = (cells[-1][0], end)
+        else:
+            cells.append((begin, end))
+    return cells
+
+
+def aabb_intersects(aabb: np.ndarray, other: np.ndarray) -> bool:
+    """Whether two (2, 3) [min, max] boxes overlap; boxes with NaN bounds are treated as unbounded."""
+    return not (np.any(aabb[1] < other[0]) or np.any(aabb[0] > other[1]))
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from .lazy import lazy_import
+from .trace import stage
+
+torch = lazy_import("torch")
+
+
+class TensorAllocator:
+    """Allocator for the decode functions of the extensions that hands out torch tensors,
+    so that Draco writes every attribute straight into its final host memory.
+
+    Tensors are pinned when they are bound for a CUDA device, which makes the upload asynchronous.
+    The tensors of a chunked file are allocated once for all of its blocks (num_points in total),
+    and each block is decoded into its own rows through at(offset)."""
+
+    def __init__(self, device, num_points: int = None):
+        self.pin_memory = torch.device(device).type == "cuda"
+        self.num_points = num_points
+        self.tensors: Dict[str, torch.Tensor] = {}
+        self.lock = threading.Lock()
+
+    def at(self, offset: int):
+        def allocate(name: str, shape: tuple, dtype: str):
+            with self.lock:
+                if name not in self.tensors:
+                    num_points = shape[0] if self.num_points is None else self.num_points
+                    self.tensors[name] = torch.empty((num_points, *shape[1:]), dtype=getattr(torch, dtype), pin_memory=self.pin_memory)
+            tensor = self.tensors[name]
+            if tensor.shape[1:] != shape[1:] or offset + shape[0] > tensor.shape[0]:
+                raise ValueError(f"Decoded {name} of shape {shape} does not fit at row {offset} of {tuple(tensor.shape)}")
+            return tensor[offset:offset + shape[0]]
+        return allocate
+
+    def __call__(self, name: str, shape: tuple, dtype: str):
+        return self.at(0)(name, shape, dtype)
+
+    def to(self, device) -> Dict[str, torch.Tensor]:
+        """Move the decoded tensors to device without blocking the host (a no-op for CPU tensors)."""
+        return {name: tensor.to(device, non_blocking=True) for name, tensor in self.tensors.items()}
+
+
+class HostArrays:
+    """Numpy arrays of tensors that are being copied to the host, see to_host; result() waits for the copy."""
+
+    def __init__(self, arrays: Sequence[np.ndarray], event=None, buffer: torch.Tensor = None):
+        self.arrays = tuple(arrays)
+        self.event = event
+        self.buffer = buffer  # pinned memory of the arrays
+
+    def result(self) -> Tuple[np.ndarray, ...]:
+        if self.event is not None:
+            with stage("transfer", bytes_in=sum(array.nbytes for array in self.arrays)):
+                self.event.synchronize()  # releases the GIL, so other threads encode meanwhile
+            self.event = None
+        return self.arrays
+
+
+_alignment = 64  # of every array in the staging buffer
+
+
+def to_host(tensors: Sequence[torch.Tensor]) -> HostArrays:
+    """Copy tensors (each of any shape and dtype) to numpy arrays without blocking.
+
+    CPU tensors are returned as is (zero copy; non-contiguous ones are made contiguous). CUDA tensors are packed
+    on the device into one byte buffer, on a side stream, and copied into one pinned host buffer with a single
+    asynchronous copy, instead of one synchronous copy per tensor. The caller can stage the next attributes or
+    encode the ones that are ready before calling result()."""
+    if all(tensor.device.type != "cuda" for tensor in tensors):
+        return HostArrays([tensor.detach().cpu().contiguous().numpy() for tensor in tensors])
+    device = next(tensor.device for tensor in tensors if tensor.device.type == "cuda")
+    offsets: List[int] = []
+    size = 0
+    for tensor in tensors:
+        offsets.append(size)
+        size += -(-tensor.numel() * tensor.element_size() // _alignment) * _alignment
+    stream = torch.cuda.Stream(device)
+    stream.wait_stream(torch.cuda.current_stream(device))  # the tensors are written on the current stream
+    with torch.cuda.stream(stream):
+        packed = torch.empty(size, dtype=torch.uint8, device=device)
+        for tensor, offset in zip(tensors, offsets):
+            nbytes = tensor.numel() * tensor.element_size()
+            if nbytes:
+                packed[offset:offset + nbytes].copy_(tensor.detach().to(device).contiguous().view(-1).view(torch.uint8))
+            if tensor.device.type == "cuda":
+                tensor.record_stream(stream)  # not reused by the caller's stream before the copy
+        host = torch.empty(size, dtype=torch.uint8, pin_memory=True)
+        host.copy_(packed, non_blocking=True)
+        event = torch.cuda.Event()
+        event.record(stream)
+    buffer = host.numpy()
+    arrays = [
+        np.frombuffer(buffer, dtype=torch.empty(0, dtype=tensor.dtype).numpy().dtype, count=tensor.numel(), offset=offset).reshape(tuple(tensor.shape))
+        for tensor, offset in zip(tensors, offsets)
+    ]
+    return HostArrays(arrays, event, host)
@@ -0,0 +1,148 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Tracing of the stages of the compress/decompress pipelines: attribute extraction (detach/cpu/numpy), quantization,
+# Draco encode and decode (split by the extensions into conversions, copies and Draco itself, see draco3dgs.encode),
+# file reads and writes, etc. A stage is a context manager from stage(name, **args) that records its wall time, thread,
+# bytes in and out (where they are known) and the peak RSS of the process at its end in every active Tracer (see trace);
+# without one, stage() returns a shared no-op, so the instrumentation costs a check of a global list per stage.
+# Traces are exported as JSON records or in the Chrome trace event format (chrome://tracing, https://ui.perfetto.dev).
+
+_tracers: List["Tracer"] = []  # replaced, never modified, so that stages read it without a lock
+_tracers_lock = threading.Lock()
+
+
+def peak_rss() -> Optional[int]:
+    """Peak resident set size of this process in bytes, None where the platform does not report it."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class Tracer:
+    """Events of the stages that ended while it was active: name, start (seconds since the tracer started), duration
+    (seconds), thread, peak_rss (bytes) and the arguments of the stage (e.g. bytes_in, bytes_out, path)."""
+
+    def __init__(self, callback: Callable[[dict], None] = None):
+        self.callback = callback
+        self.origin = time.perf_counter()
+        self.events: List[dict] = []
+        self.lock = threading.Lock()
+
+    def record(self, event: dict):
+        event = dict(event, start=event["start"] - self.origin)
+        with self.lock:
+            self.events.append(event)
+        if self.callback is not None:
+            self.callback(event)
+
+    def summary(self) -> Dict[str, dict]:
+        """Per stage name: count, total seconds and bytes in and out."""
+        summary = {}
+        for event in self.events:
+            entry = summary.setdefault(event["name"], dict(count=0, seconds=0.0, bytes_in=0, bytes_out=0))
+            entry["count"] += 1
+            entry["seconds"] += event["duration"]
+            entry["bytes_in"] += event.get("bytes_in", 0)
+            entry["bytes_out"] += event.get("bytes_out", 0)
+        return summary
+
+    def chrome_trace(self) -> dict:
+        """The events in the Chrome trace event format (complete events, in microseconds)."""
+        common = ("name", "start", "duration", "thread")
+        return dict(displayTimeUnit="ms", traceEvents=[
+            dict(name=event["name"], ph="X", ts=event["start"] * 1e6, dur=event["duration"] * 1e6, pid=os.getpid(), tid=event["thread"],
+                 args={key: value for key, value in event.items() if key not in common})
+            for event in self.events
+        ])
+
+    def save(self, path: str, format: str = "chrome"):
+        """Write the events as a Chrome trace ("chrome") or as a JSON list of events ("json")."""
+        match format:
+            case "chrome":
+                data = self.chrome_trace()
+            case "json":
+                data = self.events
+            case _:
+                raise ValueError(f"Unknown trace format: {format}")
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+
+@contextmanager
+def trace(callback: Callable[[dict], None] = None) -> Iterator[Tracer]:
+    """Record the stages that end (in any thread) while the block runs; callback(event) is called as each one ends."""
+    global _tracers
+    tracer = Tracer(callback)
+    with _tracers_lock:
+        _tracers = _tracers + [tracer]
+    try:
+        yield tracer
+    finally:
+        with _tracers_lock:
+            _tracers = [active for active in _tracers if active is not tracer]
+
+
+class Stage:
+    """An active stage; set(**args) adds arguments, and stats collects the durations of its steps from the extensions."""
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+        self.stats: Dict[str, float] = {}
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter()
+        thread = threading.current_thread().name
+        events = [dict(self.args, name=self.name, start=self.start, duration=end - self.start, thread=thread, peak_rss=peak_rss())]
+        if exc_type is not None:
+            events[0]["error"] = f"{exc_type.__name__}: {exc_value}"
+        start = self.start
+        for step, seconds in self.stats.items():  # consecutive steps, e.g. convert, copy and draco of encode
+            events.append(dict(name=f"{self.name}.{step}", start=start, duration=seconds, thread=thread))
+            start += seconds
+        for tracer in _tracers:
+            for event in events:
+                tracer.record(event)
+        return False
+
+
+class _NullStage:
+    stats = None
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_null_stage = _NullStage()
+
+
+def stage(name: str, **args):
+    """Context manager that records a stage in the active tracers (a no-op without any)."""
+    if not _tracers:
+        return _null_stage
+    return Stage(name, args)
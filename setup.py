@@ -106,7 +106,7 @@ setup(
                 depends=['./cpython/draco3dgs.h'],
                 language='c++',
                 include_dirs=[str(NumpyImport()), './cpython', './submodules/draco3dgs/src', './build/submodules/draco3dgs'],
-                extra_compile_args=['/std:c++17', '/O2'] if platform.system() == "Windows" else ['-std=c++11', '-O3'],
+                extra_compile_args=['/std:c++17', '/O2'] if platform.system() == "Windows" else ['-std=c++17', '-O3'],
                 extra_link_args=['/LIBPATH:' + os.path.abspath('./build/submodules/draco3dgs/Release'), 'draco.lib'] if platform.system() == "Windows"
                 else ['-L' + os.path.abspath('./build/submodules/draco3dgs'), '-ldraco'],
             ),
@@ -116,7 +116,7 @@ setup(
                 depends=['./cpython/dracoreduced3dgs.h'],
                 language='c++',
                 include_dirs=[str(NumpyImport()), './cpython', './submodules/dracoreduced3dgs/src', './build/submodules/dracoreduced3dgs'],
-                extra_compile_args=['/std:c++17', '/O2'] if platform.system() == "Windows" else ['-std=c++11', '-O3'],
+                extra_compile_args=['/std:c++17', '/O2'] if platform.system() == "Windows" else ['-std=c++17', '-O3'],
                 extra_link_args=['/LIBPATH:' + os.path.abspath('./build/submodules/dracoreduced3dgs/Release'), 'draco.lib'] if platform.system() == "Windows"
                 else ['-L' + os.path.abspath('./build/submodules/dracoreduced3dgs'), '-ldraco'],
             ),
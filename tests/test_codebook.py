@@ -0,0 +1,59 @@
+import io
+
+import numpy as np
+import pytest
+
+from gscompressor.quantization.codebook import (
+    CODEBOOK_DTYPES, codebook_entries, pack_codebook, read_codebook, read_codebook_entries, split_codebook, unpack_codebook,
+)
+
+rng = np.random.default_rng(0)
+codebooks = {
+    "features_dc": rng.standard_normal((64, 3)).astype(np.float32),
+    "opacity": rng.standard_normal((16, 1)).astype(np.float32),
+    "constant": np.full((8, 2), 0.5, dtype=np.float32),
+    "empty": np.zeros((0, 3), dtype=np.float32),
+}
+tolerances = dict(float32=0, float16=1e-2, uint8=None)
+
+
+@pytest.mark.parametrize("dtype", CODEBOOK_DTYPES)
+def test_round_trip(dtype):
+    section = pack_codebook(codebooks, dtype)
+    draco = b"DRACO buffer"
+    buffer, unpacked = split_codebook(draco + section)
+    assert bytes(buffer) == draco
+    assert unpacked.keys() == codebooks.keys()
+    for name, codebook in codebooks.items():
+        assert unpacked[name].shape == codebook.shape and unpacked[name].dtype == np.float32
+        if codebook.size == 0:
+            continue
+        # uint8 columns are quantized in 255 steps between their minimum and maximum
+        tolerance = tolerances[dtype]
+        if tolerance is None:
+            tolerance = (codebook.max(0) - codebook.min(0)) / 255 / 2 + 1e-6
+        assert np.all(np.abs(unpacked[name] - codebook) <= tolerance)
+    assert [entry["name"] for entry in codebook_entries(section)] == list(codebooks)
+
+    size, from_file = read_codebook(io.BytesIO(draco + section))
+    assert size == len(draco) and all(np.array_equal(from_file[name], unpacked[name]) for name in codebooks)
+    assert [entry["shape"] for entry in read_codebook_entries(io.BytesIO(draco + section))] == [list(c.shape) for c in codebooks.values()]
+
+
+@pytest.mark.parametrize("dtype", CODEBOOK_DTYPES)
+def test_empty(dtype):
+    section = pack_codebook({}, dtype)
+    assert split_codebook(b"draco" + section)[1] == {}
+    assert unpack_codebook(section[:-12]) == {}
+
+
+def test_without_section():
+    buffer, codebook_dict = split_codebook(b"plain DRACO buffer")
+    assert codebook_dict is None and bytes(buffer) == b"plain DRACO buffer"
+    assert read_codebook(io.BytesIO(b"plain DRACO buffer")) == (18, None)
+    assert read_codebook_entries(io.BytesIO(b"plain")) is None
+
+
+def test_unknown_dtype():
+    with pytest.raises(ValueError):
+        pack_codebook(codebooks, "int8")
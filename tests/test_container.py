@@ -0,0 +1,66 @@
+import io
+import math
+
+import pytest
+
+from gscompressor.container import ContainerReader, ContainerWriter, is_container, prefix_blocks, read_prefix_header
+
+payloads = [b"first block", b"", b"x" * 1000]
+aabbs = [(0.0, 1.0, 2.0, 3.0, 4.0, 5.0), None, (-1.0, -1.0, -1.0, 1.0, 1.0, 1.0)]
+
+
+def write_container(metadata=None) -> bytes:
+    f = io.BytesIO()
+    with ContainerWriter(f, metadata) as writer:
+        for i, (payload, aabb) in enumerate(zip(payloads, aabbs)):
+            writer.write_block(payload, num_points=i * 10, aabb=aabb)
+    return f.getvalue()
+
+
+def test_round_trip():
+    data = write_container(dict(codec="draco3dgs", chunk_size=10))
+    f = io.BytesIO(data)
+    assert is_container(f) and f.tell() == 0
+    reader = ContainerReader(f)
+    assert reader.metadata == dict(codec="draco3dgs", chunk_size=10)
+    assert [reader.read_block(block) for block in reader.blocks] == payloads
+    assert [block.num_points for block in reader.blocks] == [0, 10, 20]
+    assert reader.num_points == 30
+    assert reader.blocks[0].aabb == aabbs[0]
+    assert all(math.isnan(v) for v in reader.blocks[1].aabb)
+    # Walking the blocks in file order finds the same blocks as the index
+    assert [(block[:3], payload) for block, payload in reader] == [(block[:3], reader.read_block(block)) for block in reader.blocks]
+
+
+def test_not_a_container():
+    assert not is_container(io.BytesIO(b"DRACO"))
+    with pytest.raises(ValueError):
+        ContainerReader(io.BytesIO(b"DRACO" + bytes(32)))
+
+
+def test_failed_write_has_no_index():
+    f = io.BytesIO()
+    with pytest.raises(RuntimeError):
+        with ContainerWriter(f) as writer:
+            writer.write_block(b"payload", 1)
+            raise RuntimeError
+    with pytest.raises(ValueError, match="no index"):
+        ContainerReader(io.BytesIO(f.getvalue())).blocks
+
+
+def test_prefix():
+    data = write_container(dict(layers=[1, 2]))
+    metadata, offset = read_prefix_header(data)
+    assert metadata == dict(layers=[1, 2])
+    assert [bytes(payload) for _, payload in prefix_blocks(data, offset)] == payloads
+    reader = ContainerReader(io.BytesIO(data))
+    for size in range(len(data) + 1):
+        header = read_prefix_header(data[:size])
+        if header is None:
+            assert size < offset
+            continue
+        # Every prefix yields exactly the blocks that it holds entirely, at the offsets of the index
+        blocks = list(prefix_blocks(data[:size], offset))
+        complete = [block for block in reader.blocks if block.offset + block.size <= size]
+        assert [block[:3] for block, _ in blocks] == [block[:3] for block in complete]
+        assert [bytes(payload) for _, payload in blocks] == payloads[:len(complete)]
@@ -0,0 +1,50 @@
+import numpy as np
+
+from gscompressor.delta import delta_attribute, pack_rows, unpack_rows
+
+rng = np.random.default_rng(0)
+
+
+def test_pack_rows_round_trip():
+    rows = np.array([0, 3, 4, 100, 70000])
+    values = rng.integers(-30000, 30000, (5, 3)).astype("<i2")
+    unpacked_rows, unpacked_values = unpack_rows(pack_rows(rows, values), len(rows), 3, "<i2")
+    assert np.array_equal(unpacked_rows, rows)
+    assert np.array_equal(unpacked_values, values)
+
+
+def test_pack_rows_empty():
+    rows, values = unpack_rows(pack_rows(np.zeros(0, dtype=np.int64), np.zeros((0, 4), dtype="<i1")), 0, 4, "<i1")
+    assert rows.shape == (0,) and values.shape == (0, 4)
+
+
+def test_delta_of_ids():
+    reference = rng.integers(0, 256, (1000, 2)).astype(np.int32)
+    new = reference.copy()
+    new[[5, 17, 999], 1] += 1
+    rows, values, reconstruction = delta_attribute(reference, new)
+    assert rows.tolist() == [5, 17, 999]
+    assert np.array_equal(values, new[rows])
+    assert np.array_equal(reconstruction, new)
+
+
+def test_delta_of_values():
+    step = 1e-3
+    reference = rng.standard_normal((1000, 3)).astype(np.float32)
+    new = reference.copy()
+    new[10:20] += 0.25
+    rows, values, reconstruction = delta_attribute(reference, new, step)
+    assert rows.tolist() == list(range(10, 20))
+    assert values.dtype.itemsize <= 2  # residuals of 250 steps
+    assert np.abs(reconstruction - new).max() <= step / 2 + 1e-6
+    # The reconstruction is what a reader computes from the packed rows
+    unpacked_rows, unpacked_values = unpack_rows(pack_rows(rows, values), len(rows), 3, values.dtype.str)
+    applied = reference.copy()
+    applied[unpacked_rows] += np.float32(step) * unpacked_values.astype(np.float32)
+    assert np.array_equal(applied, reconstruction)
+
+
+def test_delta_of_constant_values():
+    reference = np.ones((10, 1), dtype=np.float32)
+    rows, values, reconstruction = delta_attribute(reference, reference.copy(), 0)
+    assert rows.size == 0 and np.array_equal(reconstruction, reference)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from gscompressor.spatial import curve_order, morton_code, octree_partition, quantize_positions
+
+rng = np.random.default_rng(0)
+clouds = dict(
+    random=rng.standard_normal((5000, 3)),
+    planar=np.column_stack([rng.random((1000, 2)), np.full(1000, 5.0)]),
+    single=np.array([[1.0, 2.0, 3.0]]),
+    coincident=np.repeat([[1.0, 2.0, 3.0]], 300, axis=0),
+)
+
+
+@pytest.mark.parametrize("name", clouds)
+@pytest.mark.parametrize("curve", ["morton", "hilbert"])
+def test_curve_order_is_a_permutation(name, curve):
+    order = curve_order(clouds[name], curve)
+    assert np.array_equal(np.sort(order), np.arange(len(clouds[name])))
+
+
+@pytest.mark.parametrize("name", clouds)
+def test_quantize_positions_is_bounded(name):
+    grid = quantize_positions(clouds[name])
+    assert grid.max() < 2 ** 21
+    assert np.all(grid[:, np.ptp(clouds[name], axis=0) == 0] == 0)
+
+
+@pytest.mark.parametrize("name", clouds)
+@pytest.mark.parametrize("max_points", [1, 100, 7000])
+def test_octree_partition_covers_every_point_once(name, max_points):
+    codes = np.sort(morton_code(clouds[name]))
+    cells = octree_partition(codes, max_points)
+    assert cells[0][0] == 0 and cells[-1][1] == len(codes)
+    assert all(end == begin for (_, end), (begin, _) in zip(cells[:-1], cells[1:]))
+    assert all(0 < end - begin <= max_points for begin, end in cells)
+
+
+def test_unknown_curve():
+    with pytest.raises(ValueError):
+        curve_order(clouds["random"], "peano")